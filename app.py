@@ -1,54 +1,259 @@
 # 导入了Flask框架相关模块
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify, g, has_app_context, stream_with_context
 import sqlite3# 数据库操作模块
+import click
 import os
-from datetime import datetime# 时间处理模块
-from icalendar import Calendar, Event# iCalendar处理模块等
-from io import BytesIO
+from datetime import datetime, timedelta# 时间处理模块
+import hashlib
+import json
+import random
+import secrets
+import tempfile
 import threading
+import uuid
 import time# 用于构建Web应用和实现各种功能。
-from mail_sender import send_email
-import openai
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+
+# 加载环境变量：必须在导入下面的模块之前，metrics 等模块和本文件的模块级配置在导入时就读取环境变量
+load_dotenv()
+
+from outbox import Outbox, enqueue
+from passwords import HasherBusy, LoginThrottle, PasswordHasher, is_hashed
+from ics_stream import ProgressStream, iter_calendar, iter_events
+from archive import ALL_EVENTS, archive as archive_events, event_source, restore as restore_events, unguarded_triggers
+from changes import compact as compact_changes, current_seq, floor_seq, read_changes
+from cache import ByteLRU, SingleFlight, TTLCache
+from intervals import IntervalIndex
+from db import ConnectionPool, migrate, migration_lock, parse_time, pending_migrations, to_epoch
+from scheduler import LagStats, ReminderScheduler
+from runner import ChangeWatcher, LeaderLease, LeaderRunner
+from search import build_query, flush_queue as flush_search_queue, owner_token, relevance
+import stats
+import metrics
+from reminders import MAX_OFFSET_MINUTES, MAX_REMINDERS, describe_offset, fire_at as reminder_fire_at, format_offsets, parse_offsets, refresh as refresh_reminders
+from recurrence import OccurrenceCache, format_exdates, occurrences, parse_exdates, parse_rule, to_rrule
 from typing import List, Optional
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24).hex()
-app.config['DATABASE'] = 'users.db'
+# 多进程部署时所有 worker 必须使用同一个密钥，否则会话在不同 worker 之间失效
+app.secret_key = os.getenv('SECRET_KEY') or os.urandom(24).hex()
+app.config['DATABASE'] = os.getenv('DATABASE', 'users.db')
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', '8'))  # 0 表示不复用连接
 app.config['SESSION_COOKIE_SECURE'] = False
 
-# 加载环境变量
-load_dotenv()
+class SplitterBusy(Exception):
+    pass
+
+class SplitterFailed(Exception):
+    pass
+
+class SplitterTimeout(Exception):
+    pass
 
 class TaskSplitter:
-    def __init__(self):
-        self.client = openai.OpenAI(
-            base_url=os.getenv("OPENAI_BASE_URL"),
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+    # - 结果按规范化后的 (任务, 语言, 模型) 缓存，相同任务不再重复请求模型。
+    # - 并发的相同请求合并为一次上游调用（single-flight）。
+    # - 上游并发数由有界信号量限制，排队超时抛出 SplitterBusy，避免慢上游占满请求线程。
+    # - openai 包导入较慢（约 0.5 秒），客户端在第一次拆分时才创建，只浏览日程的 worker 不会加载它。
+    # - 批量拆分（split_many）每个请求最多 batch_parallelism 个任务同时进行，仍受上面的上游并发限制；
+    #   每个任务单独计时（item_timeout），失败、超时互不影响；pack 时把短任务合并进一个提示词。
+    def __init__(self, cache=None, max_concurrency=None, queue_timeout=None, timeout=None):
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.timeout = timeout or float(os.getenv("OPENAI_TIMEOUT", "60"))
         self.model_id = os.getenv("OPENAI_MODEL_ID", "deepseek32b")
-    
-    def split_task(self, task_description: str, language: str = "zh-CN") -> Optional[List[str]]:
+        self.cache = cache if cache is not None else TTLCache()
+        self.queue_timeout = queue_timeout or float(os.getenv("OPENAI_QUEUE_TIMEOUT", "10"))
+        self._slots = threading.BoundedSemaphore(
+            max_concurrency or int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+        )
+        self._flights = SingleFlight()
+        self.latency = LagStats()
+        self.first_step = LagStats()  # 流式拆分中第一个步骤到达的耗时
+        self.errors = 0
+        self.rejected = 0
+        self.batch_parallelism = int(os.getenv("SPLIT_BATCH_PARALLELISM", "4"))
+        self.item_timeout = float(os.getenv("SPLIT_ITEM_TIMEOUT", "30"))
+        self.pack_size = int(os.getenv("SPLIT_PACK_SIZE", "5"))
+        self.pack_max_chars = int(os.getenv("SPLIT_PACK_MAX_CHARS", "80"))
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import openai
+
+                    self._client = openai.OpenAI(
+                        base_url=os.getenv("OPENAI_BASE_URL"),
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        timeout=self.timeout,
+                        max_retries=1
+                    )
+        return self._client
+
+    def cache_key(self, task_description: str, language: str) -> str:
+        task = ' '.join(unicodedata.normalize('NFKC', task_description).split())
+        raw = json.dumps([task, language.strip().lower(), self.model_id], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def split_task(self, task_description: str, language: str = "zh-CN", timeout=None) -> Optional[List[str]]:
+        key = self.cache_key(task_description, language)
+        steps = self.cache.get(key)
+        if steps is not None:
+            return steps
+        return self._flights.do(key, lambda: self._split_uncached(key, task_description, language, timeout))
+
+    def _split_uncached(self, key, task_description, language, timeout=None):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise SplitterBusy()
+        try:
+            started = time.perf_counter()
+            try:
+                steps = self._request(task_description, language, timeout)
+            except SplitterTimeout:
+                self.errors += 1
+                metrics.OPENAI_SECONDS.observe(time.perf_counter() - started, 'split', 'timeout')
+                raise
+            elapsed = time.perf_counter() - started
+            self.latency.record(elapsed)
+            metrics.OPENAI_SECONDS.observe(elapsed, 'split', 'ok' if steps else 'error')
+        finally:
+            self._slots.release()
+        if steps:
+            self.cache.put(key, steps)
+        else:
+            self.errors += 1
+        return steps
+
+    def _request(self, task_description: str, language: str, timeout=None) -> Optional[List[str]]:
+        # timeout 为本次调用的总超时（秒），此时不自动重试；超时抛出 SplitterTimeout，其余错误返回 None
         try:
             prompt = self._build_prompt(task_description, language)
+            client = self.client.with_options(max_retries=0) if timeout else self.client
             
-            response = self.client.chat.completions.create(
+            response = client.chat.completions.create(
                 model=self.model_id,
                 messages=[
                     {"role": "system", "content": "你是一个高效的任务规划助手。"},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
-                max_tokens=1000
+                max_tokens=1000,
+                **({"timeout": timeout} if timeout else {})
             )
             
             steps = self._parse_response(response.choices[0].message.content)
             return steps
             
         except Exception as e:
+            if self._is_timeout(e):
+                raise SplitterTimeout() from e
             print(f"Error splitting task: {e}")
             return None
-    
+
+    @staticmethod
+    def _is_timeout(error):
+        import openai
+
+        return isinstance(error, openai.APITimeoutError)
+
+    def split_many(self, tasks, language: str = "zh-CN", pack: bool = False):
+        # 生成器：并发拆分多个任务，按完成顺序产出 (序号, 步骤列表或异常)。
+        # 命中缓存的立即产出；同一批里相同的任务只请求一次；调用方中途停止迭代时取消尚未开始的任务
+        pending = {}
+        for index, task in enumerate(tasks):
+            key = self.cache_key(task, language)
+            steps = self.cache.get(key)
+            if steps is not None:
+                yield index, steps
+            else:
+                pending.setdefault(key, []).append(index)
+        if not pending:
+            return
+        texts = {key: tasks[indexes[0]] for key, indexes in pending.items()}
+        groups = self._pack_groups(texts) if pack else [[key] for key in texts]
+        executor = ThreadPoolExecutor(max_workers=min(self.batch_parallelism, len(groups)),
+                                      thread_name_prefix='split-batch')
+        try:
+            futures = [executor.submit(self._split_group, group, texts, language) for group in groups]
+            for future in as_completed(futures):
+                for key, outcome in future.result().items():
+                    for index in pending[key]:
+                        yield index, outcome
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _pack_groups(self, texts):
+        # 不超过 pack_max_chars 的短任务每 pack_size 个一组，长任务单独一组
+        short = [key for key, text in texts.items() if len(text) <= self.pack_max_chars]
+        groups = [short[i:i + self.pack_size] for i in range(0, len(short), self.pack_size)]
+        return groups + [[key] for key, text in texts.items() if len(text) > self.pack_max_chars]
+
+    def _split_group(self, keys, texts, language):
+        # 返回 {key: 步骤列表或异常}，不抛出；合并请求里没解析出来的任务再逐个单独拆分
+        outcomes = {}
+        if len(keys) > 1:
+            try:
+                outcomes = self._split_packed(keys, texts, language)
+            except (SplitterBusy, SplitterTimeout) as e:
+                return {key: e for key in keys}
+        for key in keys:
+            if key in outcomes:
+                continue
+            try:
+                steps = self.split_task(texts[key], language, self.item_timeout)
+                outcomes[key] = steps if steps else SplitterFailed()
+            except (SplitterBusy, SplitterTimeout) as e:
+                outcomes[key] = e
+        return outcomes
+
+    def _split_packed(self, keys, texts, language):
+        # 一次请求拆分多个任务，要求模型输出 {"1": [步骤, ...], ...}；返回解析成功的 {key: 步骤列表}
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise SplitterBusy()
+        started = time.perf_counter()
+        try:
+            response = self.client.with_options(max_retries=0).chat.completions.create(
+                model=self.model_id,
+                messages=[
+                    {"role": "system", "content": "你是一个高效的任务规划助手。"},
+                    {"role": "user", "content": self._build_packed_prompt([texts[key] for key in keys], language)}
+                ],
+                temperature=0.7,
+                max_tokens=1000 * len(keys),
+                timeout=self.item_timeout * len(keys)
+            )
+            content = response.choices[0].message.content or ''
+            data = json.loads(content[content.find('{'):content.rfind('}') + 1])
+        except Exception as e:
+            timed_out = self._is_timeout(e)
+            metrics.OPENAI_SECONDS.observe(time.perf_counter() - started, 'packed', 'timeout' if timed_out else 'error')
+            if timed_out:
+                self.errors += 1
+                raise SplitterTimeout() from e
+            print(f"Error splitting packed tasks: {e}")
+            return {}
+        finally:
+            self._slots.release()
+        elapsed = time.perf_counter() - started
+        self.latency.record(elapsed)
+        metrics.OPENAI_SECONDS.observe(elapsed, 'packed', 'ok')
+        results = {}
+        for number, key in enumerate(keys, start=1):
+            items = data.get(str(number)) if isinstance(data, dict) else None
+            if not isinstance(items, list):
+                continue
+            steps = [step for step in (self._parse_line(str(item)) for item in items) if step]
+            if steps:
+                self.cache.put(key, steps)
+                results[key] = steps
+        return results
+
     def _build_prompt(self, task_description: str, language: str) -> str:
         if language.startswith("zh"):
             return (
@@ -66,80 +271,294 @@ class TaskSplitter:
                 f"Steps:"
             )
     
+    def _build_packed_prompt(self, tasks: List[str], language: str) -> str:
+        numbered = json.dumps({str(i): task for i, task in enumerate(tasks, start=1)}, ensure_ascii=False)
+        if language.startswith("zh"):
+            return (
+                f"请将下面每个任务分别拆分为具体的执行步骤，每个任务3-8个步骤，每个步骤应简洁明了。"
+                f"只输出一个 JSON 对象，键为任务编号，值为该任务的步骤数组，不要添加任何解释或额外信息。\n"
+                f"任务列表：{numbered}"
+            )
+        else:
+            return (
+                f"Please break down each of the following tasks into specific steps, with 3-8 steps per task. "
+                f"Each step should be concise and clear. "
+                f"Output only a JSON object mapping each task number to an array of its steps, "
+                f"without any explanations or additional information.\n"
+                f"Tasks: {numbered}"
+            )
+
+    def stream_task(self, task_description: str, language: str = "zh-CN"):
+        # 生成器：模型每输出完整的一行就产出一个步骤；命中缓存时直接产出全部步骤
+        key = self.cache_key(task_description, language)
+        steps = self.cache.get(key)
+        if steps is not None:
+            yield from steps
+            return
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise SplitterBusy()
+        steps = []
+        try:
+            started = time.perf_counter()
+            response = self.client.chat.completions.create(
+                model=self.model_id,
+                messages=[
+                    {"role": "system", "content": "你是一个高效的任务规划助手。"},
+                    {"role": "user", "content": self._build_prompt(task_description, language)}
+                ],
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True
+            )
+            buffer = ''
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                buffer += chunk.choices[0].delta.content or ''
+                while '\n' in buffer:
+                    line, buffer = buffer.split('\n', 1)
+                    step = self._parse_line(line)
+                    if step:
+                        if not steps:
+                            self.first_step.record(time.perf_counter() - started)
+                        steps.append(step)
+                        yield step
+            step = self._parse_line(buffer)
+            if step:
+                if not steps:
+                    self.first_step.record(time.perf_counter() - started)
+                steps.append(step)
+                yield step
+            self.latency.record(time.perf_counter() - started)
+            metrics.OPENAI_SECONDS.observe(time.perf_counter() - started, 'stream', 'ok')
+            completed = True
+        except Exception as e:
+            print(f"Error splitting task: {e}")
+            metrics.OPENAI_SECONDS.observe(time.perf_counter() - started, 'stream', 'error')
+            completed = False
+        finally:
+            self._slots.release()
+        # 中途出错的部分结果不写入缓存
+        if completed and steps:
+            self.cache.put(key, steps)
+        else:
+            self.errors += 1
+            raise SplitterFailed()
+
+    def _parse_line(self, line: str) -> Optional[str]:
+        line = line.strip()
+        if not line:
+            return None
+        if line.startswith(("1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.", 
+                           "1、", "2、", "3、", "4、", "5、", "6、", "7、", "8、",
+                           "- ", "* ")):
+            line = line[2:].strip()
+        return line
+
     def _parse_response(self, response_text: str) -> List[str]:
-        lines = [line.strip() for line in response_text.split('\n') if line.strip()]
         steps = []
-        for line in lines:
-            if line.startswith(("1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.", 
-                               "1、", "2、", "3、", "4、", "5、", "6、", "7、", "8、",
-                               "- ", "* ")):
-                line = line[2:].strip()
-            steps.append(line)
+        for line in response_text.split('\n'):
+            step = self._parse_line(line)
+            if step is not None:
+                steps.append(step)
         return steps
 
-# 初始化任务拆分器
-splitter = TaskSplitter()
+    def stats(self):
+        return {
+            "cache": self.cache.stats(),
+            "coalesced": self._flights.coalesced,
+            "in_flight": self._flights.in_flight(),
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "upstream_seconds": self.latency.summary(),
+            "first_step_seconds": self.first_step.summary(),
+        }
+
+def load_split_result(key, now):
+    with get_db() as conn:
+        row = conn.execute(
+            'SELECT value, expires_ts FROM split_cache WHERE key = ? AND expires_ts > ?', (key, now)
+        ).fetchone()
+    return (row['expires_ts'], json.loads(row['value'])) if row else None
+
+def store_split_result(key, steps, expires):
+    with get_db() as conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO split_cache (key, value, expires_ts) VALUES (?, ?, ?)',
+            (key, json.dumps(steps, ensure_ascii=False), int(expires))
+        )
+
+# 初始化任务拆分器；SPLIT_CACHE_PERSIST=0 时只使用内存缓存
+persist_split_cache = os.getenv('SPLIT_CACHE_PERSIST', '1') == '1'
+splitter = TaskSplitter(cache=TTLCache(
+    maxsize=int(os.getenv("SPLIT_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("SPLIT_CACHE_TTL", "86400")),
+    load=load_split_result if persist_split_cache else None,
+    store=store_split_result if persist_split_cache else None
+))
 
 def init_db():
-    with sqlite3.connect(app.config['DATABASE']) as conn:
-        cursor = conn.cursor()
-        
-        # 检查并创建users表
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-        if not cursor.fetchone():
-            cursor.execute('''
-                CREATE TABLE users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT NOT NULL,
-                    password TEXT NOT NULL
-                )
-            ''')
-        
-        # 检查并创建events表
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='events'")
-        if not cursor.fetchone():
-            cursor.execute('''
-                CREATE TABLE events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    start_time TEXT NOT NULL,
-                    end_time TEXT,
-                    is_all_day INTEGER DEFAULT 0,
-                    repeat_rule TEXT,
-                    category TEXT,
-                    notes TEXT,
-                    is_reminded INTEGER DEFAULT 0,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-        conn.commit()
+    # 按 PRAGMA user_version 依次执行尚未应用的迁移（见 db.MIGRATIONS）；
+    # 已是最新版本时只读一次版本号，不拿文件锁
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        if pending_migrations(conn):
+            with migration_lock(app.config['DATABASE']):
+                migrate(conn)
+    finally:
+        pool.release(conn)
 
-def update_db():
-    with sqlite3.connect(app.config['DATABASE']) as conn:
-        cursor = conn.cursor()
-        # 首先检查events表是否存在
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='events'")
-        if cursor.fetchone():  # 只有表存在时才执行修改
-            cursor.execute("PRAGMA table_info(events)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'is_reminded' not in columns:
-                cursor.execute("ALTER TABLE events ADD COLUMN is_reminded INTEGER DEFAULT 0")
-                conn.commit()
-                print("已添加 is_reminded 字段")
+def check_schema():
+    # 启动前检查：迁移已全部执行；events 上的插入/删除触发器都带有归档搬移的条件（见 db.MIGRATIONS 前的说明）
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        pending = pending_migrations(conn)
+        unguarded = [] if pending else unguarded_triggers(conn)
+    finally:
+        pool.release(conn)
+    if pending:
+        raise RuntimeError(f'数据库还有 {pending} 个迁移未执行，请先运行 flask --app app init-db')
+    if unguarded:
+        raise RuntimeError(f'events 上的触发器缺少归档搬移条件（archive.MOVE_GUARD）：{", ".join(unguarded)}')
+
+_pool = None
+_pool_lock = threading.Lock()
+_thread_db = threading.local()
+
+def get_pool():
+    global _pool
+    database, size = app.config['DATABASE'], app.config['DB_POOL_SIZE']
+    with _pool_lock:
+        if _pool is None or (_pool.database, _pool.size) != (database, size):
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(database, size)
+        return _pool
 
 def get_db():
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row
+    # 同一请求内所有 get_db() 共用一个连接，请求结束时归还连接池
+    if has_app_context():
+        if 'db' not in g:
+            g.db_pool = get_pool()
+            g.db = g.db_pool.acquire()
+        return g.db
+    # 后台线程（如提醒线程）各自持有一个线程级连接
+    conn = getattr(_thread_db, 'conn', None)
+    if conn is None:
+        conn = _thread_db.conn = get_pool().acquire()
     return conn
 
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop('db', None)
+    if conn is not None:
+        g.pop('db_pool').release(conn)
+
 def get_user_id(username):
+    user_id = identity_cache.get(username)
+    if user_id is not None:
+        return user_id
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
         user = cursor.fetchone()
-        return user['id'] if user else None
+    if user is None:
+        return None
+    identity_cache.put(username, user['id'])
+    return user['id']
+
+# 用户名 -> 用户 id 的进程内缓存，供还没有 session['user_id'] 的旧会话使用
+identity_cache = TTLCache(maxsize=4096, ttl=600)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.profiler = metrics.start_profile()
+    metrics.reset_statements()
+
+@app.after_request
+def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    status = 500 if exc is not None else g.get('response_status', 500)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, request.method, str(status))
+    metrics.SQL_PER_REQUEST.observe(metrics.statement_count(), endpoint)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        metrics.finish_profile(profiler, endpoint)
+
+@app.before_request
+def load_user():
+    # 每个请求只解析一次当前用户：登录时已把 id 写入 session，通常不需要查库
+    g.user_id = None
+    username = session.get('username')
+    if username is None:
+        return
+    user_id = session.get('user_id')
+    if user_id is None:
+        user_id = get_user_id(username)
+        if user_id is None:
+            # 用户已不存在，视为未登录
+            session.clear()
+            return
+        session['user_id'] = user_id
+    g.user_id = user_id
+
+INSERT_EVENT_SQL = '''
+    INSERT INTO events (
+        user_id, title, start_time, end_time, is_all_day,
+        repeat_rule, category, notes, start_ts, end_ts, exdates
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def finish_event_writes(conn):
+    # 日程写入之后、提交之前调用：触发器只记录了变化，这里在 Python 里计算 stale 提醒的 fire_at、
+    # 把全文索引队列分词写入索引，与日程在同一个事务里提交
+    refresh_reminders(conn)
+    flush_search_queue(conn)
+
+# 重复日程的展开结果缓存，更新/删除日程时按 id 失效
+occurrence_cache = OccurrenceCache()
+
+def expand_event(row, window_start, window_end):
+    # 把一条重复日程展开为窗口内的各次发生，每次发生沿用原日程的时长
+    dtstart = parse_time(row['start_time'])
+    if dtstart is None:
+        return []
+    dtend = parse_time(row['end_time'])
+    signature = (row['start_time'], row['repeat_rule'], row['exdates'])
+    starts = occurrence_cache.get(
+        row['id'], signature, window_start, window_end,
+        lambda: occurrences(dtstart, parse_rule(row['repeat_rule']), window_start, window_end,
+                            parse_exdates(row['exdates']))
+    )
+    expanded = []
+    for start in starts:
+        event = dict(row)
+        event.pop('exdates', None)
+        event['start_time'] = start.strftime('%Y-%m-%d %H:%M:%S')
+        event['end_time'] = (start + (dtend - dtstart)).strftime('%Y-%m-%d %H:%M:%S') if dtend else row['end_time']
+        event['start_ts'] = int(start.timestamp())
+        event['recurring'] = True
+        expanded.append(event)
+    return expanded
 
 # ============= 原有所有路由保持不变 =============
 @app.route('/')
@@ -148,6 +567,14 @@ def home():
         return redirect(url_for('index'))
     return redirect(url_for('login'))
 
+# 密码哈希和登录限流（见 passwords.py）
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
+
+def login_rejected(message, status, retry_after):
+    flash(message)
+    return render_template('login.html'), status, {'Retry-After': str(retry_after)}
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -160,8 +587,24 @@ def login():
             user = cursor.fetchone()
             
             if user:
-                if user['password'] == password:
+                # 先限流再算哈希，被拒绝的尝试不占用哈希线程
+                retry_after = login_throttle.attempt(username)
+                if retry_after:
+                    return login_rejected(f'尝试次数过多，请 {retry_after} 秒后再试', 429, retry_after)
+                try:
+                    matched, upgraded = password_hasher.verify(user['password'], password)
+                except HasherBusy:
+                    login_throttle.cancel(username)
+                    return login_rejected('登录人数较多，请稍后再试', 503, 1)
+                if matched:
+                    login_throttle.succeeded(username)
+                    if upgraded:
+                        # 明文或旧参数的哈希在登录成功时改写；期间密码被改过则不覆盖
+                        cursor.execute('UPDATE users SET password = ? WHERE id = ? AND password = ?',
+                                       (upgraded, user['id'], user['password']))
+                        conn.commit()
                     session['username'] = username
+                    session['user_id'] = user['id']
                     session.permanent = True
                     return redirect(url_for('index'))
                 flash('密码错误')
@@ -171,13 +614,19 @@ def login():
                 if not email:
                     flash('请填写邮箱地址')
                 else:
+                    try:
+                        hashed = password_hasher.hash(password)
+                    except HasherBusy:
+                        return login_rejected('注册人数较多，请稍后再试', 503, 1)
                     try:
                         cursor.execute(
-                            'INSERT INTO users VALUES (NULL, ?, ?, ?)',
-                            (username, email, password)
+                            'INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                            (username, email, hashed)
                         )
                         conn.commit()
+                        identity_cache.invalidate(username)
                         session['username'] = username
+                        session['user_id'] = cursor.lastrowid
                         return redirect(url_for('index'))
                     except sqlite3.IntegrityError:
                         flash('用户名已存在')
@@ -190,24 +639,580 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
+# - 渲染缓存：按字节数 LRU 淘汰。/api/events 的响应体按 (用户, 日程版本, 视图, 窗口, 游标, 每页条数) 缓存，
+#   版本号由 events 上的触发器维护，任何写入路径（表单、批量、导入、提醒等）都会让旧键失效。
+# - 首页只是外壳，不含日程数据，渲染一次后所有用户共用。
+# - 两者都支持 ETag / Last-Modified 条件请求，未变化时返回 304。
+render_cache = ByteLRU(max_bytes=int(os.getenv('RENDER_CACHE_BYTES', str(32 * 1024 * 1024))),
+                       max_item_bytes=1024 * 1024)
+
+def events_version(conn, user_id):
+    row = conn.execute('SELECT events_version, events_modified_ts FROM users WHERE id = ?', (user_id,)).fetchone()
+    return (row['events_version'], row['events_modified_ts']) if row else (0, 0)
+
+def cached_response(key, etag, modified_ts, render, mimetype, stale=None):
+    # render() 返回 bytes；命中缓存时不再调用。stale(key) 为真的旧条目在写入新条目时一并清掉
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    last_modified = datetime.fromtimestamp(modified_ts)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and int(modified_ts) <= since.timestamp()
+    if not_modified:
+        response = Response(status=304, headers=headers)
+    else:
+        body = render_cache.get(key)
+        if body is None:
+            body = render()
+            if stale is not None:
+                render_cache.discard(stale)
+            render_cache.put(key, body)
+        response = Response(body, mimetype=mimetype, headers=headers)
+    response.last_modified = last_modified
+    return response
+
+STARTED_TS = int(time.time())
+
 @app.route('/index')
 def index():
     if 'username' not in session:
         return redirect(url_for('login'))
-    
+    # 页面只渲染外壳，当前窗口内的日程由前端通过 /api/events 分页拉取
+    body = render_cache.get(('index',))
+    if body is None:
+        body = render_template('index.html').encode('utf-8')
+        render_cache.put(('index',), body)
+    etag = hashlib.sha1(body).hexdigest()[:16]
+    return cached_response(('index',), etag, STARTED_TS, lambda: body, 'text/html')
+
+EVENT_LIST_COLUMNS = 'id, title, start_time, end_time, is_all_day, repeat_rule, category, notes, start_ts'
+EVENT_PAGE_SIZE = 100
+EVENT_PAGE_MAX = 500
+
+def event_window(view, anchor):
+    # 返回 [start, end) 的本地时间窗口，周视图以周一为起点
+    day = datetime(anchor.year, anchor.month, anchor.day)
+    if view == 'day':
+        return day, day + timedelta(days=1)
+    if view == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if view == 'month':
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        return start, end
+    raise ValueError(f'未知视图: {view}')
+
+def parse_cursor(cursor):
+    # 游标格式为 "<start_ts>:<id>"，即上一页最后一条记录的排序键
+    if not cursor:
+        return None
+    start_ts, event_id = cursor.split(':', 1)
+    return int(start_ts), int(event_id)
+
+@app.route('/api/events')
+def api_events():
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM events 
-                WHERE user_id = ?
-                ORDER BY start_time
-            ''', (get_user_id(session['username']),))
-            events = cursor.fetchall()
-        return render_template('index.html', events=events)
-    except Exception as e:
-        flash('加载日程失败')
-        return redirect(url_for('logout'))
+        view = request.args.get('view', 'week')
+        anchor = datetime.strptime(request.args['date'], '%Y-%m-%d') if request.args.get('date') else datetime.now()
+        window_start, window_end = event_window(view, anchor)
+        cursor_key = parse_cursor(request.args.get('cursor'))
+        limit = min(max(int(request.args.get('limit', EVENT_PAGE_SIZE)), 1), EVENT_PAGE_MAX)
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": f"参数错误: {e}"}), 400
+
+    start_ts = int(window_start.timestamp())
+    # 键集分页：(start_ts, id) 严格大于游标，配合 idx_events_user_start 只读取一页
+    after = cursor_key if cursor_key else (start_ts - 1, 0)
+    user_id = g.user_id
+    conn = get_db()
+    conn.execute('BEGIN')  # 读事务：版本号和日程来自同一快照
+    try:
+        version, modified_ts = events_version(conn, user_id)
+        key = (user_id, version, view, start_ts, after, limit)
+        etag = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        if not request.args.get('date'):
+            # 没有指定日期时窗口随“今天”变化，最后修改时间不早于今天零点
+            modified_ts = max(modified_ts, int(datetime.combine(anchor.date(), datetime.min.time()).timestamp()))
+        return cached_response(
+            key, etag, modified_ts,
+            lambda: app.json.dumps(list_events(conn, user_id, view, window_start, window_end, after, limit)).encode(),
+            'application/json',
+            stale=lambda k: k[0] == user_id and k[1] != version
+        )
+    finally:
+        conn.rollback()
+
+def list_events(conn, user_id, view, window_start, window_end, after, limit):
+    start_ts, end_ts = int(window_start.timestamp()), int(window_end.timestamp())
+    after_ts, after_id = after
+    # 早于归档线的窗口读 all_events 视图，其余只读 events；归档里只有不重复的日程
+    rows = conn.execute(f'''
+        SELECT {EVENT_LIST_COLUMNS} FROM {event_source(conn, user_id, start_ts)}
+        WHERE user_id = ? AND start_ts >= ? AND start_ts < ?
+        AND (start_ts > ? OR (start_ts = ? AND id > ?))
+        AND COALESCE(repeat_rule, '') = ''
+        ORDER BY start_ts, id
+        LIMIT ?
+    ''', (
+        user_id, start_ts, end_ts,
+        after_ts, after_ts, after_id, limit + 1
+    )).fetchall()
+    # 重复日程走 idx_events_recurring，只取窗口结束前开始的规则再按窗口展开
+    recurring = conn.execute(f'''
+        SELECT {EVENT_LIST_COLUMNS}, exdates FROM events
+        WHERE user_id = ? AND repeat_rule <> '' AND start_ts < ?
+    ''', (user_id, end_ts)).fetchall()
+
+    items = [dict(row) for row in rows]
+    for row in recurring:
+        items.extend(
+            event for event in expand_event(row, window_start, window_end)
+            if (event['start_ts'], event['id']) > (after_ts, after_id)
+        )
+    items.sort(key=lambda event: (event['start_ts'], event['id']))
+
+    events = items[:limit]
+    next_cursor = None
+    if len(items) > limit:
+        last = events[-1]
+        next_cursor = f"{last['start_ts']}:{last['id']}"
+    return {
+        "success": True,
+        "view": view,
+        "window": {
+            "start": window_start.strftime('%Y-%m-%d'),
+            "end": window_end.strftime('%Y-%m-%d'),
+        },
+        "events": events,
+        "next_cursor": next_cursor,
+    }
+
+# ============= 增量同步 =============
+# - 令牌 "<seq>"：返回该序号之后的变更（同一日程只返回最后一次），upsert 带上日程的当前内容。
+# - 没有令牌或令牌早于压缩下限时全量同步：按 id 分页返回全部日程，reset=true 表示客户端应清空本地数据；
+#   分页中的令牌为 "<seq>.<id>"，seq 是第一页时的日志序号，全部取完后从它开始增量同步。
+#   分页期间发生的变更在之后的增量同步里还会出现一次，重复的 upsert/delete 对客户端没有影响。
+
+SYNC_PAGE_SIZE = 500
+SYNC_PAGE_MAX = 2000
+SYNC_COLUMNS = f'{EVENT_LIST_COLUMNS}, end_ts, exdates'
+SYNC_RETENTION = int(os.getenv('SYNC_RETENTION_DAYS', '30')) * 86400
+SYNC_COMPACT_INTERVAL = float(os.getenv('SYNC_COMPACT_INTERVAL', '3600'))
+
+def parse_sync_token(token):
+    # 返回 (seq, 全量分页的 id)；没有令牌返回 (None, None)，格式错误抛 ValueError
+    if not token:
+        return None, None
+    seq, _, after_id = token.partition('.')
+    return int(seq), (int(after_id) if after_id else None)
+
+def sync_events(conn, user_id, ids):
+    events = {}
+    ids = list(ids)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        for row in conn.execute(f'''
+            SELECT {SYNC_COLUMNS} FROM {ALL_EVENTS}
+            WHERE user_id = ? AND id IN ({','.join('?' * len(chunk))})
+        ''', [user_id, *chunk]):
+            events[row['id']] = dict(row)
+    return events
+
+def sync_delta(conn, user_id, since, limit):
+    latest, last_seq, has_more = read_changes(conn, user_id, since, limit)
+    events = sync_events(conn, user_id, [event_id for event_id, op in latest.items() if op == 'upsert'])
+    result = []
+    for event_id in latest:
+        # 日志里是 upsert 但日程已不存在：之后的删除记录还没读到，直接按删除返回
+        if event_id in events:
+            result.append({"op": "upsert", "id": event_id, "event": events[event_id]})
+        else:
+            result.append({"op": "delete", "id": event_id})
+    # 已读到最新时令牌直接推进到当前序号，之后的任何变更序号都比它大
+    token = last_seq if has_more else max(last_seq, current_seq(conn))
+    return {"success": True, "full": False, "reset": False, "token": str(token),
+            "has_more": has_more, "changes": result}
+
+def sync_full(conn, user_id, snapshot, after_id, limit):
+    # 两张表各按 id 索引有序读取再归并，归档的日程也包含在全量同步里
+    rows = conn.execute(f'''
+        SELECT {SYNC_COLUMNS} FROM events INDEXED BY idx_events_user_id
+        WHERE user_id = ? AND id > ?
+        UNION ALL
+        SELECT {SYNC_COLUMNS} FROM events_archive INDEXED BY idx_events_archive_user_id
+        WHERE user_id = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (user_id, after_id or 0, user_id, after_id or 0, limit + 1)).fetchall()
+    has_more = len(rows) > limit
+    events = [dict(row) for row in rows[:limit]]
+    token = f"{snapshot}.{events[-1]['id']}" if has_more else str(snapshot)
+    return {"success": True, "full": True, "reset": after_id is None, "token": token,
+            "has_more": has_more, "changes": [{"op": "upsert", "id": e['id'], "event": e} for e in events]}
+
+@app.route('/api/sync')
+def api_sync():
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    try:
+        since, after_id = parse_sync_token(request.args.get('token'))
+        limit = min(max(int(request.args.get('limit', SYNC_PAGE_SIZE)), 1), SYNC_PAGE_MAX)
+    except (ValueError, TypeError):
+        return jsonify({"success": False, "error": "无效的同步令牌"}), 400
+
+    user_id = g.user_id
+    conn = get_db()
+    conn.execute('BEGIN')  # 读事务：日志、下限和日程来自同一快照
+    try:
+        if since is not None and since < floor_seq(conn, user_id):
+            # 令牌之后的部分变更已被压缩掉，只能从头全量同步
+            since, after_id = None, None
+        if since is None:
+            return jsonify(sync_full(conn, user_id, current_seq(conn), None, limit))
+        if after_id is not None:
+            return jsonify(sync_full(conn, user_id, since, after_id, limit))
+        return jsonify(sync_delta(conn, user_id, since, limit))
+    finally:
+        conn.rollback()
+
+def compact_change_log():
+    with get_db() as conn:
+        superseded, expired = compact_changes(conn, SYNC_RETENTION)
+    if superseded or expired:
+        print(f"变更日志压缩：删除被覆盖的记录 {superseded} 条，过期记录 {expired} 条")
+
+def run_change_log_compactor():
+    # 每个进程各跑一个；压缩是幂等的，多个进程同时执行时由写锁串行化，后执行的几乎无事可做
+    time.sleep(random.uniform(0, SYNC_COMPACT_INTERVAL))
+    while True:
+        try:
+            compact_change_log()
+        except Exception as e:
+            print(f"变更日志压缩失败: {str(e)}")
+        time.sleep(SYNC_COMPACT_INTERVAL)
+
+# ============= 冷热归档（见 archive.py） =============
+# - ARCHIVE_AFTER_DAYS：结束超过这么多天、不重复、没有待发提醒的日程移入归档（默认 180 天）；
+# - 每 ARCHIVE_INTERVAL 秒（默认 3600，0 表示不在后台运行）按 ARCHIVE_BATCH 条一批执行，
+#   也可以执行 flask --app app archive-events。
+ARCHIVE_RETENTION = int(os.getenv('ARCHIVE_AFTER_DAYS', '180')) * 86400
+ARCHIVE_BATCH = int(os.getenv('ARCHIVE_BATCH', '500'))
+ARCHIVE_INTERVAL = float(os.getenv('ARCHIVE_INTERVAL', '3600'))
+
+def archive_old_events():
+    with get_db() as conn:
+        archived = archive_events(conn, ARCHIVE_RETENTION, ARCHIVE_BATCH)
+    if archived:
+        print(f"日程归档：移入归档 {archived} 条")
+    return archived
+
+def run_archiver():
+    # 与变更日志压缩一样每个进程各跑一个，候选在写事务内重新查询，多个进程同时执行不会重复搬移
+    time.sleep(random.uniform(0, ARCHIVE_INTERVAL))
+    while True:
+        try:
+            archive_old_events()
+        except Exception as e:
+            print(f"日程归档失败: {str(e)}")
+        time.sleep(ARCHIVE_INTERVAL)
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_PAGE_MAX = 100
+SEARCH_RANK_WINDOW = int(os.getenv('SEARCH_RANK_WINDOW', '200'))
+
+def flush_pending_index(conn):
+    # 其他连接（维护脚本、sqlite3 命令行）写入日程后留下的索引队列在搜索前补上；
+    # 读队列和删除队列必须在同一个写事务里，避免两个进程重复写入同一条
+    if conn.execute('SELECT 1 FROM fts_queue LIMIT 1').fetchone() is None:
+        return
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        flush_search_queue(conn)
+
+def search_events(conn, match, words, filters, params, offset, limit):
+    # - FTS5 按 rowid 倒序流式取出最近的 SEARCH_RANK_WINDOW 条匹配，在这些候选里按相关度排序；
+    #   bm25() 需要先扫描每个词的完整倒排列表统计词频，常见词在百万级数据上要几十毫秒，这里不用。
+    # - 更早的匹配接在后面按时间倒序分页。
+    columns = ', '.join(f'e.{column.strip()}' for column in EVENT_LIST_COLUMNS.split(','))
+    candidates = [row[0] for row in conn.execute(
+        'SELECT rowid FROM events_fts WHERE events_fts MATCH ? ORDER BY rowid DESC LIMIT ?',
+        (match, SEARCH_RANK_WINDOW)
+    )]
+    ranked = []
+    for i in range(0, len(candidates), 500):
+        chunk = candidates[i:i + 500]
+        ranked.extend(dict(row) for row in conn.execute(f'''
+            SELECT {columns} FROM {ALL_EVENTS} e
+            WHERE e.id IN ({','.join('?' * len(chunk))}) {filters}
+        ''', [*chunk, *params]))
+    for event in ranked:
+        event['score'] = relevance(event, words)
+    ranked.sort(key=lambda event: (-event['score'], -event['id']))
+    page = ranked[offset:offset + limit]
+    if len(page) < limit and len(candidates) == SEARCH_RANK_WINDOW:
+        # all_events 视图参与连接时会被整体物化，这里分别连接 events 和归档表，
+        # 两边都按 FTS rowid 倒序流式读取再归并
+        older_columns = columns.replace('e.id', 'events_fts.rowid AS id', 1)
+        older = conn.execute(f'''
+            SELECT {older_columns} FROM events_fts JOIN events e ON e.id = events_fts.rowid
+            WHERE events_fts MATCH ? AND events_fts.rowid < ? {filters}
+            UNION ALL
+            SELECT {older_columns} FROM events_fts JOIN events_archive e ON e.id = events_fts.rowid
+            WHERE events_fts MATCH ? AND events_fts.rowid < ? {filters}
+            ORDER BY id DESC
+            LIMIT ? OFFSET ?
+        ''', [match, candidates[-1], *params, match, candidates[-1], *params,
+              limit - len(page), max(offset - len(ranked), 0)])
+        page.extend(dict(row, score=0) for row in older)
+    return page
+
+@app.route('/api/search')
+def api_search():
+    # 全文检索（见 search.py）：标题命中的排在前面；start/end 为 YYYY-MM-DD 的日期范围
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+
+    try:
+        query = build_query(request.args.get('q', ''))
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', SEARCH_PAGE_SIZE)), 1), SEARCH_PAGE_MAX)
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('end') else None
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": f"参数错误: {e}"}), 400
+    if query is None:
+        return jsonify({"success": False, "error": "搜索关键词不能为空"}), 400
+
+    # 用户过滤加一元 +，避免规划器放弃主键查找、改走 idx_events_user_start 扫描该用户的全部日程
+    filters, params = ['AND +e.user_id = ?'], [g.user_id]
+    if start is not None:
+        # 重复日程只要在范围结束前开始就算命中
+        filters.append("AND (e.start_ts >= ? OR COALESCE(e.repeat_rule, '') <> '')")
+        params.append(int(start.timestamp()))
+    if end is not None:
+        filters.append('AND e.start_ts < ?')
+        params.append(int(end.timestamp()))
+    if request.args.get('category'):
+        filters.append('AND e.category = ?')
+        params.append(request.args['category'])
+
+    with get_db() as conn:
+        flush_pending_index(conn)
+        # owner 列把匹配限制在当前用户的日程内
+        events = search_events(
+            conn, f'owner:{owner_token(g.user_id)} AND ({query})', request.args['q'].split(),
+            ' '.join(filters), params, (page - 1) * page_size, page_size + 1
+        )
+    return jsonify({
+        "success": True,
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(events) > page_size,
+        "events": events[:page_size],
+    })
+
+@app.route('/api/stats')
+def api_stats():
+    # 分类统计：period 为 week/month/year，date 为其中任意一天；周、月按天分桶，年按月分桶
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+
+    try:
+        period = request.args.get('period', 'week')
+        anchor = datetime.strptime(request.args['date'], '%Y-%m-%d') if request.args.get('date') else datetime.now()
+        if period == 'year':
+            window_start, window_end = datetime(anchor.year, 1, 1), datetime(anchor.year + 1, 1, 1)
+        elif period in ('week', 'month'):
+            window_start, window_end = event_window(period, anchor)
+        else:
+            raise ValueError(f'未知统计周期: {period}')
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": f"参数错误: {e}"}), 400
+
+    with get_db() as conn:
+        summary = stats.summarize(
+            conn, g.user_id,
+            window_start.strftime('%Y-%m-%d'), window_end.strftime('%Y-%m-%d'),
+            bucket='month' if period == 'year' else 'day'
+        )
+    return jsonify({
+        "success": True,
+        "period": period,
+        "window": {
+            "start": window_start.strftime('%Y-%m-%d'),
+            "end": window_end.strftime('%Y-%m-%d'),
+        },
+        **summary,
+    })
+
+# ============= 冲突与空闲时间（见 intervals.py） =============
+# - 按 (用户, 日程版本, 窗口) 缓存区间索引，窗口内的重复日程先展开；日程变更后版本号变化，旧索引自然失效。
+# - 全天日程和没有结束时间的日程不占用时间。
+# - 只取窗口开始前 INTERVAL_MAX_SPAN 天内开始的日程，跨度更长的单个日程不计入。
+INTERVAL_MAX_SPAN = timedelta(days=int(os.getenv('INTERVAL_MAX_SPAN_DAYS', '7')))
+INTERVAL_WINDOW_MAX = timedelta(days=366)
+interval_cache = TTLCache(maxsize=int(os.getenv('INTERVAL_CACHE_SIZE', '256')), ttl=600)
+
+def load_intervals(conn, user_id, window_start, window_end):
+    start_ts, end_ts = int(window_start.timestamp()), int(window_end.timestamp())
+    intervals = []
+    for row in conn.execute(f'''
+        SELECT {EVENT_LIST_COLUMNS}, end_ts FROM {event_source(conn, user_id, start_ts)}
+        WHERE user_id = ? AND start_ts >= ? AND start_ts < ?
+        AND COALESCE(repeat_rule, '') = '' AND is_all_day = 0 AND end_ts > ?
+    ''', (user_id, int((window_start - INTERVAL_MAX_SPAN).timestamp()), end_ts, start_ts)):
+        intervals.append((row['start_ts'], row['end_ts'], interval_item(row)))
+    for row in conn.execute(f'''
+        SELECT {EVENT_LIST_COLUMNS}, exdates FROM events
+        WHERE user_id = ? AND repeat_rule <> '' AND start_ts < ? AND is_all_day = 0
+    ''', (user_id, end_ts)):
+        for event in expand_event(row, window_start - INTERVAL_MAX_SPAN, window_end):
+            end = to_epoch(event['end_time'])
+            if end is not None:
+                intervals.append((event['start_ts'], end, interval_item(event)))
+    return IntervalIndex(intervals)
+
+def interval_item(event):
+    return {
+        "id": event['id'],
+        "title": event['title'],
+        "start_time": event['start_time'],
+        "end_time": event['end_time'],
+        "recurring": bool(event['repeat_rule']),
+    }
+
+def user_intervals(user_id, window_start, window_end):
+    conn = get_db()
+    conn.execute('BEGIN')  # 读事务：版本号和日程来自同一快照
+    try:
+        version, _ = events_version(conn, user_id)
+        key = (user_id, version, int(window_start.timestamp()), int(window_end.timestamp()))
+        index = interval_cache.get(key)
+        if index is None:
+            index = load_intervals(conn, user_id, window_start, window_end)
+            interval_cache.put(key, index)
+        return index
+    finally:
+        conn.rollback()
+
+def parse_window(args, default_days=30):
+    # start/end 为 YYYY-MM-DD（end 当天包含在内），默认从今天开始 default_days 天
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    start = datetime.strptime(args['start'], '%Y-%m-%d') if args.get('start') else today
+    end = (datetime.strptime(args['end'], '%Y-%m-%d') + timedelta(days=1)
+           if args.get('end') else start + timedelta(days=default_days))
+    if end <= start:
+        raise ValueError('end 必须不早于 start')
+    if end - start > INTERVAL_WINDOW_MAX:
+        raise ValueError('时间范围不能超过一年')
+    return start, end
+
+def parse_day_hours(args):
+    # day_start/day_end 为 HH:MM，只在每天的这段时间内查找空闲；都不传时全天可用
+    if not args.get('day_start') and not args.get('day_end'):
+        return None
+    minutes = []
+    for name, default in (('day_start', '00:00'), ('day_end', '24:00')):
+        hours, _, mins = (args.get(name) or default).partition(':')
+        minutes.append(int(hours) * 60 + int(mins or 0))
+    if not 0 <= minutes[0] < minutes[1] <= 24 * 60:
+        raise ValueError('day_start 必须早于 day_end')
+    return tuple(minutes)
+
+def format_slot(start, end):
+    return {
+        "start_time": datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M:%S'),
+        "end_time": datetime.fromtimestamp(end).strftime('%Y-%m-%d %H:%M:%S'),
+        "minutes": (end - start) // 60,
+    }
+
+def place_steps(user_id, options, count):
+    # options: start（默认当前时间）、duration_minutes（默认 60）、days（查找范围，默认 14 天）、day_start/day_end
+    if options.get('start'):
+        start = parse_time(options['start'])
+        if start is None:
+            raise ValueError('start 格式错误')
+    else:
+        # 默认从下一个整刻钟开始
+        now = datetime.now().replace(second=0, microsecond=0)
+        start = now + timedelta(minutes=-now.minute % 15 or 15)
+    duration = int(options.get('duration_minutes', 60)) * 60
+    days = int(options.get('days', 14))
+    if duration <= 0 or not 0 < days <= 366:
+        raise ValueError('duration_minutes 必须大于 0，days 在 1 到 366 之间')
+    day_hours = parse_day_hours(options)
+    window_start = datetime.combine(start.date(), datetime.min.time())
+    window_end = window_start + timedelta(days=days)
+    # 新建一份索引：安排过程中会把放好的步骤记为忙碌，不能改动缓存里共享的索引
+    with get_db() as conn:
+        index = load_intervals(conn, user_id, window_start, window_end)
+    return index.place(int(start.timestamp()), int(window_end.timestamp()), duration, count, day_hours)
+
+@app.route('/api/conflicts')
+def api_conflicts():
+    # 不带 at 时返回窗口内所有互相重叠的日程对；带 at/until（YYYY-MM-DD HH:MM）时只返回与该时间段重叠的日程
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    try:
+        window_start, window_end = parse_window(request.args)
+        at = parse_time(request.args.get('at')) if request.args.get('at') else None
+        until = parse_time(request.args.get('until')) if request.args.get('until') else None
+        if request.args.get('at') and (at is None or until is None or until <= at):
+            raise ValueError('at/until 格式错误或 until 不晚于 at')
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": f"参数错误: {e}"}), 400
+
+    if at is not None:
+        # 只给 at/until 时窗口就是这段时间所在的几天，不与默认的“从今天起 30 天”合并
+        day_start = datetime.combine(at.date(), datetime.min.time())
+        day_end = datetime.combine(until.date(), datetime.min.time()) + timedelta(days=1)
+        if not request.args.get('start') and not request.args.get('end'):
+            window_start, window_end = day_start, day_end
+        window_start, window_end = min(window_start, day_start), max(window_end, day_end)
+        if window_end - window_start > INTERVAL_WINDOW_MAX:
+            return jsonify({"success": False, "error": "参数错误: 时间范围不能超过一年"}), 400
+        index = user_intervals(g.user_id, window_start, window_end)
+        overlapping = index.overlapping(int(at.timestamp()), int(until.timestamp()))
+        return jsonify({"success": True, "events": [item for _, _, item in overlapping]})
+
+    index = user_intervals(g.user_id, window_start, window_end)
+    window = (int(window_start.timestamp()), int(window_end.timestamp()))
+    return jsonify({
+        "success": True,
+        "window": {"start": window_start.strftime('%Y-%m-%d'), "end": window_end.strftime('%Y-%m-%d')},
+        "conflicts": [
+            [a, b] for a, b in index.conflicts()
+            if to_epoch(b['start_time']) < window[1] and to_epoch(a['end_time']) > window[0]
+        ],
+    })
+
+@app.route('/api/free-slots')
+def api_free_slots():
+    # duration 为分钟数；返回窗口内最早的 limit 个足够长的空闲时间段
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    try:
+        duration = int(request.args['duration']) * 60
+        if duration <= 0:
+            raise ValueError('duration 必须大于 0')
+        window_start, window_end = parse_window(request.args, default_days=7)
+        day_hours = parse_day_hours(request.args)
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+    except KeyError:
+        return jsonify({"success": False, "error": "缺少 duration 参数"}), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": f"参数错误: {e}"}), 400
+
+    # 不返回已经过去的时间
+    start = max(int(window_start.timestamp()), int(time.time()))
+    index = user_intervals(g.user_id, window_start, window_end)
+    slots = index.free_slots(start, int(window_end.timestamp()), duration, day_hours, limit)
+    return jsonify({"success": True, "slots": [format_slot(a, b) for a, b in slots]})
 
 @app.route('/create_event', methods=['GET', 'POST'])
 def create_event():
@@ -216,23 +1221,28 @@ def create_event():
     
     if request.method == 'POST':
         try:
+            # 表单没有提交 reminders 时使用用户的默认提醒（由触发器写入）
+            offsets = parse_offsets(request.form['reminders']) if 'reminders' in request.form else None
             with get_db() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO events VALUES (
-                        NULL, ?, ?, ?, ?, ?, ?, ?, ?, 0
-                    )
-                ''', (
-                    get_user_id(session['username']),
+                cursor.execute(INSERT_EVENT_SQL, (
+                    g.user_id,
                     request.form['title'],
                     request.form['start_time'],
                     request.form.get('end_time', ''),
                     1 if 'is_all_day' in request.form else 0,
                     request.form.get('repeat_rule', ''),
                     request.form.get('category', ''),
-                    request.form.get('notes', '')
+                    request.form.get('notes', ''),
+                    to_epoch(request.form['start_time']),
+                    to_epoch(request.form.get('end_time', '')),
+                    None
                 ))
+                if offsets is not None:
+                    set_event_reminders(conn, cursor.lastrowid, offsets)
+                finish_event_writes(conn)
                 conn.commit()
+                schedule_reminders(conn, cursor.lastrowid)
             return redirect(url_for('index'))
         except Exception as e:
             flash(f'创建失败: {str(e)}')
@@ -242,7 +1252,8 @@ def create_event():
 def text_input():
     if 'username' not in session:
         return redirect(url_for('login'))
-    return render_template('text_input.html')
+    return render_template('text_input.html',
+                           reminders=format_offsets(default_reminder_offsets(get_db(), g.user_id)))
 
 @app.route('/edit_event/<int:event_id>', methods=['GET'])
 def edit_event(event_id):
@@ -252,10 +1263,10 @@ def edit_event(event_id):
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM events 
+            cursor.execute(f'''
+                SELECT * FROM {ALL_EVENTS}
                 WHERE id = ? AND user_id = ?
-            ''', (event_id, get_user_id(session['username'])))
+            ''', (event_id, g.user_id))
             event = cursor.fetchone()
         
         if not event:
@@ -263,6 +1274,7 @@ def edit_event(event_id):
             return redirect(url_for('index'))
             
         event = dict(event)
+        event['reminders'] = format_offsets(event_reminder_offsets(get_db(), event_id))
         event['start_time'] = event['start_time'].replace(' ', 'T')
         if event['end_time']:
             event['end_time'] = event['end_time'].replace(' ', 'T')
@@ -278,25 +1290,36 @@ def update_event(event_id):
         return redirect(url_for('login'))
     
     try:
+        offsets = parse_offsets(request.form['reminders']) if 'reminders' in request.form else None
         with get_db() as conn:
             cursor = conn.cursor()
+            restore_events(conn, g.user_id, [event_id])  # 已归档的日程先搬回 events
+            # 开始时间或重复规则变了，触发器把该日程的提醒标记为 stale，提交前重新计算 fire_at
             cursor.execute('''
                 UPDATE events SET
                 title = ?, start_time = ?, end_time = ?,
-                is_all_day = ?, repeat_rule = ?, category = ?, notes = ?
+                is_all_day = ?, repeat_rule = COALESCE(?, repeat_rule), category = ?, notes = ?,
+                start_ts = ?, end_ts = ?
                 WHERE id = ? AND user_id = ?
             ''', (
                 request.form['title'],
                 request.form['start_time'],
                 request.form.get('end_time', ''),
                 1 if 'is_all_day' in request.form else 0,
-                request.form.get('repeat_rule', ''),
+                request.form.get('repeat_rule'),  # 表单没有提交重复规则时保持原规则
                 request.form.get('category', ''),
                 request.form.get('notes', ''),
+                to_epoch(request.form['start_time']),
+                to_epoch(request.form.get('end_time', '')),
                 event_id,
-                get_user_id(session['username'])
+                g.user_id
             ))
+            if offsets is not None and cursor.rowcount:
+                set_event_reminders(conn, event_id, offsets)
+            finish_event_writes(conn)
             conn.commit()
+            schedule_reminders(conn, event_id)
+        occurrence_cache.invalidate(event_id)
         return redirect(url_for('index'))
     except Exception as e:
         flash(f'更新失败: {str(e)}')
@@ -310,79 +1333,405 @@ def delete_event(event_id):
     try:
         with get_db() as conn:
             cursor = conn.cursor()
+            restore_events(conn, g.user_id, [event_id])  # 已归档的日程先搬回 events 再删除
             cursor.execute('''
                 DELETE FROM events 
                 WHERE id = ? AND user_id = ?
-            ''', (event_id, get_user_id(session['username'])))
+            ''', (event_id, g.user_id))
+            finish_event_writes(conn)
             conn.commit()
+        # 调度器里残留的条目触发时回库发现提醒已删除，直接跳过
+        occurrence_cache.invalidate(event_id)
         return redirect(url_for('index'))
     except Exception as e:
         flash(f'删除失败: {str(e)}')
         return redirect(url_for('index'))
 
+# ============= 批量操作 =============
+# - 一次请求提交多条 create/update/delete，先全部校验，有任何一条不合法就整体拒绝；
+#   校验通过后在同一个事务里执行（新建逐条插入以取得各自的 id，修改和删除按类型 executemany），返回逐条结果。
+# - update 只修改传入的字段；spread 把没有开始时间的新日程依次排进给定的时间段。
+
+BULK_MAX_OPERATIONS = 1000
+EVENT_FIELDS = ('title', 'start_time', 'end_time', 'is_all_day', 'repeat_rule', 'category', 'notes')
+
+BULK_UPDATE_SQL = '''
+    UPDATE events SET
+    title = COALESCE(?, title), start_time = COALESCE(?, start_time),
+    end_time = COALESCE(?, end_time), is_all_day = COALESCE(?, is_all_day),
+    repeat_rule = COALESCE(?, repeat_rule), category = COALESCE(?, category),
+    notes = COALESCE(?, notes),
+    start_ts = COALESCE(?, start_ts),
+    end_ts = CASE WHEN ? IS NULL THEN end_ts ELSE ? END
+    WHERE id = ? AND user_id = ?
+'''
+
+def validate_event_fields(event, partial):
+    # 返回 (规范化后的字段, 错误信息)；partial 为 True 时只校验传入的字段
+    if not isinstance(event, dict):
+        return None, '日程内容格式错误'
+    unknown = set(event) - set(EVENT_FIELDS)
+    if unknown:
+        return None, f"未知字段: {', '.join(sorted(unknown))}"
+    fields = {}
+    for name in EVENT_FIELDS:
+        if name not in event:
+            continue
+        value = event[name]
+        if name == 'is_all_day':
+            fields[name] = 1 if value else 0
+            continue
+        if value is None:
+            value = ''
+        if not isinstance(value, str):
+            return None, f'{name} 必须是字符串'
+        fields[name] = value.strip() if name in ('title', 'start_time', 'end_time') else value
+    if not partial and not fields.get('title'):
+        return None, '标题不能为空'
+    if 'title' in fields and not fields['title']:
+        return None, '标题不能为空'
+    if 'start_time' in fields and parse_time(fields['start_time']) is None:
+        return None, '开始时间格式错误'
+    if fields.get('end_time') and parse_time(fields['end_time']) is None:
+        return None, '结束时间格式错误'
+    return fields, None
+
+def spread_times(spread, count):
+    # 把 count 个日程排进 [start, end)：给了 end 时平均分配，否则按 interval_minutes 依次排列
+    start = parse_time(spread.get('start'))
+    if start is None:
+        raise ValueError('spread.start 格式错误')
+    end = parse_time(spread.get('end')) if spread.get('end') else None
+    if end is not None:
+        if end <= start:
+            raise ValueError('spread.end 必须晚于 spread.start')
+        slot = (end - start) / max(count, 1)
+    else:
+        slot = timedelta(minutes=int(spread.get('interval_minutes', 60)))
+        if slot <= timedelta(0):
+            raise ValueError('spread.interval_minutes 必须大于 0')
+    return [
+        ((start + slot * i).strftime('%Y-%m-%d %H:%M:%S'),
+         (start + slot * (i + 1)).strftime('%Y-%m-%d %H:%M:%S'))
+        for i in range(count)
+    ]
+
+def validate_bulk(operations, spread=None):
+    # 返回 (规范化后的操作列表, 错误列表)
+    if not isinstance(operations, list) or not operations:
+        return None, [{"index": None, "error": "operations 不能为空"}]
+    if len(operations) > BULK_MAX_OPERATIONS:
+        return None, [{"index": None, "error": f"单次最多 {BULK_MAX_OPERATIONS} 条操作"}]
+    normalized, errors = [], []
+    for index, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind not in ('create', 'update', 'delete'):
+            errors.append({"index": index, "error": "op 必须是 create/update/delete"})
+            continue
+        item = {"index": index, "op": kind}
+        if kind != 'create':
+            if not isinstance(op.get('id'), int) or isinstance(op.get('id'), bool):
+                errors.append({"index": index, "error": "缺少日程 id"})
+                continue
+            item['id'] = op['id']
+        if kind != 'delete':
+            fields, error = validate_event_fields(op.get('event'), partial=(kind == 'update'))
+            if error is None and kind == 'create' and not fields.get('start_time') and not spread:
+                error = '开始时间不能为空'
+            if error is not None:
+                errors.append({"index": index, "error": error})
+                continue
+            item['event'] = fields
+        normalized.append(item)
+    if not errors and spread:
+        unscheduled = [item for item in normalized
+                       if item['op'] == 'create' and not item['event'].get('start_time')]
+        try:
+            times = spread_times(spread, len(unscheduled))
+        except (TypeError, ValueError) as e:
+            return None, [{"index": None, "error": str(e)}]
+        for item, (start, end) in zip(unscheduled, times):
+            item['event']['start_time'] = start
+            item['event'].setdefault('end_time', end)
+    return (None if errors else normalized), errors
+
+def apply_bulk(user_id, operations):
+    # 在同一事务内执行已校验的操作，返回逐条结果
+    creates = [item for item in operations if item['op'] == 'create']
+    updates = [item for item in operations if item['op'] == 'update']
+    deletes = [item for item in operations if item['op'] == 'delete']
+    conn = get_db()
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        # 先查出哪些 id 属于当前用户，不存在的 update/delete 在结果里标记为 not_found；
+        # 涉及的已归档日程先搬回 events
+        wanted = list({item['id'] for item in updates + deletes})
+        restore_events(conn, user_id, wanted)
+        owned = set()
+        for i in range(0, len(wanted), 500):
+            chunk = wanted[i:i + 500]
+            owned.update(row['id'] for row in conn.execute(
+                f"SELECT id FROM events WHERE user_id = ? AND id IN ({','.join('?' * len(chunk))})",
+                [user_id, *chunk]
+            ))
+
+        # 逐条插入，用各自的 lastrowid 对应新 id（语句已缓存，同一事务内开销与 executemany 相当）
+        for item in creates:
+            e = item['event']
+            item['id'] = conn.execute(INSERT_EVENT_SQL, (
+                user_id,
+                e['title'], e['start_time'], e.get('end_time', ''), e.get('is_all_day', 0),
+                e.get('repeat_rule', ''), e.get('category', ''), e.get('notes', ''),
+                to_epoch(e['start_time']), to_epoch(e.get('end_time', '')), None
+            )).lastrowid
+
+        rows = []
+        for item in updates:
+            if item['id'] not in owned:
+                continue
+            e = item['event']
+            start_ts = to_epoch(e['start_time']) if 'start_time' in e else None
+            end_ts = to_epoch(e['end_time']) if 'end_time' in e else None
+            rows.append((
+                e.get('title'), e.get('start_time'), e.get('end_time'), e.get('is_all_day'),
+                e.get('repeat_rule'), e.get('category'), e.get('notes'),
+                start_ts, e.get('end_time'), end_ts,
+                item['id'], user_id
+            ))
+        if rows:
+            conn.executemany(BULK_UPDATE_SQL, rows)
+
+        doomed = [(item['id'], user_id) for item in deletes if item['id'] in owned]
+        if doomed:
+            conn.executemany('DELETE FROM events WHERE id = ? AND user_id = ?', doomed)
+        finish_event_writes(conn)
+
+    results = []
+    for item in operations:
+        status = 'ok' if item['op'] == 'create' or item['id'] in owned else 'not_found'
+        results.append({"index": item['index'], "op": item['op'], "id": item['id'], "status": status})
+    for item in updates + deletes:
+        occurrence_cache.invalidate(item['id'])
+    reminder_scheduler.request_reload()
+    return results
+
+@app.route('/api/events/bulk', methods=['POST'])
+def api_events_bulk():
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    data = request.get_json(silent=True) or {}
+    operations, errors = validate_bulk(data.get('operations'), data.get('spread'))
+    if errors:
+        return jsonify({"success": False, "error": "参数错误", "errors": errors}), 400
+    try:
+        results = apply_bulk(g.user_id, operations)
+    except sqlite3.Error as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    return jsonify({"success": True, "results": results})
+
+# 序列化后的导出内容缓存，键为 (user_id, events_version)
+export_cache = ByteLRU(max_bytes=int(os.getenv('EXPORT_CACHE_BYTES', str(64 * 1024 * 1024))))
+
+def export_events(cursor):
+    # 生成器：分批读取日程行并转换为导出字段，时间无法解析的日程跳过
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            return
+        for row in rows:
+            start = parse_time(row['start_time'])
+            if start is None:
+                print(f"时间格式错误: {row['start_time']}")
+                continue
+            rule = parse_rule(row['repeat_rule'])
+            yield {
+                'uid': f"event-{row['id']}@chimeo",
+                'title': row['title'],
+                'start': start,
+                'end': parse_time(row['end_time']),
+                'rrule': to_rrule(rule) if rule else None,
+                'exdates': parse_exdates(row['exdates']),
+                'notes': row['notes'],
+                'category': row['category'],
+                'alarms': sorted(int(m) for m in row['reminder_offsets'].split(',')) if row['reminder_offsets'] else (),
+            }
+
+def ics_response(user_id, download_name=None):
+    # 版本号决定 ETag：未变化时返回 304；命中缓存直接返回，否则边查询边流式输出并写入缓存
+    conn = get_db()
+    conn.execute('BEGIN')  # 读事务：版本号和日程来自同一快照
+    row = conn.execute('SELECT events_version FROM users WHERE id = ?', (user_id,)).fetchone()
+    version = row['events_version'] if row else 0
+    etag = f'{user_id}-{version}'
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    if download_name:
+        headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    key = (user_id, version)
+    body = export_cache.get(key)
+    if body is not None:
+        return Response(body, mimetype='text/calendar', headers=headers)
+
+    # 归档的日程也要导出：两张表各按 idx_*_user_start 有序读取再归并，仍然边查边输出
+    columns = '''id, title, start_time, end_time, repeat_rule, exdates, notes, category, start_ts,
+            (SELECT group_concat(offset_minutes) FROM reminders WHERE event_id = e.id) AS reminder_offsets'''
+    cursor = conn.execute(f'''
+        SELECT {columns} FROM events e WHERE user_id = ?
+        UNION ALL
+        SELECT {columns} FROM events_archive e WHERE user_id = ?
+        ORDER BY start_ts, id
+    ''', (user_id, user_id))
+
+    def generate():
+        chunks, size = [], 0
+        for chunk in iter_calendar(export_events(cursor)):
+            if chunks is not None:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > export_cache.max_item_bytes:
+                    chunks = None  # 太大的日历只流式输出，不缓存
+            yield chunk
+        if chunks is not None:
+            export_cache.discard(lambda k: k[0] == user_id)
+            export_cache.put(key, b''.join(chunks))
+
+    return Response(stream_with_context(generate()), mimetype='text/calendar', headers=headers)
+
 @app.route('/export_ics')
 def export_ics():
     if 'username' not in session:
         return redirect(url_for('login'))
     
     try:
-        cal = Calendar()
-        cal.add('prodid', '-//My Calendar//mxm.dk//')
-        cal.add('version', '2.0')
-
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM events 
-                WHERE user_id = ?
-            ''', (get_user_id(session['username']),))
-            events = cursor.fetchall()
-
-        for event in events:
-            ical_event = Event()
-            ical_event.add('summary', event['title'])
-            
-            # 处理时间
-            start_time_str = event['start_time']
-            try:
-                if 'T' in start_time_str:
-                    start_time = datetime.strptime(start_time_str, '%Y-%m-%dT%H:%M')
-                else:
-                    start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S')
-                ical_event.add('dtstart', start_time)
-                
-                if event['end_time']:
-                    end_time_str = event['end_time']
-                    if 'T' in end_time_str:
-                        end_time = datetime.strptime(end_time_str, '%Y-%m-%dT%H:%M')
-                    else:
-                        end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S')
-                    ical_event.add('dtend', end_time)
-                
-                # 添加备注（可选）
-                if event['notes']:
-                    ical_event.add('description', event['notes'])
-                
-                # ✅ 关键修复：添加分类标签
-                if event['category']:
-                    ical_event.add('categories', event['category'])  # 写入 CATEGORIES 字段
-                
-                cal.add_component(ical_event)
-            except ValueError as e:
-                print(f"时间格式错误: {str(e)}")
-                continue
-
-        ics_file = BytesIO(cal.to_ical())
-        return send_file(
-            ics_file,
-            as_attachment=True,
-            download_name='my_schedule.ics',
-            mimetype='text/calendar'
-        )
+        return ics_response(g.user_id, download_name='my_schedule.ics')
     except Exception as e:
         flash(f'导出失败: {str(e)}')
         return redirect(url_for('index'))
 
+@app.route('/feed/<token>.ics')
+def feed(token):
+    # 订阅地址：凭 token 访问，无需登录，供外部日历客户端定期拉取
+    row = get_db().execute('SELECT id FROM users WHERE feed_token = ?', (token,)).fetchone()
+    if not row:
+        return '订阅地址无效', 404
+    return ics_response(row['id'])
+
+@app.route('/api/feed_url', methods=['GET', 'POST'])
+def api_feed_url():
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    # GET 返回（必要时生成）订阅地址，POST 重新生成，旧地址随即失效
+    user_id = g.user_id
+    with get_db() as conn:
+        row = conn.execute('SELECT feed_token FROM users WHERE id = ?', (user_id,)).fetchone()
+        token = row['feed_token']
+        if request.method == 'POST' or not token:
+            token = secrets.token_urlsafe(24)
+            conn.execute('UPDATE users SET feed_token = ? WHERE id = ?', (token, user_id))
+    return jsonify({"success": True, "url": url_for('feed', token=token, _external=True)})
+
+IMPORT_BATCH = 1000                      # 每批 executemany 的行数，后台任务每批一个事务
+IMPORT_ASYNC_BYTES = 2 * 1024 * 1024     # 超过该大小的文件转为后台任务导入
+
+# 后台导入任务：进度保存在 import_jobs 表，进度查询落到任何 worker 都能查到；
+# 导入本身在接收上传的进程里由后台线程执行。最后更新超过 IMPORT_JOB_TTL 秒的任务在新任务开始时删除，
+# 运行中的任务超过 IMPORT_JOB_STALL 秒没有进度视为所在进程已退出
+IMPORT_JOB_TTL = int(os.getenv('IMPORT_JOB_TTL', '86400'))
+IMPORT_JOB_STALL = int(os.getenv('IMPORT_JOB_STALL', '600'))
+
+def import_events(stream, user_id, progress=None, atomic=False):
+    # 流式解析 + 分批写入；progress(imported) 在每批写入后回调。
+    # atomic=True 时（页面上直接导入的小文件）全部写完才提交，中途出错整体回滚，不会只导入一部分；
+    # 后台任务的大文件每批提交一次，出错时已提交的批次保留，任务状态里有已导入的条数
+    imported = 0
+    rows = []
+    conn = get_db()
+
+    def flush():
+        nonlocal imported
+        conn.executemany(INSERT_EVENT_SQL, [params for params, alarms in rows if alarms is None])
+        for params, alarms in rows:
+            if alarms is not None:
+                # 带 VALARM 的日程用文件里的提醒替换用户的默认提醒
+                set_event_reminders(conn, conn.execute(INSERT_EVENT_SQL, params).lastrowid, alarms)
+        finish_event_writes(conn)
+        if not atomic:
+            conn.commit()
+        imported += len(rows)
+        rows.clear()
+        if progress:
+            progress(imported)
+
+    try:
+        for event in iter_events(stream):
+            alarms = event['alarms']
+            if alarms is not None:
+                alarms = [minutes for minutes in alarms if minutes <= MAX_OFFSET_MINUTES][:MAX_REMINDERS]
+            rows.append(((
+                user_id,
+                event['title'],
+                event['start_time'],
+                event['end_time'],
+                0,  # is_all_day
+                event['repeat_rule'],
+                event['category'],
+                event['notes'],
+                to_epoch(event['start_time']),
+                to_epoch(event['end_time']),
+                format_exdates(event['exdates']) or None
+            ), alarms))
+            if len(rows) >= IMPORT_BATCH:
+                flush()
+        if rows:
+            flush()
+        conn.commit()
+    except Exception:
+        conn.rollback()  # 丢弃未提交的部分
+        raise
+    reminder_scheduler.request_reload()
+    return imported
+
+def update_import_job(job_id, **fields):
+    fields['updated_ts'] = int(time.time())
+    with get_db() as conn:
+        conn.execute(f"UPDATE import_jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                     [*fields.values(), job_id])
+
+def run_import_job(job_id, path, user_id):
+    try:
+        with app.app_context(), open(path, 'rb') as f:
+            stream = ProgressStream(f)
+
+            def progress(imported):
+                update_import_job(job_id, imported=imported, bytes_read=stream.bytes_read)
+
+            try:
+                imported = import_events(stream, user_id, progress)
+                update_import_job(job_id, status='done', imported=imported, bytes_read=os.path.getsize(path))
+            except Exception as e:
+                print(f"导入错误详情: {str(e)}")
+                update_import_job(job_id, status='failed', error=str(e))
+    finally:
+        os.remove(path)
+
+def start_import_job(file, user_id):
+    # 大文件先落盘（按块写入，不整体读入内存），再交给后台线程导入
+    fd, path = tempfile.mkstemp(suffix='.ics')
+    with os.fdopen(fd, 'wb') as f:
+        file.save(f)
+    job_id = uuid.uuid4().hex
+    now = int(time.time())
+    with get_db() as conn:
+        conn.execute('DELETE FROM import_jobs WHERE updated_ts < ?', (now - IMPORT_JOB_TTL,))
+        conn.execute('''
+            INSERT INTO import_jobs (id, user_id, status, total_bytes, updated_ts)
+            VALUES (?, ?, 'running', ?, ?)
+        ''', (job_id, user_id, os.path.getsize(path), now))
+    threading.Thread(target=run_import_job, args=(job_id, path, user_id), daemon=True).start()
+    return job_id
+
 @app.route('/import_ics', methods=['GET', 'POST'])
 def import_ics():
     if 'username' not in session:
@@ -400,80 +1749,16 @@ def import_ics():
             
         if file and file.filename.endswith('.ics'):
             try:
-                file.seek(0)
-                ics_content = file.read()
-                
-                if not ics_content:
-                    flash('文件内容为空')
-                    return redirect(request.url)
-                
-                try:
-                    ics_content = ics_content.decode('utf-8')
-                except UnicodeDecodeError:
-                    try:
-                        ics_content = ics_content.decode('gbk')
-                    except:
-                        flash('文件编码不支持')
-                        return redirect(request.url)
+                user_id = g.user_id
+                if (request.content_length or 0) > IMPORT_ASYNC_BYTES:
+                    job_id = start_import_job(file, user_id)
+                    return render_template('import_ics.html', job_id=job_id)
                 
-                cal = Calendar.from_ical(ics_content)
-                if not cal:
-                    flash('无效的日历文件')
+                file.seek(0)
+                imported_count = import_events(file.stream, user_id, atomic=True)
+                if not imported_count:
+                    flash('文件中没有可导入的日程')
                     return redirect(request.url)
-                
-                user_id = get_user_id(session['username'])
-                imported_count = 0
-                
-                with get_db() as conn:
-                    cursor = conn.cursor()
-                    for component in cal.walk():
-                        if component.name == 'VEVENT':
-                            # 获取分类
-                            ical_categories = component.get('categories')
-                            category = 'other'  # 默认值
-                            
-                            if ical_categories:
-                                try:
-                                    # 处理分类数据 - 关键修复点
-                                    if hasattr(ical_categories, 'cats'):  # 处理vCategory对象
-                                        categories = ical_categories.cats
-                                    elif isinstance(ical_categories, list):
-                                        categories = [str(cat) for cat in ical_categories]
-                                    else:
-                                        categories = str(ical_categories).split(',')
-                                    
-                                    # 获取第一个分类并清理
-                                    if categories:
-                                        first_category = categories[0].strip().lower()
-                                        # 直接使用小写分类名，确保与前端样式匹配
-                                        category = first_category if first_category in ['work', 'study', 'life', 'other'] else 'other'
-                                except Exception as e:
-                                    print(f"分类处理错误: {e}")
-                                    category = 'other'
-                            
-                            # 处理时间和其他字段...
-                            dtstart = component.get('dtstart').dt
-                            start_time = dtstart.strftime('%Y-%m-%d %H:%M:%S')
-                            
-                            dtend = component.get('dtend')
-                            end_time = dtend.dt.strftime('%Y-%m-%d %H:%M:%S') if dtend else None
-                            
-                            cursor.execute('''
-                                INSERT INTO events VALUES (
-                                    NULL, ?, ?, ?, ?, ?, ?, ?, ?, 0
-                                )
-                            ''', (
-                                user_id,
-                                str(component.get('summary')),
-                                start_time,
-                                end_time,
-                                0,  # is_all_day
-                                '',  # repeat_rule
-                                category,
-                                str(component.get('description')) if component.get('description') else None
-                            ))
-                            imported_count += 1
-                    conn.commit()
                 flash(f'成功导入 {imported_count} 个日程')
                 return redirect(url_for('index'))
             except Exception as e:
@@ -483,80 +1768,250 @@ def import_ics():
             flash('仅支持.ics文件')
     return render_template('import_ics.html')
 
+@app.route('/api/import_jobs/<job_id>')
+def api_import_job(job_id):
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    row = get_db().execute('''
+        SELECT status, imported, bytes_read, total_bytes, error, updated_ts FROM import_jobs
+        WHERE id = ? AND user_id = ?
+    ''', (job_id, g.user_id)).fetchone()
+    if row is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    job = dict(row)
+    if job['status'] == 'running' and job['updated_ts'] < time.time() - IMPORT_JOB_STALL:
+        job.update(status='failed', error='导入进程已退出，请重新导入')
+    del job['updated_ts']
+    return jsonify(job)
+
 # ============= 新增的邮件提醒功能 =============
+# - 每个日程的提醒保存在 reminders 表（见 reminders.py），日程写入时触发器把提醒标记为 stale，
+#   写入路径在提交前用 finish_event_writes 重新计算 fire_at；
+#   调度器只按 fire_at 索引做范围扫描，触发时入队并推进 fire_at。
+
+def event_reminder_offsets(conn, event_id):
+    return [row[0] for row in conn.execute(
+        'SELECT offset_minutes FROM reminders WHERE event_id = ? ORDER BY offset_minutes', (event_id,)
+    )]
+
+def set_event_reminders(conn, event_id, offsets):
+    # 替换日程的提醒提前量；未变化的提醒保留原来的 fire_at，已发送的不会重发；
+    # 新增的提醒标记为 stale，由调用方在提交前 finish_event_writes
+    offsets = json.dumps(list(offsets))
+    conn.execute('''
+        DELETE FROM reminders
+        WHERE event_id = ? AND offset_minutes NOT IN (SELECT value FROM json_each(?))
+    ''', (event_id, offsets))
+    conn.execute('''
+        INSERT OR IGNORE INTO reminders (event_id, offset_minutes, fire_at, stale)
+        SELECT ?, value, NULL, 1 FROM json_each(?)
+    ''', (event_id, offsets))
+
+def schedule_reminders(conn, event_id):
+    # 日程写入后把它的提醒推给本进程的调度器；调度器在其他进程时由 ChangeWatcher 触发重新载入
+    for row in conn.execute(
+        'SELECT fire_at, id FROM reminders WHERE event_id = ? AND fire_at IS NOT NULL', (event_id,)
+    ):
+        reminder_scheduler.notify(row['id'], row['fire_at'])
+
+def load_due_reminders(limit):
+    # idx_reminders_fire_at 有序扫描，只取最早的 limit 条；
+    # 先补算其他连接（维护脚本、sqlite3 命令行）写入日程后留下的 stale 提醒
+    with get_db() as conn:
+        refresh_reminders(conn)
+        return [tuple(row) for row in conn.execute('''
+            SELECT fire_at, id FROM reminders
+            WHERE fire_at IS NOT NULL
+            ORDER BY fire_at
+            LIMIT ?
+        ''', (limit,))]
+
+def reminder_body(title, when, offset_minutes=0):
+    body = f"您有一个即将开始的日程:\n\n标题: {title}\n时间: {when.strftime('%Y-%m-%d %H:%M:%S')}"
+    if offset_minutes:
+        body += f"\n提醒: {describe_offset(offset_minutes)}"
+    return body
+
+def due_occurrence(row, now_ts):
+    # fire_at 到现在之间提醒时间已到的最近一次发生；错过的多次只补发最近一次
+    dtstart = parse_time(row['start_time'])
+    if dtstart is None:
+        return None
+    offset = timedelta(minutes=row['offset_minutes'])
+    due = None
+    for due in occurrences(dtstart, parse_rule(row['repeat_rule']),
+                           datetime.fromtimestamp(row['fire_at']) + offset,
+                           datetime.fromtimestamp(now_ts + 1) + offset,
+                           parse_exdates(row['exdates'])):
+        pass
+    return due
+
+def fire_reminders(due):
+    # 触发时回库核对：已删除、已改期或已提醒的条目（fire_at 已不在到期范围）直接跳过；
+    # 入队和推进 fire_at 在同一事务里完成，SMTP 发送由 mail_outbox 的工作线程完成
+    now_ts = int(time.time())
+    reminder_ids = sorted({reminder_id for _, reminder_id in due})
+    rescheduled = []
+    with get_db() as conn:
+        # 先拿写锁再读：多个进程同时触发同一批提醒时串行执行，后来者看到的已是推进后的 fire_at
+        conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute(f'''
+            SELECT r.id, r.offset_minutes, r.fire_at, e.id AS event_id, e.title,
+                e.start_time, e.repeat_rule, e.exdates, u.email
+            FROM reminders r
+            JOIN events e ON e.id = r.event_id
+            JOIN users u ON e.user_id = u.id
+            WHERE r.id IN ({','.join('?' * len(reminder_ids))})
+            AND r.fire_at <= ?
+        ''', (*reminder_ids, now_ts)).fetchall()
+        updates = []
+        for row in rows:
+            occurrence = due_occurrence(row, now_ts)
+            occurrence_ts = None
+            if occurrence is not None:
+                occurrence_ts = int(occurrence.timestamp())
+                if not enqueue(conn, row['email'], "【日程提醒】",
+                               reminder_body(row['title'], occurrence, row['offset_minutes']),
+                               event_id=row['event_id'], occurrence_ts=occurrence_ts,
+                               reminder_offset=row['offset_minutes']):
+                    occurrence_ts = None  # 已经入队过，送达状态由原来那封邮件决定
+            # 一次性日程得到 None（不再提醒），重复日程得到下一次发生的提醒时间
+            next_ts = reminder_fire_at(row['start_time'], row['repeat_rule'], row['exdates'],
+                                       row['offset_minutes'], now_ts)
+            updates.append((next_ts, occurrence_ts, occurrence_ts, row['id']))
+            if next_ts is not None:
+                rescheduled.append((next_ts, row['id']))
+        # fire_at 推进不代表已送达：delivery_status 先记为 queued，发件箱确认后改为 sent 或 failed
+        conn.executemany('''
+            UPDATE reminders SET fire_at = ?,
+                last_occurrence_ts = COALESCE(?, last_occurrence_ts),
+                delivery_status = CASE WHEN ? IS NULL THEN delivery_status ELSE 'queued' END
+            WHERE id = ?
+        ''', updates)
+        conn.commit()
+    mail_outbox.wake()
+    return rescheduled
+
+def mark_reminders(status):
+    # 发件箱标记 sent/failed 的同一事务里更新对应提醒的送达状态；
+    # 只有仍是最近一次入队的那次发生才改 delivery_status，较早的邮件晚到不会覆盖
+    def mark(conn, rows):
+        params = [(row['occurrence_ts'], row['event_id'], row['reminder_offset'])
+                  for row in rows if row['event_id'] is not None]
+        if status == 'sent':
+            conn.executemany('''
+                UPDATE reminders SET
+                    delivered_ts = MAX(COALESCE(delivered_ts, ?1), ?1),
+                    delivery_status = CASE WHEN last_occurrence_ts IS ?1 THEN 'sent' ELSE delivery_status END
+                WHERE event_id = ?2 AND offset_minutes = ?3
+            ''', params)
+        else:
+            conn.executemany('''
+                UPDATE reminders SET delivery_status = 'failed'
+                WHERE event_id = ?2 AND offset_minutes = ?3 AND last_occurrence_ts IS ?1
+            ''', params)
+    return mark
+
+mail_outbox = Outbox(get_db, on_delivered=mark_reminders('sent'), on_failed=mark_reminders('failed'),
+                     workers=int(os.getenv('MAIL_WORKERS', '2')))
+reminder_scheduler = ReminderScheduler(load_due_reminders, fire_reminders)
+
 def check_reminders():
-    while True:
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        try:
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT e.id, e.title, u.email 
-                    FROM events e
-                    JOIN users u ON e.user_id = u.id
-                    WHERE e.is_reminded = 0 
-                    AND datetime(e.start_time) <= datetime(?)
-                ''', (now,))
-                events_to_remind = cursor.fetchall()
-                
-                for event_id, title, email in events_to_remind:
-                    try:
-                        send_email(
-                            "【日程提醒】",
-                            f"您有一个即将开始的日程:\n\n标题: {title}\n时间: {now}",
-                            email
-                        )
-                        cursor.execute('UPDATE events SET is_reminded = 1 WHERE id = ?', (event_id,))
-                        print(f"✓ 已发送提醒给 {email}")
-                    except Exception as e:
-                        print(f"✗ 邮件发送失败: {str(e)}")
-                
-                conn.commit()
-        except Exception as e:
-            print(f"提醒系统错误: {str(e)}")
-        
-        time.sleep(60)  # 每分钟检查一次
+    # 不再每分钟轮询：调度器睡到最早的提醒时间，日程变更时被提前唤醒
+    reminder_scheduler.run_forever()
+
+def start_background_services(elect_leader=False, reminders=True):
+    # 发件箱工作线程、变更日志压缩和日程归档在每个进程都启动（认领是原子的，压缩和归档是幂等的）；
+    # elect_leader=True 时提醒调度器只在抢到租约的进程里运行，并轮询其他进程的写入；
+    # reminders=False 时本进程不运行调度器（由 reminder_worker.py 负责）
+    mail_outbox.start()
+    metrics.start_flusher()
+    threading.Thread(target=run_change_log_compactor, name='change-log-compactor', daemon=True).start()
+    if ARCHIVE_INTERVAL > 0:
+        threading.Thread(target=run_archiver, name='event-archiver', daemon=True).start()
+    if not reminders:
+        return None
+    if not elect_leader:
+        threading.Thread(target=check_reminders, daemon=True).start()
+        return None
+    watcher = ChangeWatcher(lambda: sqlite3.connect(app.config['DATABASE']),
+                            reminder_scheduler.request_reload,
+                            interval=float(os.getenv('REMINDER_WATCH_INTERVAL', '1')))
+    leader = LeaderRunner(LeaderLease(get_db, 'reminders', ttl=int(os.getenv('REMINDER_LEASE_TTL', '30'))),
+                          check_reminders, reminder_scheduler.stop)
+    threading.Thread(target=watcher.run, name='reminder-watcher', daemon=True).start()
+    threading.Thread(target=leader.run, name='reminder-leader', daemon=True).start()
+    return leader
+
+def create_app():
+    # 生产环境入口（见 wsgi.py / gunicorn.conf.py），preload_app 时只在 master 里执行一次：
+    # - MIGRATE_ON_START=0 时由部署步骤执行 flask --app app init-db；之后都执行 check_schema，
+    #   版本号落后或触发器缺少归档搬移条件则拒绝启动
+    # - 预先编译全部模板，fork 出的 worker 直接共用，第一个请求不再编译
+    # - 关闭连接池，避免 SQLite 连接被 fork 到 worker 里共用
+    # openai 客户端、SMTP 会话和后台线程都不在这里创建，分别在第一次拆分、发件线程启动时才初始化
+    app.config['DATABASE'] = os.getenv('DATABASE', app.config['DATABASE'])
+    if os.getenv('MIGRATE_ON_START', '1') == '1':
+        init_db()
+    check_schema()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    close_pool()
+    return app
 
 
 # 在app.py中添加以下路由
 @app.route('/save_subtasks', methods=['POST'])
 def save_subtasks():
+    # 保留给旧页面使用，内部转换为批量创建
     if 'username' not in session:
         return jsonify({"error": "请先登录"}), 401
     
     data = request.json
     main_task = data.get('main_task')
     steps = data.get('steps')
-    selected_indices = data.get('selected_indices', [])  # 新增：获取选中的步骤索引
+    selected = set(data.get('selected_indices', []))  # 新增：获取选中的步骤索引
     
     if not main_task or not steps:
         return jsonify({"error": "缺少必要参数"}), 400
     
+    # 给了 spread 时依次排进该时间段；给了 auto_place 时放进最早的空闲时间；否则与原来一样全部从当前时间开始
+    spread = data.get('spread')
+    auto_place = data.get('auto_place')
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    operations = []
+    for i, step in enumerate(steps):
+        if i in selected:  # 只处理选中的步骤
+            event = {
+                "title": f"{main_task} - 步骤{i+1}: {step}",
+                "category": "work",
+                "notes": f"主任务: {main_task}\n步骤内容: {step}",
+            }
+            if not spread:
+                event['start_time'] = now
+            operations.append({"op": "create", "event": event})
+    if not operations:
+        return jsonify({"success": True, "redirect": url_for('index'), "saved_count": 0})
+    if auto_place and not spread:
+        try:
+            slots = place_steps(g.user_id, auto_place, len(operations))
+        except (ValueError, TypeError) as e:
+            return jsonify({"success": False, "error": f"auto_place 参数错误: {e}"}), 400
+        if len(slots) < len(operations):
+            return jsonify({"success": False, "error": "指定范围内的空闲时间不足"}), 409
+        for operation, (start, end) in zip(operations, slots):
+            slot = format_slot(start, end)
+            operation['event']['start_time'] = slot['start_time']
+            operation['event']['end_time'] = slot['end_time']
+    operations, errors = validate_bulk(operations, spread)
+    if errors:
+        return jsonify({"success": False, "error": errors[0]['error']}), 400
     try:
-        user_id = get_user_id(session['username'])
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # 只保存选中的子步骤
-            for i, step in enumerate(steps):
-                if i in selected_indices:  # 只处理选中的步骤
-                    cursor.execute('''
-                        INSERT INTO events VALUES (
-                            NULL, ?, ?, ?, ?, ?, ?, ?, ?, 0
-                        )
-                    ''', (
-                        user_id,
-                        f"{main_task} - 步骤{i+1}: {step}",
-                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        '', 0, '', 'work', 
-                        f"主任务: {main_task}\n步骤内容: {step}",
-                    ))
-            
-            conn.commit()
+        apply_bulk(g.user_id, operations)
         return jsonify({
             "success": True, 
             "redirect": url_for('index'),
-            "saved_count": len(selected_indices)  # 返回保存的数量
+            "saved_count": len(operations)  # 返回保存的数量
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -574,13 +2029,178 @@ def api_split_task():
     if not task:
         return jsonify({"error": "任务描述不能为空"}), 400
     
-    steps = splitter.split_task(task, language)
+    try:
+        steps = splitter.split_task(task, language)
+    except SplitterBusy:
+        return jsonify({"success": False, "error": "任务拆分服务繁忙，请稍后再试"}), 503
+    except SplitterTimeout:
+        return jsonify({"success": False, "error": "任务拆分超时"}), 504
     
     if steps:
         return jsonify({"success": True, "steps": steps})
     else:
         return jsonify({"success": False, "error": "任务拆分失败"}), 500
 
+@app.route('/api/reminders/stats')
+def api_reminder_stats():
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    # 调度精度：计划提醒时间与实际触发时间之差（秒）
+    return jsonify(reminder_scheduler.stats())
+
+def default_reminder_offsets(conn, user_id):
+    row = conn.execute('SELECT reminder_offsets FROM users WHERE id = ?', (user_id,)).fetchone()
+    return json.loads(row['reminder_offsets']) if row else []
+
+@app.route('/api/reminders/settings', methods=['GET', 'POST'])
+def api_reminder_settings():
+    # 新日程默认的提醒提前量（分钟）；只影响之后创建或导入的日程
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    conn = get_db()
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            offsets = parse_offsets(data.get('offsets'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        with conn:
+            conn.execute('UPDATE users SET reminder_offsets = ? WHERE id = ?', (json.dumps(offsets), g.user_id))
+    return jsonify({"success": True, "offsets": default_reminder_offsets(conn, g.user_id)})
+
+# 只反映当前进程的状态，采集 /metrics 时计算
+metrics.registry.gauge('chimeo_reminders_pending', '调度器堆中等待触发的提醒数',
+                       lambda: reminder_scheduler.stats()['pending'])
+metrics.registry.gauge('chimeo_outbox_total', '发件箱处理的邮件数', lambda: {
+    (key,): value for key, value in mail_outbox.stats.items()
+}, ('result',))
+metrics.registry.gauge('chimeo_login_rejected', '被拒绝的登录尝试数', lambda: {
+    ('throttled',): login_throttle.throttled,
+    ('busy',): password_hasher.rejected,
+}, ('reason',))
+metrics.registry.gauge('chimeo_cache_hit_ratio', '缓存命中率', lambda: {
+    ('split',): splitter.cache.stats()['hit_rate'],
+    ('identity',): identity_cache.stats()['hit_rate'],
+    ('export',): export_cache.stats()['hit_rate'],
+    ('render',): render_cache.stats()['hit_rate'],
+}, ('cache',))
+metrics.registry.gauge('chimeo_cache_bytes', '缓存占用的字节数', lambda: {
+    ('export',): export_cache.stats()['bytes'],
+    ('render',): render_cache.stats()['bytes'],
+}, ('cache',))
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    return jsonify({
+        "render": render_cache.stats(),
+        "export": export_cache.stats(),
+        "identity": identity_cache.stats(),
+        "split": splitter.cache.stats(),
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus 文本格式；设置 METRICS_TOKEN 时需要 Authorization: Bearer <token>
+    token = os.getenv('METRICS_TOKEN')
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/split-task/stream')
+def api_split_task_stream():
+    # Server-Sent Events：每解析出一个步骤推送一条 step 事件，结束时推送 done（或 error）
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    task = request.args.get('task', '').strip()
+    language = request.args.get('language', 'zh-CN')
+    if not task:
+        return jsonify({"error": "任务描述不能为空"}), 400
+
+    def generate():
+        started = time.perf_counter()
+        first_step = None
+        steps = []
+        try:
+            for step in splitter.stream_task(task, language):
+                if first_step is None:
+                    first_step = time.perf_counter() - started
+                yield sse('step', {"index": len(steps), "step": step})
+                steps.append(step)
+        except SplitterBusy:
+            yield sse('error', {"error": "任务拆分服务繁忙，请稍后再试"})
+            return
+        except SplitterFailed:
+            yield sse('error', {"error": "任务拆分失败"})
+            return
+        yield sse('done', {
+            "steps": steps,
+            "first_step_ms": round(first_step * 1000, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 关闭 nginx 的响应缓冲，步骤才能逐条到达浏览器
+    })
+
+SPLIT_BATCH_MAX = int(os.getenv('SPLIT_BATCH_MAX', '50'))
+SPLIT_ERRORS = {
+    SplitterBusy: "任务拆分服务繁忙，请稍后再试",
+    SplitterTimeout: "任务拆分超时",
+    SplitterFailed: "任务拆分失败",
+}
+
+@app.route('/api/split-task/batch', methods=['POST'])
+def api_split_task_batch():
+    # Server-Sent Events：并发拆分多个任务，每完成一个推送一条 result（或 error），
+    # index 为任务在请求中的序号，结果按完成顺序到达；全部完成后推送 done
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    data = request.get_json(silent=True) or {}
+    tasks = data.get('tasks')
+    language = data.get('language', 'zh-CN')
+    pack = bool(data.get('pack', False))
+    if not isinstance(tasks, list) or not tasks:
+        return jsonify({"error": "任务列表不能为空"}), 400
+    if len(tasks) > SPLIT_BATCH_MAX:
+        return jsonify({"error": f"一次最多拆分 {SPLIT_BATCH_MAX} 个任务"}), 400
+    if not all(isinstance(task, str) and task.strip() for task in tasks):
+        return jsonify({"error": "任务描述不能为空"}), 400
+    tasks = [task.strip() for task in tasks]
+
+    def generate():
+        started = time.perf_counter()
+        succeeded = 0
+        for index, outcome in splitter.split_many(tasks, language, pack):
+            if isinstance(outcome, Exception):
+                yield sse('error', {"index": index, "task": tasks[index],
+                                    "error": SPLIT_ERRORS.get(type(outcome), "任务拆分失败")})
+            else:
+                succeeded += 1
+                yield sse('result', {"index": index, "task": tasks[index], "steps": outcome})
+        yield sse('done', {
+            "total": len(tasks),
+            "succeeded": succeeded,
+            "failed": len(tasks) - succeeded,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/split-task/stats')
+def api_split_task_stats():
+    if 'username' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    return jsonify(splitter.stats())
+
 # 新增任务拆分页面路由
 @app.route('/task_splitter')
 def task_splitter():
@@ -588,9 +2208,54 @@ def task_splitter():
         return redirect(url_for('login'))
     return render_template('task_splitter.html')
 
+@app.cli.command('init-db')
+def init_db_command():
+    # flask --app app init-db：部署时执行一次数据库迁移（配合 MIGRATE_ON_START=0）
+    init_db()
+    click.echo(f"数据库已是最新版本 {app.config['DATABASE']}")
+
+@app.cli.command('compact-changes')
+def compact_changes_command():
+    # flask --app app compact-changes：立即压缩增量同步的变更日志
+    init_db()
+    compact_change_log()
+
+@app.cli.command('archive-events')
+def archive_events_command():
+    # flask --app app archive-events：立即按 ARCHIVE_AFTER_DAYS 归档旧日程
+    init_db()
+    archive_old_events()
+
+@app.cli.command('hash-passwords')
+def hash_passwords_command():
+    # flask --app app hash-passwords：把仍是明文的密码一次性改写为哈希，不必等用户下次登录
+    init_db()
+    conn = get_db()
+    rows = [row for row in conn.execute('SELECT id, password FROM users') if not is_hashed(row['password'])]
+    for row in rows:
+        conn.execute('UPDATE users SET password = ? WHERE id = ? AND password = ?',
+                     (password_hasher.hash(row['password']), row['id'], row['password']))
+        conn.commit()
+    click.echo(f"已改写 {len(rows)} 个明文密码")
+
+@app.cli.command('rebuild-stats')
+@click.option('--user-id', type=int, default=None, help='只重建某个用户')
+@click.option('--check', 'check_only', is_flag=True, help='只检查汇总是否与日程表一致')
+def rebuild_stats_command(user_id, check_only):
+    # flask --app app rebuild-stats [--check] [--user-id N]
+    init_db()
+    conn = get_db()
+    if not check_only:
+        stats.rebuild(conn, user_id, ALL_EVENTS)
+        print('统计汇总已重建')
+    mismatches = stats.check(conn, user_id, ALL_EVENTS)
+    for user, day, category, stored, actual in mismatches[:20]:
+        print(f'不一致: 用户 {user} {day} {category} 汇总 {stored} 实际 {actual}')
+    if mismatches:
+        raise SystemExit(f'共 {len(mismatches)} 处不一致')
+    print('统计汇总与日程表一致')
+
 if __name__ == '__main__':
     init_db()
-    update_db()
-    reminder_thread = threading.Thread(target=check_reminders, daemon=True)
-    reminder_thread.start()
+    start_background_services()
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,142 @@
+import re
+import time
+
+# - 冷热分离：已经结束、不重复、没有待发提醒的旧日程分批从 events 移到 events_archive，
+#   events 只保留近期和未来的日程，列表、提醒、写入维护的索引都只覆盖这一部分。
+# - all_events 视图把两张表 UNION ALL 起来，搜索、导出、同步和早于归档线的日期范围查询读视图；
+#   每个用户的 archived_until_ts 是已归档日程的最晚结束时间，窗口晚于它的查询只读 events。
+# - 归档和恢复都是“搬移”：events 上的插入/删除触发器在 events_archive 里已有同 id 的行时不执行，
+#   全文索引、统计汇总、提醒、版本号和变更日志保持不变，对页面和同步客户端不可见。
+# - 归档的日程不直接修改：修改或删除前先用 restore() 搬回 events，之后的写入照常触发；
+#   仍满足条件的会在下一轮重新归档。
+
+ALL_EVENTS = 'all_events'
+# events 的全部列；events 以后新增列时这里、归档表和视图要一起迁移
+COLUMNS = ('id, user_id, title, start_time, end_time, is_all_day, repeat_rule, category, notes, '
+           'is_reminded, start_ts, end_ts, exdates, reminded_ts')
+MOVE_GUARD = 'NOT EXISTS (SELECT 1 FROM events_archive WHERE id = {row}.id)'
+
+
+def create_archive(conn):
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS events_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            is_all_day INTEGER DEFAULT 0,
+            repeat_rule TEXT,
+            category TEXT,
+            notes TEXT,
+            is_reminded INTEGER DEFAULT 0,
+            start_ts INTEGER,
+            end_ts INTEGER,
+            exdates TEXT,
+            reminded_ts INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_events_archive_user_start ON events_archive (user_id, start_ts);
+        CREATE INDEX IF NOT EXISTS idx_events_archive_user_id ON events_archive (user_id);
+        CREATE VIEW IF NOT EXISTS {ALL_EVENTS} AS
+            SELECT {COLUMNS} FROM events
+            UNION ALL
+            SELECT {COLUMNS} FROM events_archive;
+    ''')
+    guard_triggers(conn)
+
+
+def guard_triggers(conn):
+    # 给 events 上现有的 AFTER INSERT / AFTER DELETE 触发器加上 MOVE_GUARD，触发器体保持原样；
+    # 以后新增此类触发器时也要带上同样的 WHEN 条件
+    statements = []
+    for name, sql in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'events'"
+    ).fetchall():
+        match = re.search(r'AFTER (INSERT|DELETE) ON events\s+BEGIN\b', sql)
+        if not match:
+            continue
+        guard = MOVE_GUARD.format(row='NEW' if match.group(1) == 'INSERT' else 'OLD')
+        head = sql[:match.end()][:-len('BEGIN')]
+        statements.append(f'DROP TRIGGER {name};\n{head}WHEN {guard}\n        BEGIN{sql[match.end():]};')
+    if statements:
+        conn.executescript('BEGIN;\n' + '\n'.join(statements) + '\nCOMMIT;')
+
+
+def unguarded_triggers(conn):
+    # events 上缺少 MOVE_GUARD 的 AFTER INSERT / AFTER DELETE 触发器名；不为空时搬移会重复计数或丢失数据，
+    # 启动检查（app.check_schema）据此拒绝启动
+    names = []
+    for name, sql in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'events'"
+    ).fetchall():
+        match = re.search(r'AFTER (INSERT|DELETE) ON events\b', sql)
+        if match and MOVE_GUARD.format(row='NEW' if match.group(1) == 'INSERT' else 'OLD') not in sql:
+            names.append(name)
+    return sorted(names)
+
+
+def _move(conn, source, target, user_id, ids):
+    # 先写入目标表再从源表删除，删除/插入触发器据此识别为搬移
+    marks = ','.join('?' * len(ids))
+    moved = conn.execute(f'''
+        INSERT INTO {target} ({COLUMNS})
+        SELECT {COLUMNS} FROM {source} WHERE user_id = ? AND id IN ({marks})
+    ''', [user_id, *ids]).rowcount
+    conn.execute(f'DELETE FROM {source} WHERE user_id = ? AND id IN ({marks})', [user_id, *ids])
+    return moved
+
+
+def restore(conn, user_id, ids):
+    # 把该用户已归档的日程搬回 events（事务由调用方负责），返回搬回的条数；不在归档里的 id 忽略
+    ids = list(ids)
+    restored = 0
+    for i in range(0, len(ids), 500):
+        restored += _move(conn, 'events_archive', 'events', user_id, ids[i:i + 500])
+    return restored
+
+
+def archive(conn, retention, batch=500, now=None):
+    # 归档结束时间早于 now - retention 的日程，返回归档条数；
+    # 按用户沿 idx_events_user_start 分批推进，每批一个写事务，不会长时间占用写锁
+    cutoff = int(now if now is not None else time.time()) - retention
+    archived = 0
+    for (user_id,) in conn.execute('SELECT id FROM users ORDER BY id').fetchall():
+        after_ts, after_id = -1 << 62, 0
+        while True:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                # 候选在写事务内重新查询，排队期间被改期或加了提醒的日程不会被搬走
+                rows = conn.execute('''
+                    SELECT id, start_ts, COALESCE(end_ts, start_ts) AS until_ts, repeat_rule FROM events
+                    WHERE user_id = ? AND start_ts >= ? AND start_ts < ?
+                    AND (start_ts > ? OR (start_ts = ? AND id > ?))
+                    ORDER BY start_ts, id
+                    LIMIT ?
+                ''', (user_id, after_ts, cutoff, after_ts, after_ts, after_id, batch)).fetchall()
+                if not rows:
+                    break
+                pending = {row[0] for row in conn.execute(f'''
+                    SELECT DISTINCT event_id FROM reminders
+                    WHERE (fire_at IS NOT NULL OR stale = 1) AND event_id IN ({','.join('?' * len(rows))})
+                ''', [row['id'] for row in rows])}
+                eligible = [
+                    row for row in rows
+                    if not row['repeat_rule'] and row['until_ts'] < cutoff and row['id'] not in pending
+                ]
+                if eligible:
+                    archived += _move(conn, 'events', 'events_archive', user_id, [row['id'] for row in eligible])
+                    conn.execute(
+                        'UPDATE users SET archived_until_ts = MAX(archived_until_ts, ?) WHERE id = ?',
+                        (max(row['until_ts'] for row in eligible), user_id)
+                    )
+            after_ts, after_id = rows[-1]['start_ts'], rows[-1]['id']
+            if len(rows) < batch:
+                break
+    return archived
+
+
+def event_source(conn, user_id, window_start_ts):
+    # 查询窗口从 window_start_ts 开始时应该读的表：只有窗口开始不晚于已归档日程的最晚结束时间，
+    # 归档里才可能有落在窗口内的日程
+    row = conn.execute('SELECT archived_until_ts FROM users WHERE id = ?', (user_id,)).fetchone()
+    return ALL_EVENTS if row and row[0] >= window_start_ts else 'events'
@@ -0,0 +1,117 @@
+# 冷热归档基准：固定数量的近期日程，加上不同数量的多年历史日程，对比历史留在 events（live）
+# 与移入归档（archived）时热路径的延迟：本周/本月列表、新建日程、提醒调度器载入到期提醒；
+# 另外测一次落在历史里的月份列表，确认归档的数据仍可查询（冷路径）。
+#
+#   python benchmarks/bench_archive.py --history 0 10000 100000 --hot 2000
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chimeo  # noqa: E402
+
+HISTORY_START = datetime(2015, 1, 1, 9)
+
+
+def history_starts(history):
+    # 历史日程均匀分布在 HISTORY_START 到归档线之前 30 天
+    end = datetime.now() - timedelta(seconds=chimeo.ARCHIVE_RETENTION) - timedelta(days=30)
+    step = (end - HISTORY_START) / max(history, 1)
+    return [HISTORY_START + step * i for i in range(history)]
+
+
+def seed(hot, history):
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute("INSERT INTO users (username, email, password) VALUES ('bench', 'bench@example.com', 'bench')")
+        user_id = conn.execute("SELECT id FROM users WHERE username = 'bench'").fetchone()[0]
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+        starts = history_starts(history)
+        # 近期日程分布在前 60 天到后 30 天
+        starts += [now - timedelta(days=60) + timedelta(minutes=i * 90 * 24 * 60 // max(hot, 1)) for i in range(hot)]
+        rows = [
+            (user_id, f'日程 {i}', start.strftime('%Y-%m-%d %H:%M:%S'),
+             (start + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S'), 0, '', 'work', '',
+             int(start.timestamp()), int((start + timedelta(hours=1)).timestamp()), None)
+            for i, start in enumerate(starts)
+        ]
+        for i in range(0, len(rows), 50000):
+            conn.executemany(chimeo.INSERT_EVENT_SQL, rows[i:i + 50000])
+        chimeo.finish_event_writes(conn)
+        # 历史日程的提醒早已发送
+        conn.execute('UPDATE reminders SET fire_at = NULL WHERE fire_at < ?', (int(time.time()) - chimeo.ARCHIVE_RETENTION,))
+        conn.commit()
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def fresh_get(client, url):
+    # 清掉渲染缓存，测的是查询而不是缓存命中
+    chimeo.render_cache.discard(lambda key: True)
+    response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    return response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', type=int, nargs='+', default=[0, 10000, 100000])
+    parser.add_argument('--hot', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    old_month = '2018-06-01'
+    print(f'{"历史":>7} {"模式":<8} {"events 行数":>10} {"本周":>8} {"本月":>8} {"新建":>8} '
+          f'{"载入提醒":>8} {"历史月份":>8}   (ms，中位数)')
+    for history in args.history:
+        for mode in ('live', 'archived'):
+            with tempfile.TemporaryDirectory() as tmp:
+                chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+                chimeo.init_db()
+                seed(args.hot, history)
+                archive_ms = None
+                if mode == 'archived':
+                    started = time.perf_counter()
+                    with chimeo.app.app_context():
+                        chimeo.archive_old_events()
+                    archive_ms = (time.perf_counter() - started) * 1000
+                client = chimeo.app.test_client()
+                client.post('/login', data={'username': 'bench', 'password': 'bench'})
+                with chimeo.app.app_context():
+                    live_rows = chimeo.get_db().execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+                week_ms = timed(lambda: fresh_get(client, f'/api/events?view=week&date={today}'), args.rounds)
+                month_ms = timed(lambda: fresh_get(client, f'/api/events?view=month&date={today}&limit=500'),
+                                 args.rounds)
+                create_ms = timed(lambda: client.post('/api/events/bulk', json={'operations': [
+                    {'op': 'create', 'event': {'title': '新日程', 'start_time': f'{today} 20:00:00'}}
+                ]}), args.rounds)
+                with chimeo.app.app_context():
+                    due_ms = timed(lambda: chimeo.load_due_reminders(1000), args.rounds)
+                old = fresh_get(client, f'/api/events?view=month&date={old_month}&limit=500')
+                window_start, window_end = chimeo.event_window('month', datetime.strptime(old_month, '%Y-%m-%d'))
+                expected = sum(window_start <= start < window_end for start in history_starts(history))
+                assert len(old['events']) == min(expected, 500), (len(old['events']), expected)
+                old_ms = timed(lambda: fresh_get(client, f'/api/events?view=month&date={old_month}&limit=500'),
+                               args.rounds)
+                print(f'{history:7d} {mode:<8} {live_rows:10d} {week_ms:8.2f} {month_ms:8.2f} {create_ms:8.2f} '
+                      f'{due_ms:8.2f} {old_ms:8.2f}'
+                      + (f'   归档耗时 {archive_ms:.0f} ms' if archive_ms is not None else ''))
+                chimeo.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# 冲突/空闲时间检测基准：对比朴素的两两比较（O(n²)）与 intervals.IntervalIndex。
+#   - 全部冲突对：两两比较 vs 扫描线
+#   - 单个时间段的重叠查询、空闲时间查询：逐条过滤 vs 索引
+#
+#   python benchmarks/bench_conflicts.py --sizes 1000 5000 20000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intervals import IntervalIndex  # noqa: E402
+
+
+def make_intervals(n, rng):
+    # 一年内的日程，时长 30 分钟到 3 小时，保证有一定比例的重叠
+    year = 365 * 86400
+    return [(s := rng.randrange(year), s + rng.choice((1800, 3600, 5400, 10800)), i) for i in range(n)]
+
+
+def timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def naive_conflicts(intervals):
+    return [(a[2], b[2]) for i, a in enumerate(intervals) for b in intervals[i + 1:]
+            if a[0] < b[1] and b[0] < a[1]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    for n in args.sizes:
+        intervals = make_intervals(n, rng)
+        build_ms, index = timed(lambda: IntervalIndex(intervals))
+        sweep_ms, pairs = timed(index.conflicts)
+        line = f'n={n:6d}  建索引 {build_ms:7.1f} ms  扫描线冲突 {sweep_ms:7.1f} ms ({len(pairs)} 对)'
+        if n <= 5000:
+            naive_ms, naive = timed(lambda: naive_conflicts(intervals))
+            assert len(naive) == len(pairs)
+            line += f'  两两比较 {naive_ms:8.1f} ms'
+        print(line)
+
+        probes = [(s := rng.randrange(365 * 86400), s + 7200) for _ in range(args.queries)]
+        index_ms, _ = timed(lambda: [index.overlapping(a, b) for a, b in probes])
+        scan_ms, _ = timed(lambda: [[i for i in intervals if i[0] < b and i[1] > a] for a, b in probes[:100]])
+        free_ms, _ = timed(lambda: [index.free_slots(a, a + 7 * 86400, 3600, limit=5) for a, _ in probes])
+        print(f'          重叠查询 索引 {index_ms / args.queries * 1000:7.1f} us/次  '
+              f'逐条过滤 {scan_ms / 100 * 1000:9.1f} us/次  空闲时间 {free_ms / args.queries * 1000:7.1f} us/次')
+
+
+if __name__ == '__main__':
+    main()
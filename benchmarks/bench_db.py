@@ -0,0 +1,55 @@
+# 连接池基准：对比“每次调用新建连接”（DB_POOL_SIZE=0）与连接池模式下
+# /index 和 /create_event 的每秒请求数。
+#
+#   python benchmarks/bench_db.py --requests 2000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chimeo  # noqa: E402
+
+
+def run(pool_size, requests):
+    chimeo.app.config['DB_POOL_SIZE'] = pool_size
+    client = chimeo.app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench', 'email': 'bench@example.com'})
+
+    results = {}
+    start = time.perf_counter()
+    for i in range(requests):
+        client.post('/create_event', data={
+            'title': f'基准日程 {i}',
+            'start_time': '2025-07-01T09:00',
+            'category': 'work',
+        })
+    results['/create_event'] = requests / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/index')
+    results['/index'] = requests / (time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--pool-size', type=int, default=8)
+    args = parser.parse_args()
+
+    for label, pool_size in (('无连接池', 0), ('连接池', args.pool_size)):
+        with tempfile.TemporaryDirectory() as tmp:
+            chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+            chimeo.init_db()
+            results = run(pool_size, args.requests)
+            chimeo.get_pool().close_all()
+        for route, rps in results.items():
+            print(f'{label:<6} {route:<14} {rps:10.1f} req/s')
+
+
+if __name__ == '__main__':
+    main()
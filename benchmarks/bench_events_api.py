@@ -0,0 +1,68 @@
+# /api/events 负载测试：同一用户的历史日程从 1k 增长到 100k，
+# 周视图的查询延迟应保持平稳（键集分页 + (user_id, start_ts) 索引）。
+#
+#   python benchmarks/bench_events_api.py --sizes 1000 10000 100000
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chimeo  # noqa: E402
+
+
+def seed(user_id, count, years=5):
+    # 直接批量写库，日程均匀分布在过去若干年内
+    now = datetime.now()
+    rows = []
+    for i in range(count):
+        start = now - timedelta(minutes=random.randrange(years * 365 * 24 * 60))
+        text = start.strftime('%Y-%m-%d %H:%M:%S')
+        rows.append((user_id, f'历史日程 {i}', text, '', 0, '', 'work', '', int(start.timestamp()), None, None))
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.executemany(chimeo.INSERT_EVENT_SQL, rows)
+        chimeo.finish_event_writes(conn)
+        conn.commit()
+
+
+def measure(client, rounds):
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = client.get('/api/events?view=week')
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.init_db()
+        client = chimeo.app.test_client()
+        client.post('/login', data={'username': 'heavy', 'password': 'heavy', 'email': 'heavy@example.com'})
+        user_id = chimeo.get_user_id('heavy')
+
+        seeded = 0
+        for size in sorted(args.sizes):
+            seed(user_id, size - seeded)
+            seeded = size
+            p50, p95 = measure(client, args.rounds)
+            print(f'{size:>8} 条日程  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms')
+        chimeo.get_pool().close_all()
+
+
+if __name__ == '__main__':
+    main()
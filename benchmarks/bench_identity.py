@@ -0,0 +1,62 @@
+# 每个请求执行的 SQL 语句数：对比
+#   - 旧方式：每个请求都按用户名查一次 users（模拟 session 中没有 user_id、缓存未命中）
+#   - 现在：登录时写入 session['user_id']，before_request 直接使用
+# 只统计 SELECT/INSERT/UPDATE/DELETE，不含 BEGIN/COMMIT 等事务语句。
+#
+#   python benchmarks/bench_identity.py --rounds 200
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chimeo  # noqa: E402
+
+PATHS = ['/index', '/api/events?view=week', '/export_ics', '/api/feed_url']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    statements = []
+
+    def trace(sql):
+        if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+            statements.append(sql)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.app.config['DB_POOL_SIZE'] = 1  # 只有一个连接，便于挂上 trace 回调
+        chimeo.init_db()
+        pool = chimeo.get_pool()
+        conn = pool.acquire()
+        conn.set_trace_callback(trace)
+        pool.release(conn)
+
+        client = chimeo.app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': 'x', 'email': 'bench@example.com'})
+        client.post('/create_event', data={'title': '基准日程', 'start_time': '2025-07-01T09:00'})
+
+        print(f'{"路径":<24}{"旧方式":>8}{"现在":>8}{"现在耗时":>12}')
+        for path in PATHS:
+            counts = {}
+            for mode in ('legacy', 'session'):
+                statements.clear()
+                start = time.perf_counter()
+                for _ in range(args.rounds):
+                    if mode == 'legacy':
+                        with client.session_transaction() as sess:
+                            sess.pop('user_id', None)
+                        chimeo.identity_cache.clear()
+                    assert client.get(path).status_code == 200, path
+                elapsed = (time.perf_counter() - start) / args.rounds
+                counts[mode] = len(statements) / args.rounds
+            print(f'{path:<24}{counts["legacy"]:>8.1f}{counts["session"]:>8.1f}{elapsed * 1000:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# ICS 导入基准：生成含 5 万个日程的 ICS 文件，分别用
+#   - legacy：原来的整体读入 + Calendar.from_ical + 逐条 INSERT
+#   - stream：流式解析 + 分批 executemany
+# 导入到临时库，报告每秒导入的日程数和进程峰值内存（每种方式在独立子进程中运行）。
+# legacy 需要 icalendar（requirements-dev.txt），应用本身已不再依赖它。
+#
+#   python benchmarks/bench_import.py --events 50000
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_ics(path, count, recurring_ratio=0.05):
+    base = datetime(2020, 1, 1, 8, 0)
+    categories = ['WORK', 'STUDY', 'LIFE', 'OTHER', 'Holiday']
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//bench//chimeo//\r\n')
+        for i in range(count):
+            start = base + timedelta(minutes=random.randrange(5 * 365 * 24 * 60))
+            end = start + timedelta(minutes=random.choice((30, 60, 90)))
+            f.write('BEGIN:VEVENT\r\n')
+            f.write(f'UID:bench-{i}@chimeo\r\n')
+            f.write(f'SUMMARY:第 {i} 个日程 - 项目例会与进度同步\r\n')
+            f.write(f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}\r\n")
+            f.write(f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}\r\n")
+            # 长描述按 75 字符折行
+            f.write('DESCRIPTION:' + '讨论本周工作安排\\n' * 6 + '\r\n ' + 'continued\r\n')
+            f.write(f'CATEGORIES:{random.choice(categories)}\r\n')
+            if random.random() < recurring_ratio:
+                f.write('RRULE:FREQ=WEEKLY;BYDAY=MO,WE,FR\r\n')
+            f.write('END:VEVENT\r\n')
+        f.write('END:VCALENDAR\r\n')
+
+
+def import_legacy(chimeo, path, user_id):
+    # 还原改造前 import_ics 的做法，作为对照
+    from icalendar import Calendar
+    with open(path, 'rb') as f:
+        cal = Calendar.from_ical(f.read().decode('utf-8'))
+    count = 0
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        for component in cal.walk():
+            if component.name == 'VEVENT':
+                start_time = component.get('dtstart').dt.strftime('%Y-%m-%d %H:%M:%S')
+                end_time = component.get('dtend').dt.strftime('%Y-%m-%d %H:%M:%S')
+                conn.execute(chimeo.INSERT_EVENT_SQL, (
+                    user_id, str(component.get('summary')), start_time, end_time, 0, '', 'other',
+                    str(component.get('description')), chimeo.to_epoch(start_time), chimeo.to_epoch(end_time), None
+                ))
+                count += 1
+        chimeo.finish_event_writes(conn)
+        conn.commit()
+    return count
+
+
+def import_stream(chimeo, path, user_id):
+    with chimeo.app.app_context(), open(path, 'rb') as f:
+        return chimeo.import_events(f, user_id)
+
+
+def run_mode(mode, path):
+    import app as chimeo
+    with tempfile.TemporaryDirectory() as tmp:
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.init_db()
+        with chimeo.app.app_context():
+            conn = chimeo.get_db()
+            conn.execute("INSERT INTO users (username, email, password) VALUES ('bench', 'bench@example.com', 'x')")
+            conn.commit()
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        count = (import_legacy if mode == 'legacy' else import_stream)(chimeo, path, 1)
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f'{mode:<7} {count} 个日程  {count / elapsed:9.0f} 个/秒  '
+              f'峰值内存 {peak / 1024:7.1f} MB（导入期间增长 {(peak - baseline) / 1024:.1f} MB）')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--mode', choices=['legacy', 'stream'])
+    parser.add_argument('--file')
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.ics')
+        write_ics(path, args.events)
+        print(f'ICS 文件大小 {os.path.getsize(path) / 1024 / 1024:.1f} MB')
+        for mode in ('legacy', 'stream'):
+            subprocess.run([sys.executable, __file__, '--mode', mode, '--file', path], check=True)
+
+
+if __name__ == '__main__':
+    main()
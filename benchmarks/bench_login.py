@@ -0,0 +1,119 @@
+# 登录基准：--threads 个线程持续登录（密码已是哈希），同时 --readers 个线程循环请求 /index 和 /api/events，
+# 对比三种情况下的登录吞吐、被拒绝数和页面延迟：
+#   - idle：没有登录，只有页面请求，作为对照；
+#   - inline：每个登录线程各自算哈希，同时计算的数量不设上限（相当于在请求线程里直接算）；
+#   - pool：有界哈希线程池（PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE），超出的登录直接返回 503。
+#
+#   python benchmarks/bench_login.py --threads 16 --seconds 10
+#   python benchmarks/bench_login.py --method scrypt:16384:8:1 --workers 2 --queue 8
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chimeo  # noqa: E402
+from passwords import PasswordHasher  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+PAGES = ('/index', '/api/events?view=week')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0
+
+
+def seed(users, method):
+    # 所有用户共用同一个哈希，省去准备阶段的计算
+    hashed = generate_password_hash('bench', method)
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.executemany('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                         [(f'user{i}', f'user{i}@example.com', hashed) for i in range(users)])
+        conn.commit()
+
+
+def run(mode, args):
+    if mode == 'inline':
+        chimeo.password_hasher = PasswordHasher(args.method, workers=args.threads, max_queue=0)
+    else:
+        chimeo.password_hasher = PasswordHasher(args.method, workers=args.workers, max_queue=args.queue)
+
+    reader = chimeo.app.test_client()
+    reader.post('/login', data={'username': 'reader', 'password': 'reader', 'email': 'reader@example.com'})
+    cookie = reader.get_cookie('session').value
+
+    deadline = time.perf_counter() + args.seconds
+    page_ms, login_ms, statuses = [], [], []
+    lock = threading.Lock()
+
+    def login_loop(n):
+        i = n
+        while time.perf_counter() < deadline:
+            client = chimeo.app.test_client()
+            started = time.perf_counter()
+            r = client.post('/login', data={'username': f'user{i % args.users}', 'password': 'bench'})
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                statuses.append(r.status_code)
+                if r.status_code == 302:
+                    login_ms.append(elapsed)
+            if r.status_code == 503:
+                time.sleep(0.05)  # 客户端按 Retry-After 稍后重试
+            i += args.threads
+
+    def page_loop(n):
+        client = chimeo.app.test_client()
+        client.set_cookie('session', cookie)
+        i = n
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            r = client.get(PAGES[i % len(PAGES)])
+            assert r.status_code == 200, r.status_code
+            with lock:
+                page_ms.append((time.perf_counter() - started) * 1000)
+            i += 1
+
+    threads = [threading.Thread(target=page_loop, args=(n,)) for n in range(args.readers)]
+    if mode != 'idle':
+        threads += [threading.Thread(target=login_loop, args=(n,)) for n in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ok = statuses.count(302)
+    print(f'{mode:<7} 登录成功 {ok / args.seconds:6.1f}/s  503 {statuses.count(503):5d}  '
+          f'登录 p50 {percentile(login_ms, 0.5):7.1f} ms p99 {percentile(login_ms, 0.99):7.1f} ms  '
+          f'页面 {len(page_ms) / args.seconds:6.0f}/s p50 {percentile(page_ms, 0.5):6.2f} ms '
+          f'p99 {percentile(page_ms, 0.99):7.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16, help='并发登录的线程数')
+    parser.add_argument('--readers', type=int, default=2, help='并发请求页面的线程数')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--method', default=os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'))
+    parser.add_argument('--workers', type=int, default=max((os.cpu_count() or 2) // 2, 1))
+    parser.add_argument('--queue', type=int, default=4)
+    parser.add_argument('--modes', default='idle,inline,pool')
+    args = parser.parse_args()
+
+    print(f'{args.method}，{os.cpu_count()} 核，登录线程 {args.threads}，页面线程 {args.readers}，'
+          f'线程池 {args.workers} + 队列 {args.queue}')
+    with tempfile.TemporaryDirectory() as tmp:
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.init_db()
+        seed(args.users, args.method)
+        for mode in args.modes.split(','):
+            run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# 邮件吞吐基准：本地 SMTP 替身上对比
+#   - 旧方式：每封邮件单独 send_email（每次重新连接）
+#   - 发件箱：多个工作线程复用 SMTP 会话批量发送
+# 输出每秒发送的邮件数。
+#
+#   python benchmarks/bench_mail.py --messages 500 --workers 4 --latency 0.002
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smtp_sink import SMTPSink  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.002, help='SMTP 替身每条命令的延迟（秒）')
+    args = parser.parse_args()
+
+    sink = SMTPSink(latency=args.latency).start()
+    os.environ.update({
+        'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': str(sink.port),
+        'MAIL_USE_TLS': 'false', 'MAIL_PASSWORD': '',
+    })
+
+    import app as chimeo
+    from mail_sender import send_email
+    from outbox import Outbox, enqueue
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(args.messages):
+            send_email('【日程提醒】', f'基准邮件 {i}', 'bench@example.com')
+    legacy = args.messages / (time.perf_counter() - start)
+    print(f'逐封连接发送  {legacy:8.1f} 封/秒  (连接数 {sink.connections})')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.init_db()
+        with chimeo.app.app_context():
+            conn = chimeo.get_db()
+            for i in range(args.messages):
+                enqueue(conn, 'bench@example.com', '【日程提醒】', f'基准邮件 {i}')
+            conn.commit()
+
+        connections = sink.connections
+        outbox = Outbox(chimeo.get_db, workers=args.workers)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            outbox.start()
+            while outbox.stats['sent'] < args.messages:
+                time.sleep(0.01)
+        pooled = args.messages / (time.perf_counter() - start)
+        outbox.stop()
+        print(f'发件箱 x{args.workers}    {pooled:8.1f} 封/秒  (连接数 {sink.connections - connections})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# 提醒调度器精度基准：库里有 100 万条待提醒日程，其中少量在接下来几秒内到期，
+# 统计计划时间与实际触发时间的延迟（p50/p99/max）以及每次载入堆的耗时。
+# 提醒只写入发件箱（不启动发送线程），只测调度本身。
+#
+#   python benchmarks/bench_scheduler.py --pending 1000000 --due 200
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chimeo  # noqa: E402
+
+
+def insert(rows):
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        for i in range(0, len(rows), 50000):
+            conn.executemany(chimeo.INSERT_EVENT_SQL, rows[i:i + 50000])
+        chimeo.finish_event_writes(conn)
+        conn.commit()
+
+
+def make_rows(user_id, timestamps):
+    return [
+        (user_id, f'日程 {i}', datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'),
+         '', 0, '', 'work', '', ts, None, None)
+        for i, ts in enumerate(timestamps)
+    ]
+
+
+def seed(pending, due, spread):
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute("INSERT INTO users (username, email, password) VALUES ('bench', 'bench@example.com', 'x')")
+        conn.commit()
+        user_id = conn.execute("SELECT id FROM users WHERE username = 'bench'").fetchone()[0]
+    # 大部分日程分布在未来一年，写完之后再插入即将到期的少量日程
+    now = int(time.time())
+    insert(make_rows(user_id, [now + 86400 + i * 30 for i in range(pending - due)]))
+    now = time.time()
+    insert(make_rows(user_id, [int(now + 2 + spread * i / due) for i in range(due)]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pending', type=int, default=1000000)
+    parser.add_argument('--due', type=int, default=200)
+    parser.add_argument('--spread', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.init_db()
+        start = time.perf_counter()
+        seed(args.pending, args.due, args.spread)
+        print(f'写入 {args.pending} 条日程耗时 {time.perf_counter() - start:.1f} s')
+
+        scheduler = chimeo.reminder_scheduler
+        start = time.perf_counter()
+        scheduler.reload()
+        print(f'载入最近 {scheduler.batch_size} 条提醒耗时 {(time.perf_counter() - start) * 1000:.1f} ms')
+
+        thread = threading.Thread(target=scheduler.run_forever, daemon=True)
+        thread.start()
+        while scheduler.lag.count < args.due:
+            time.sleep(0.1)
+        scheduler.stop()
+
+        summary = scheduler.lag.summary()
+        print(f"已触发 {summary['count']} 条  延迟 p50 {summary['p50'] * 1000:.1f} ms  "
+              f"p99 {summary['p99'] * 1000:.1f} ms  max {summary['max'] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# /api/search 负载测试：生成 N 条中文标题的日程（分给多个用户），
+# 测量常见词、少见词、单字、英文前缀以及带日期范围的查询延迟。
+#
+#   python benchmarks/bench_search.py --events 1000000 --users 10
+#   python benchmarks/bench_search.py --db /tmp/search.db   # 复用已生成的数据库
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chimeo  # noqa: E402
+
+VERBS = ['准备', '整理', '提交', '讨论', '复盘', '安排', '检查', '完成', '预约', '参加']
+NOUNS = ['项目汇报', '季度报表', '部门例会', '客户拜访', '论文初稿', '体检', '健身', '读书笔记',
+         '产品评审', '预算', '面试', '年会', '旅行计划', '周报', '代码审查', '培训']
+WORDS = ['review', 'sprint', 'budget', 'release', 'meeting', 'design', 'report', 'planning']
+CATEGORIES = ['work', 'study', 'life', 'other']
+
+QUERIES = ['周报', '项目汇报', '客户拜访 准备', '报', 'rele', '年会 budget']
+
+
+def seed(users, count, batch=10000):
+    now = datetime.now()
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        for u in range(users):
+            conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                         (f'bench{u}', f'bench{u}@example.com', 'x'))
+        conn.commit()
+        for offset in range(0, count, batch):
+            rows = []
+            for i in range(offset, min(offset + batch, count)):
+                start = now - timedelta(minutes=random.randrange(5 * 365 * 24 * 60))
+                text = start.strftime('%Y-%m-%d %H:%M:%S')
+                title = f'{random.choice(VERBS)}{random.choice(NOUNS)} {random.choice(WORDS)}'
+                notes = f'{random.choice(NOUNS)}相关材料 #{i}'
+                rows.append((i % users + 1, title, text, '', 0, '', random.choice(CATEGORIES), notes,
+                             int(start.timestamp()), None, None))
+            conn.executemany(chimeo.INSERT_EVENT_SQL, rows)
+            chimeo.finish_event_writes(conn)
+            conn.commit()
+
+
+def measure(client, query, rounds, **extra):
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = client.get('/api/search', query_string={'q': query, **extra})
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.data
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--db', help='数据库路径；已存在时跳过生成数据')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, 'bench.db')
+        exists = os.path.exists(path)
+        chimeo.app.config['DATABASE'] = path
+        chimeo.init_db()
+        if not exists:
+            start = time.perf_counter()
+            seed(args.users, args.events)
+            print(f'写入 {args.events} 条日程（含索引触发器）: {time.perf_counter() - start:.1f}s')
+
+        client = chimeo.app.test_client()
+        with client.session_transaction() as sess:
+            sess['username'], sess['user_id'] = 'bench0', 1
+
+        year_ago = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
+        today = datetime.now().strftime('%Y-%m-%d')
+        print(f'每个用户约 {args.events // args.users} 条')
+        for query in QUERIES:
+            p50, p95 = measure(client, query, args.rounds)
+            print(f'{query:<16} p50 {p50:7.2f}ms  p95 {p95:7.2f}ms')
+        p50, p95 = measure(client, '周报', args.rounds, start=year_ago, end=today)
+        print(f'{"周报 (近一年)":<14} p50 {p50:7.2f}ms  p95 {p95:7.2f}ms')
+        p50, p95 = measure(client, '周报', args.rounds, page=20)
+        print(f'{"周报 (第20页)":<14} p50 {p50:7.2f}ms  p95 {p95:7.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
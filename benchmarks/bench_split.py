@@ -0,0 +1,85 @@
+# 任务拆分基准：本地 OpenAI 替身上模拟并发请求，其中一部分任务描述重复。
+# 输出上游实际调用次数、最大上游并发、请求延迟分位数以及缓存命中情况。
+# --stream 时改走 /api/split-task/stream，分别统计首个步骤到达时间和总耗时。
+#
+#   python benchmarks/bench_split.py --requests 200 --distinct 20 --threads 32 --latency 0.3
+#   python benchmarks/bench_split.py --stream --requests 20 --distinct 20 --latency 1.0
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAI  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--distinct', type=int, default=20, help='不同任务描述的数量')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.3, help='替身每次生成的耗时（秒）')
+    parser.add_argument('--concurrency', type=int, default=4, help='OPENAI_MAX_CONCURRENCY')
+    parser.add_argument('--stream', action='store_true', help='使用 SSE 流式接口')
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(latency=args.latency).start()
+    os.environ.update({
+        'OPENAI_BASE_URL': fake.base_url, 'OPENAI_API_KEY': 'bench',
+        'OPENAI_MAX_CONCURRENCY': str(args.concurrency), 'OPENAI_QUEUE_TIMEOUT': '60',
+    })
+    import app as chimeo
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.init_db()
+        client = chimeo.app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': 'x', 'email': 'bench@example.com'})
+        cookie = client.get_cookie('session').value
+
+        first_steps = []
+
+        def call(i):
+            c = chimeo.app.test_client()
+            c.set_cookie('session', cookie)
+            task = f'准备第 {i % args.distinct} 次项目汇报'
+            started = time.perf_counter()
+            if not args.stream:
+                r = c.post('/api/split-task', json={'task': task})
+                assert r.status_code == 200, r.data
+                return time.perf_counter() - started
+            r = c.get('/api/split-task/stream', query_string={'task': task}, buffered=False)
+            for chunk in r.response:
+                if chunk.startswith(b'event: step'):
+                    first_steps.append(time.perf_counter() - started)
+                    break
+            b''.join(r.response)
+            return time.perf_counter() - started
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            latencies = list(pool.map(call, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        print(f'请求 {args.requests} 次 / 不同任务 {args.distinct} 个，耗时 {elapsed:.2f}s')
+        print(f'上游调用 {fake.requests} 次，最大上游并发 {fake.max_active}')
+        print(f'延迟 p50 {percentile(latencies, 0.5) * 1000:.1f}ms  '
+              f'p95 {percentile(latencies, 0.95) * 1000:.1f}ms  '
+              f'p99 {percentile(latencies, 0.99) * 1000:.1f}ms')
+        if first_steps:
+            print(f'首个步骤 p50 {percentile(first_steps, 0.5) * 1000:.1f}ms  '
+                  f'p95 {percentile(first_steps, 0.95) * 1000:.1f}ms')
+        print(json.dumps(client.get('/api/split-task/stats').get_json(), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
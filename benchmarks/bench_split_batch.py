@@ -0,0 +1,87 @@
+# 批量拆分基准：本地 OpenAI 替身上拆分 --tasks 个互不相同的任务，对比
+#   - sequential：逐个调用 /api/split-task（前端原来的做法）；
+#   - batch：一次 /api/split-task/batch，每个 --parallelism 各测一轮；
+#   - pack：批量接口加 pack，短任务合并进一个提示词。
+# 输出总耗时、第一个结果到达的时间、上游请求数、最大上游并发和发给上游的提示词字符数。
+# 每种方式使用不同的任务描述，互不命中缓存。
+#
+#   python benchmarks/bench_split_batch.py --tasks 20 --latency 0.3 --step-latency 0.1
+#   python benchmarks/bench_split_batch.py --parallelism 1 4 8 --concurrency 8
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAI  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.3, help='替身每个请求的固定耗时（秒）')
+    parser.add_argument('--step-latency', type=float, default=0.1, help='替身每输出一个步骤的耗时（秒）')
+    parser.add_argument('--parallelism', type=int, nargs='+', default=[4, 8], help='SPLIT_BATCH_PARALLELISM')
+    parser.add_argument('--concurrency', type=int, default=8, help='OPENAI_MAX_CONCURRENCY')
+    parser.add_argument('--pack-size', type=int, default=5, help='SPLIT_PACK_SIZE')
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(latency=args.latency, step_latency=args.step_latency).start()
+    os.environ.update({
+        'OPENAI_BASE_URL': fake.base_url, 'OPENAI_API_KEY': 'bench',
+        'OPENAI_MAX_CONCURRENCY': str(args.concurrency), 'OPENAI_QUEUE_TIMEOUT': '60',
+        'SPLIT_PACK_SIZE': str(args.pack_size),
+    })
+    import app as chimeo
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.init_db()
+        client = chimeo.app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': 'x', 'email': 'bench@example.com'})
+        # 预热：openai 包在第一次拆分时才导入，不计入各轮
+        client.post('/api/split-task', json={'task': '预热'})
+
+        def measure(name, run):
+            requests, prompt_chars = fake.requests, fake.prompt_chars
+            fake.max_active = 0
+            tasks = [f'{name} 准备第 {i} 次项目汇报' for i in range(args.tasks)]
+            started = time.perf_counter()
+            first, done = run(tasks, started)
+            elapsed = time.perf_counter() - started
+            assert done == args.tasks, (name, done)
+            print(f'{name:<14} 总耗时 {elapsed * 1000:7.0f} ms  首个结果 {first * 1000:6.0f} ms  '
+                  f'上游请求 {fake.requests - requests:3d}  最大并发 {fake.max_active:2d}  '
+                  f'提示词 {fake.prompt_chars - prompt_chars:6d} 字符')
+
+        def sequential(tasks, started):
+            first = None
+            for task in tasks:
+                r = client.post('/api/split-task', json={'task': task})
+                assert r.status_code == 200, r.data
+                first = first or time.perf_counter() - started
+            return first, len(tasks)
+
+        def batch(pack):
+            def run(tasks, started):
+                first, done = None, 0
+                r = client.post('/api/split-task/batch', json={'tasks': tasks, 'pack': pack}, buffered=False)
+                for chunk in r.response:
+                    if chunk.startswith(b'event: result'):
+                        first = first or time.perf_counter() - started
+                        done += 1
+                    assert not chunk.startswith(b'event: error'), chunk
+                return first, done
+            return run
+
+        measure('sequential', sequential)
+        for parallelism in args.parallelism:
+            chimeo.splitter.batch_parallelism = parallelism
+            measure(f'batch x{parallelism}', batch(False))
+            measure(f'pack x{parallelism}', batch(True))
+
+
+if __name__ == '__main__':
+    main()
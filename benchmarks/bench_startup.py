@@ -0,0 +1,115 @@
+# 启动基准：每轮在新进程里测量 import app、create_app() 的耗时，以及第一个和第二个请求的延迟，
+# 同时记录启动后是否加载了 openai / mail_sender 和进程的峰值内存。
+#   - lazy：当前的延迟初始化；
+#   - eager：启动时就导入 openai、mail_sender 并创建 OpenAI 客户端（即原来 import app 时的行为），作为对照。
+#
+#   python benchmarks/bench_startup.py --rounds 5
+#   python benchmarks/bench_startup.py --rounds 5 --json startup.json
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PATHS = ('/login', '/index', '/api/events')
+
+
+def child(mode):
+    result = {}
+    started = time.perf_counter()
+    if mode == 'eager':
+        import mail_sender  # noqa: F401
+        import openai  # noqa: F401
+    import app as chimeo
+    result['import_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    chimeo.create_app()
+    if mode == 'eager':
+        chimeo.splitter.client
+    result['create_app_ms'] = (time.perf_counter() - started) * 1000
+    result['startup_ms'] = result['import_ms'] + result['create_app_ms']
+
+    client = chimeo.app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    for path in PATHS:
+        for label in ('first', 'second'):
+            started = time.perf_counter()
+            response = client.get(path)
+            result[f'{path} {label}_ms'] = (time.perf_counter() - started) * 1000
+            assert response.status_code == 200, (path, response.status_code)
+    result['openai_loaded'] = 'openai' in sys.modules
+    result['mail_sender_loaded'] = 'mail_sender' in sys.modules
+    result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(result))
+
+
+def seed(database):
+    env = dict(os.environ, DATABASE=database)
+    subprocess.run([sys.executable, '-c', '''
+import app as chimeo
+chimeo.create_app()
+with chimeo.app.app_context():
+    conn = chimeo.get_db()
+    conn.execute("INSERT INTO users (username, email, password) VALUES ('bench', 'bench@example.com', 'bench')")
+    user_id = conn.execute("SELECT id FROM users WHERE username = 'bench'").fetchone()[0]
+    conn.executemany(chimeo.INSERT_EVENT_SQL, [
+        (user_id, f'日程 {i}', f'2030-01-{i % 28 + 1:02d} 09:00:00', '', 0, '', 'work', '', None, None, None)
+        for i in range(200)
+    ])
+    chimeo.finish_event_writes(conn)
+    conn.commit()
+'''], env=env, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+
+def summarize(runs):
+    keys = [key for key, value in runs[0].items() if isinstance(value, float)]
+    summary = {key: round(statistics.median(run[key] for run in runs), 2) for key in keys}
+    summary['openai_loaded'] = runs[0]['openai_loaded']
+    summary['mail_sender_loaded'] = runs[0]['mail_sender_loaded']
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--modes', default='lazy,eager')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--child', choices=('lazy', 'eager'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        seed(database)
+        env = dict(os.environ, DATABASE=database, OPENAI_API_KEY=os.getenv('OPENAI_API_KEY') or 'bench')
+        for mode in args.modes.split(','):
+            runs = []
+            for _ in range(args.rounds):
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode],
+                                        env=env, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            report[mode] = summarize(runs)
+
+    for mode, summary in report.items():
+        print(f'[{mode}]  中位数，{args.rounds} 轮')
+        for key, value in summary.items():
+            print(f'  {key:<28} {value}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
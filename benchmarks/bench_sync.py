@@ -0,0 +1,87 @@
+# 增量同步基准：日历规模不同、每次只改少量日程时，对比 /api/sync 增量同步与重新下载 /export_ics 的延迟和响应大小。
+# 增量同步的成本应只随变更数增长，与日程总数无关。
+#
+#   python benchmarks/bench_sync.py --sizes 1000 10000 100000 --changes 10
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chimeo  # noqa: E402
+
+
+def seed(size):
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute("INSERT INTO users (username, email, password) VALUES ('bench', 'bench@example.com', 'bench')")
+        user_id = conn.execute("SELECT id FROM users WHERE username = 'bench'").fetchone()[0]
+        base = datetime(2030, 1, 1, 9)
+        rows = []
+        for i in range(size):
+            start = base + timedelta(hours=i)
+            rows.append((user_id, f'日程 {i}', start.strftime('%Y-%m-%d %H:%M:%S'), '', 0, '', 'work', '',
+                         int(start.timestamp()), None, None))
+        for i in range(0, size, 50000):
+            conn.executemany(chimeo.INSERT_EVENT_SQL, rows[i:i + 50000])
+        chimeo.finish_event_writes(conn)
+        conn.commit()
+
+
+def timed(client, url, rounds):
+    samples, size = [], 0
+    for _ in range(rounds):
+        # 导出是流式响应，计时包含读完整个响应体
+        started = time.perf_counter()
+        size = len(client.get(url).data)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--changes', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+            chimeo.init_db()
+            seed(size)
+            client = chimeo.app.test_client()
+            client.post('/login', data={'username': 'bench', 'password': 'bench'})
+
+            # 先全量同步拿到令牌，再修改少量日程
+            page = client.get(f'/api/sync?limit={chimeo.SYNC_PAGE_MAX}').get_json()
+            while page['has_more']:
+                page = client.get(f"/api/sync?limit={chimeo.SYNC_PAGE_MAX}&token={page['token']}").get_json()
+            token = page['token']
+            for i in range(args.changes):
+                client.post('/api/events/bulk', json={'operations': [
+                    {'op': 'update', 'id': i * (size // args.changes) + 1, 'event': {'title': f'已修改 {i}'}}
+                ]})
+            sync_ms, sync_bytes = timed(client, f'/api/sync?token={token}', args.rounds)
+            changed = len(client.get(f'/api/sync?token={token}').get_json()['changes'])
+            assert changed == args.changes, changed
+            # 导出有按版本的缓存，每轮前修改一条让缓存失效，测的是重新生成
+            export = []
+            for i in range(args.rounds):
+                client.post('/api/events/bulk', json={'operations': [
+                    {'op': 'update', 'id': 1, 'event': {'notes': str(i)}}
+                ]})
+                export.append(timed(client, '/export_ics', 1))
+            export_ms = statistics.median(ms for ms, _ in export)
+            print(f'{size:7d} 条日程  改动 {args.changes} 条  '
+                  f'/api/sync {sync_ms:7.2f} ms {sync_bytes / 1024:8.1f} KB  '
+                  f'/export_ics {export_ms:8.1f} ms {export[-1][1] / 1024:9.1f} KB')
+            chimeo.close_pool()
+
+
+if __name__ == '__main__':
+    main()
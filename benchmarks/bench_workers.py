@@ -0,0 +1,113 @@
+# 多进程提醒并发测试：N 个进程（相当于 N 个 gunicorn worker）共用一个数据库，
+# 同时运行后台服务，统计本地 SMTP 替身实际收到的邮件数，必须与到期提醒数完全一致（无重复、无遗漏）。
+#   - 默认通过租约选主，只有一个进程运行调度器；
+#   - --no-leader 时每个进程都运行调度器，检验 fire_reminders 的原子认领。
+#
+#   python benchmarks/bench_workers.py --processes 4 --events 500 --recurring 50
+#   python benchmarks/bench_workers.py --processes 4 --no-leader
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from smtp_sink import SMTPSink  # noqa: E402
+
+
+def child(expected, leader, deadline):
+    import app as chimeo
+
+    chimeo.create_app()
+    with contextlib.redirect_stdout(io.StringIO()):
+        chimeo.start_background_services(elect_leader=leader)
+        with chimeo.app.app_context():
+            conn = chimeo.get_db()
+            while time.time() < deadline:
+                sent = conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'sent'").fetchone()[0]
+                if sent >= expected:
+                    break
+                time.sleep(0.05)
+    print(chimeo.reminder_scheduler.lag.summary()['count'], chimeo.mail_outbox.stats['sent'])
+
+
+def seed(chimeo, events, recurring, delay):
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute("INSERT INTO users (username, email, password) VALUES ('bench', 'bench@example.com', 'x')")
+        user_id = conn.execute("SELECT id FROM users WHERE username = 'bench'").fetchone()[0]
+        # 所有提醒集中在 delay 秒后的同一时刻到期，让各进程尽量同时触发
+        due = int(time.time() + delay)
+        start_time = datetime.fromtimestamp(due).strftime('%Y-%m-%d %H:%M:%S')
+        conn.executemany(chimeo.INSERT_EVENT_SQL, [
+            (user_id, f'日程 {i}', start_time, '', 0, '', 'work', '', due, None, None)
+            for i in range(events)
+        ] + [
+            (user_id, f'每日 {i}', start_time, '', 0, 'FREQ=DAILY', 'work', '', due, None, None)
+            for i in range(recurring)
+        ])
+        chimeo.finish_event_writes(conn)
+        conn.commit()
+    return due
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--recurring', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=3.0, help='启动后多少秒提醒到期')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--no-leader', action='store_true')
+    parser.add_argument('--child', nargs=3, metavar=('EXPECTED', 'LEADER', 'DEADLINE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(int(args.child[0]), args.child[1] == '1', float(args.child[2]))
+        return
+
+    sink = SMTPSink().start()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE=os.path.join(tmp, 'bench.db'), MAIL_SERVER='127.0.0.1',
+                   MAIL_PORT=str(sink.port), MAIL_USE_TLS='false', MAIL_PASSWORD='',
+                   REMINDER_WATCH_INTERVAL='0.2')
+        os.environ.update(env)
+        import app as chimeo
+
+        chimeo.create_app()
+        due = seed(chimeo, args.events, args.recurring, args.delay)
+        chimeo.close_pool()
+        expected = args.events + args.recurring
+
+        deadline = due + args.timeout
+        children = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--child',
+                 str(expected), '0' if args.no_leader else '1', str(deadline)],
+                env=env, stdout=subprocess.PIPE, text=True
+            )
+            for _ in range(args.processes)
+        ]
+        results = [c.communicate()[0].split() for c in children]
+        elapsed = time.time() - due
+
+        fired = [int(r[0]) for r in results if r]
+        sent = [int(r[1]) for r in results if r]
+        print(f'{args.processes} 个进程  选主 {"否" if args.no_leader else "是"}  到期提醒 {expected} 条')
+        print(f'各进程触发 {fired}  各进程发送 {sent}')
+        print(f'SMTP 收到 {sink.messages} 封  到期后 {elapsed:.2f} s 全部送达  '
+              f'{sink.messages / max(elapsed, 1e-9):.0f} 封/秒')
+        if sink.messages != expected:
+            print(f'✗ 收到的邮件数与到期提醒数不一致（期望 {expected}）')
+            sys.exit(1)
+        print('✓ 无重复、无遗漏')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# 本地 OpenAI 兼容替身：实现 POST /v1/chat/completions（含 stream=True），固定返回几行步骤。
+# 用于在不访问真实模型的情况下测试任务拆分的缓存、合并与限流。
+# 合并拆分的提示词（以“任务列表：”或“Tasks: ”加 JSON 结尾）按编号返回 JSON 对象，
+# 生成时间按输出的步骤数计（step_latency），与真实模型一样随输出长度增长。
+#
+#   python benchmarks/fake_openai.py --port 8090 --latency 0.5
+#   OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=x python app.py
+import argparse
+import http.server
+import json
+import re
+import sys
+import threading
+import time
+
+STEPS = ['1. 明确目标', '2. 收集资料', '3. 制定计划', '4. 执行并检查']
+PACKED_RE = re.compile(r'(?:任务列表：|Tasks: )(\{.*\})\s*$', re.S)
+
+
+class FakeOpenAIHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = ''.join(m.get('content') or '' for m in body.get('messages', []))
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            server.prompt_chars += len(prompt)
+        try:
+            if body.get('stream'):
+                self._stream(body)
+                return
+            match = PACKED_RE.search(prompt) if server.packed else None
+            if match:
+                # 合并拆分：每个任务返回一组去掉编号的步骤
+                numbers = list(json.loads(match.group(1)))
+                steps = [step.split('. ', 1)[-1] for step in server.steps]
+                content = json.dumps({number: steps for number in numbers}, ensure_ascii=False)
+            else:
+                numbers = [None]
+                content = '\n'.join(server.steps)
+            time.sleep(server.latency + server.step_latency * len(server.steps) * len(numbers))
+            payload = json.dumps({
+                'id': f'chatcmpl-{server.requests}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'fake'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            }, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+    def _stream(self, body):
+        # 流式响应：每个步骤拆成几段，latency 平均分摊到各段之间
+        server = self.server
+        content = '\n'.join(server.steps)
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(data):
+            payload = f'data: {data}\n\n'.encode('utf-8')
+            self.wfile.write(f'{len(payload):x}\r\n'.encode() + payload + b'\r\n')
+            self.wfile.flush()
+
+        for piece in pieces:
+            time.sleep(server.latency / len(pieces))
+            send(json.dumps({
+                'id': f'chatcmpl-{server.requests}',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model', 'fake'),
+                'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}],
+            }, ensure_ascii=False))
+        send('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class FakeOpenAI(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, steps=STEPS, step_latency=0.0, packed=True):
+        # latency：每个请求的模拟生成时间（秒）；step_latency：每输出一个步骤额外的生成时间（秒）；
+        # packed=False 时合并拆分的提示词也按普通格式回答，用于测试解析失败后的逐个重试
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency = latency
+        self.step_latency = step_latency
+        self.packed = packed
+        self.steps = list(steps)
+        self.prompt_chars = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+    def handle_error(self, request, client_address):
+        # 客户端超时先断开时，写响应会失败，不算替身的错误
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--step-latency', type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeOpenAI(port=args.port, latency=args.latency, step_latency=args.step_latency)
+    print(f'OpenAI 替身监听 {fake.base_url}')
+    fake.serve_forever()
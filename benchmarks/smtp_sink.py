@@ -0,0 +1,82 @@
+# 本地 SMTP 替身：接受并丢弃所有邮件，只统计收到的数量。
+# 用于在不连接真实邮件服务器的情况下测试发件箱和做吞吐基准。
+# temp_fail 可模拟临时故障：接下来的若干封邮件在 DATA 结束时返回 451，不计入已收到。
+#
+#   python benchmarks/smtp_sink.py --port 8025
+import argparse
+import socketserver
+import threading
+import time
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        self.reply('220 localhost sink ready')
+        server.connections += 1
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            if server.latency:
+                time.sleep(server.latency)
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith('RCPT') and any(bad in command for bad in server.reject):
+                self.reply('550 mailbox unavailable')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                with server.lock:
+                    failed = server.temp_fail > 0
+                    if failed:
+                        server.temp_fail -= 1
+                    else:
+                        server.messages += 1
+                self.reply('451 temporary failure' if failed else '250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, reject=(), temp_fail=0):
+        # latency：每条命令的模拟网络延迟（秒）；reject：RCPT 中包含这些字符串时拒收；
+        # temp_fail：接下来临时失败的邮件数
+        super().__init__((host, port), SinkHandler)
+        self.latency = latency
+        self.reject = tuple(r.upper() for r in reject)
+        self.temp_fail = temp_fail
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.connections = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    sink = SMTPSink(port=args.port, latency=args.latency)
+    print(f'SMTP 替身监听 127.0.0.1:{sink.port}')
+    sink.serve_forever()
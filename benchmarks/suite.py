@@ -0,0 +1,374 @@
+# 端到端基准套件：生成合成数据（多个用户、大量日程、部分重复日程、大 ICS 文件）写入临时库，
+# 依次压测 /index、/create_event、/export_ics、/import_ics、/save_subtasks、/api/split-task。
+# OpenAI 和 SMTP 分别由本地替身（fake_openai.py / smtp_sink.py）代替，不访问外部服务。
+#   - client 模式：Flask 测试客户端，只测应用本身；
+#   - server 模式：在本进程里启动一个多线程的 werkzeug 服务器，经真实的 HTTP 连接访问。
+# 每个场景输出 p50/p95/p99 延迟、吞吐量和进程峰值内存，结果写成 JSON；compare 对比两次结果找出退化。
+#
+#   python benchmarks/suite.py run --out base.json
+#   python benchmarks/suite.py run --out new.json --mode both --concurrency 8
+#   python benchmarks/suite.py compare base.json new.json --threshold 0.15
+import argparse
+import contextlib
+import http.cookiejar
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_import import write_ics  # noqa: E402
+from fake_openai import FakeOpenAI  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+
+PASSWORD = 'bench'
+
+
+# ============= 合成数据 =============
+def seed(chimeo, users, events, recurring_ratio, rng):
+    # 每个用户 events 个日程，分布在最近一年和未来三个月；返回用户名列表
+    now = datetime.now().replace(second=0, microsecond=0)
+    names = [f'bench{i}' for i in range(users)]
+    rules = ['FREQ=DAILY', 'FREQ=WEEKLY;BYDAY=MO,WE,FR', 'FREQ=MONTHLY']
+    categories = ['work', 'study', 'life', 'other']
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.executemany('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                         [(name, f'{name}@example.com', PASSWORD) for name in names])
+        conn.commit()
+        for user_id in range(1, users + 1):
+            rows = []
+            for i in range(events):
+                start = now + timedelta(minutes=rng.randrange(-365 * 24 * 60, 90 * 24 * 60))
+                end = start + timedelta(minutes=rng.choice((30, 60, 90, 120)))
+                rule = rng.choice(rules) if rng.random() < recurring_ratio else ''
+                rows.append((
+                    user_id, f'合成日程 {i} 项目讨论', start.strftime('%Y-%m-%d %H:%M:%S'),
+                    end.strftime('%Y-%m-%d %H:%M:%S'), 0, rule, rng.choice(categories),
+                    '基准测试生成的备注', int(start.timestamp()), int(end.timestamp()), None
+                ))
+            conn.executemany(chimeo.INSERT_EVENT_SQL, rows)
+            chimeo.finish_event_writes(conn)
+            conn.commit()
+    return names
+
+
+# ============= 客户端 =============
+class FlaskClient:
+    def __init__(self, chimeo):
+        self._client = chimeo.app.test_client()
+
+    def get(self, path):
+        response = self._client.get(path)
+        response.get_data()
+        return response.status_code
+
+    def post_form(self, path, data):
+        return self._client.post(path, data=data).status_code
+
+    def post_json(self, path, payload):
+        return self._client.post(path, json=payload).status_code
+
+    def post_file(self, path, field, filename, content):
+        return self._client.post(path, data={field: (io.BytesIO(content), filename)},
+                                 content_type='multipart/form-data').status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPClient:
+    # 只用标准库：带 cookie 的 urllib，不跟随重定向，与测试客户端的行为一致
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def _send(self, path, body=None, content_type=None):
+        request = urllib.request.Request(self.base_url + path, data=body)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with self._opener.open(request, timeout=120) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def get(self, path):
+        return self._send(path)
+
+    def post_form(self, path, data):
+        return self._send(path, urllib.parse.urlencode(data).encode(), 'application/x-www-form-urlencoded')
+
+    def post_json(self, path, payload):
+        return self._send(path, json.dumps(payload).encode(), 'application/json')
+
+    def post_file(self, path, field, filename, content):
+        boundary = uuid.uuid4().hex
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                f'Content-Type: text/calendar\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+        return self._send(path, body, f'multipart/form-data; boundary={boundary}')
+
+
+# ============= 场景 =============
+def build_scenarios(args, ics_bytes):
+    now = datetime.now()
+
+    def index(client, i, rng):
+        return client.get('/index')
+
+    def create_event(client, i, rng):
+        start = now + timedelta(hours=rng.randrange(1, 24 * 60))
+        return client.post_form('/create_event', {
+            'title': f'基准新建 {i}', 'start_time': start.strftime('%Y-%m-%dT%H:%M'),
+            'end_time': (start + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+            'category': 'work', 'notes': '',
+        })
+
+    def export_ics(client, i, rng):
+        return client.get('/export_ics')
+
+    def import_ics(client, i, rng):
+        return client.post_file('/import_ics', 'ics_file', 'bench.ics', ics_bytes)
+
+    def save_subtasks(client, i, rng):
+        return client.post_json('/save_subtasks', {
+            'main_task': f'基准任务 {i}', 'steps': ['明确目标', '收集资料', '制定计划', '执行并检查'],
+            'selected_indices': [0, 1, 2, 3],
+        })
+
+    def split_task(client, i, rng):
+        # 任务在 distinct 个描述中循环，模拟缓存命中与未命中混合
+        return client.post_json('/api/split-task', {'task': f'准备项目汇报 {i % args.distinct_tasks}'})
+
+    heavy = max(args.requests // 40, 3)
+    return [
+        ('index', args.requests, index),
+        ('create_event', args.requests, create_event),
+        ('export_ics', max(args.requests // 4, 5), export_ics),
+        ('save_subtasks', args.requests, save_subtasks),
+        ('split_task', args.requests, split_task),
+        ('import_ics', heavy, import_ics),
+    ]
+
+
+def percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def peak_rss_kb():
+    # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def run_scenario(make_client, users, count, concurrency, fn, seed_value):
+    # 每个线程一个已登录的客户端，请求序号由线程共享的计数器分配
+    clients = []
+    for t in range(concurrency):
+        client = make_client()
+        client.post_form('/login', {'username': users[t % len(users)], 'password': PASSWORD})
+        clients.append(client)
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(range(count))
+
+    def worker(client, rng):
+        nonlocal errors
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = fn(client, i, rng)
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(c, random.Random(seed_value + n)))
+               for n, c in enumerate(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "throughput_rps": len(latencies) / wall,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    fake = FakeOpenAI(latency=args.openai_latency).start()
+    sink = SMTPSink().start()
+    tmp = tempfile.mkdtemp(prefix='chimeo-bench-')
+    os.environ.update({
+        'OPENAI_BASE_URL': fake.base_url, 'OPENAI_API_KEY': 'bench',
+        'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': str(sink.port), 'MAIL_USE_TLS': 'false', 'MAIL_PASSWORD': '',
+        'SPLIT_CACHE_PERSIST': '0',
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as chimeo
+        chimeo.app.config['DATABASE'] = os.path.join(tmp, 'bench.db')
+        chimeo.init_db()
+        started = time.perf_counter()
+        users = seed(chimeo, args.users, args.events, args.recurring_ratio, rng)
+    print(f'写入 {args.users} 个用户 x {args.events} 个日程耗时 {time.perf_counter() - started:.1f} s',
+          file=sys.stderr)
+
+    ics_path = os.path.join(tmp, 'bench.ics')
+    random.seed(args.seed)
+    write_ics(ics_path, args.ics_events, args.recurring_ratio)
+    with open(ics_path, 'rb') as f:
+        ics_bytes = f.read()
+
+    modes = ['client', 'server'] if args.mode == 'both' else [args.mode]
+    results = {}
+    for mode in modes:
+        server = None
+        if mode == 'client':
+            def make_client():
+                return FlaskClient(chimeo)
+        else:
+            from werkzeug.serving import make_server
+            logging.getLogger('werkzeug').setLevel(logging.WARNING)  # 不打印每条访问日志
+            server = make_server('127.0.0.1', 0, chimeo.app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{server.server_port}'
+
+            def make_client():
+                return HTTPClient(base_url)
+        results[mode] = {}
+        for name, count, fn in build_scenarios(args, ics_bytes):
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = run_scenario(make_client, users, count, args.concurrency, fn, args.seed)
+            results[mode][name] = result
+            print(f"{mode:7s} {name:14s} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                  f"p99 {result['p99_ms']:8.2f} ms  {result['throughput_rps']:8.1f} req/s  "
+                  f"errors {result['errors']}", file=sys.stderr)
+        if server is not None:
+            server.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ('func', 'out')},
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+# ============= 对比 =============
+def compare(args):
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    if base['meta']['args'] != new['meta']['args']:
+        print('⚠ 两次运行的参数不同，结果可能不可比', file=sys.stderr)
+    regressions = []
+    print(f"{'模式':6s} {'场景':14s} {'p95 基线':>10s} {'p95 新':>10s} {'变化':>8s} "
+          f"{'吞吐 基线':>10s} {'吞吐 新':>10s} {'变化':>8s}")
+    for mode, scenarios in new['results'].items():
+        for name, result in scenarios.items():
+            old = base['results'].get(mode, {}).get(name)
+            if old is None:
+                continue
+            p95 = result['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0.0
+            rps = result['throughput_rps'] / old['throughput_rps'] - 1 if old['throughput_rps'] else 0.0
+            flag = ''
+            if p95 > args.threshold or rps < -args.threshold or result['errors'] > old['errors']:
+                flag = '  ✗ 退化'
+                regressions.append(f'{mode}/{name}')
+            print(f"{mode:6s} {name:14s} {old['p95_ms']:10.2f} {result['p95_ms']:10.2f} {p95:+8.1%} "
+                  f"{old['throughput_rps']:10.1f} {result['throughput_rps']:10.1f} {rps:+8.1%}{flag}")
+    if regressions:
+        print(f"超过阈值 {args.threshold:.0%} 的场景: {', '.join(regressions)}")
+        sys.exit(1)
+    print('✓ 没有超过阈值的退化')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--out', help='结果 JSON 路径；不指定时输出到标准输出')
+    run_parser.add_argument('--mode', choices=('client', 'server', 'both'), default='client')
+    run_parser.add_argument('--users', type=int, default=20)
+    run_parser.add_argument('--events', type=int, default=2000, help='每个用户的日程数')
+    run_parser.add_argument('--recurring-ratio', type=float, default=0.05)
+    run_parser.add_argument('--ics-events', type=int, default=2000, help='导入场景使用的 ICS 文件中的日程数')
+    run_parser.add_argument('--requests', type=int, default=200, help='每个场景的请求数（导入、导出更少）')
+    run_parser.add_argument('--concurrency', type=int, default=4)
+    run_parser.add_argument('--distinct-tasks', type=int, default=50)
+    run_parser.add_argument('--openai-latency', type=float, default=0.05, help='OpenAI 替身的响应时间（秒）')
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='p95 上升或吞吐下降超过该比例视为退化')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+
+# - ByteLRU：按字节数限额的 LRU 缓存，用于缓存序列化后的响应体。
+# - 键里带上用户的日程版本号，日程变更后旧条目不会再命中，随 LRU 淘汰。
+
+
+class ByteLRU:
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_item_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_item_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._entries[key] = value
+            self.bytes += len(value)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+        return True
+
+    def discard(self, predicate):
+        # 主动清理满足条件的键，如某个用户的全部旧版本
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.bytes -= len(self._entries.pop(key))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class TTLCache:
+    # - 按条目数限额的 LRU，每个条目带过期时间。
+    # - 可选地通过 load/store 回调落到数据库，进程重启后仍能命中；
+    #   回调失败只影响持久化，不影响内存缓存。
+
+    def __init__(self, maxsize=1024, ttl=86400, load=None, store=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._load = load
+        self._store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, value, expires):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+        if self._load is not None:
+            try:
+                entry = self._load(key, now)
+            except Exception as e:
+                print(f"读取缓存失败: {e}")
+                entry = None
+            if entry is not None:
+                expires, value = entry
+                with self._lock:
+                    self._remember(key, value, expires)
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+        if self._store is not None:
+            try:
+                self._store(key, value, expires)
+            except Exception as e:
+                print(f"写入缓存失败: {e}")
+
+    def invalidate(self, key):
+        # 只清理内存中的条目；持久化的条目由 store 方负责
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class SingleFlight:
+    # 相同 key 的并发调用只执行一次，其余调用等待并共享同一结果（或异常）
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,103 @@
+import time
+
+# - 增量同步的变更日志：events 上的触发器把每次新增、修改、删除追加到 event_changes，
+#   所有写入路径（表单、批量接口、ICS 导入、保存子任务等）都会自动记录。
+# - 同步令牌就是日志序号，/api/sync 只读取该用户序号更大的记录（idx_event_changes_user），
+#   读取成本只与变更数有关，与日程总数无关。
+# - 压缩：同一日程较早的记录已被较新的记录覆盖，任何令牌都不再需要，可以直接删除；
+#   超过保留期的记录也会删除，同时把用户的 sync_floor_seq 提高到被删除的最大序号，
+#   早于它的令牌只能全量重新同步。
+
+SYNCED_COLUMNS = 'title, start_time, end_time, is_all_day, repeat_rule, category, notes, exdates'
+NOW_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+
+def create_log(conn):
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS event_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            event_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            ts INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_event_changes_user ON event_changes (user_id, seq);
+        CREATE INDEX IF NOT EXISTS idx_event_changes_event ON event_changes (event_id, seq);
+        CREATE TRIGGER IF NOT EXISTS trg_event_changes_insert AFTER INSERT ON events
+        BEGIN
+            INSERT INTO event_changes (user_id, event_id, op, ts) VALUES (NEW.user_id, NEW.id, 'upsert', {NOW_SQL});
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_event_changes_update AFTER UPDATE OF {SYNCED_COLUMNS} ON events
+        BEGIN
+            INSERT INTO event_changes (user_id, event_id, op, ts) VALUES (NEW.user_id, NEW.id, 'upsert', {NOW_SQL});
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_event_changes_delete AFTER DELETE ON events
+        BEGIN
+            INSERT INTO event_changes (user_id, event_id, op, ts) VALUES (OLD.user_id, OLD.id, 'delete', {NOW_SQL});
+        END;
+    ''')
+
+
+def current_seq(conn):
+    # 已分配的最大序号；压缩删掉末尾的记录后也不会回退
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'event_changes'").fetchone()
+    return row[0] if row else 0
+
+
+def floor_seq(conn, user_id):
+    row = conn.execute('SELECT sync_floor_seq FROM users WHERE id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def read_changes(conn, user_id, since, limit):
+    # 返回 ({event_id: op}, 本页最后的序号, 是否还有更多)；同一日程在一页里只保留最后一次操作，
+    # 字典按最后一次操作的先后排列
+    rows = conn.execute('''
+        SELECT seq, event_id, op FROM event_changes
+        WHERE user_id = ? AND seq > ?
+        ORDER BY seq
+        LIMIT ?
+    ''', (user_id, since, limit + 1)).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for row in rows:
+        latest.pop(row['event_id'], None)
+        latest[row['event_id']] = row['op']
+    return latest, (rows[-1]['seq'] if rows else since), has_more
+
+
+def compact(conn, retention, batch=1000, now=None):
+    # 按序号分批执行，单个事务不会长时间占用写锁；返回 (删除的覆盖记录数, 删除的过期记录数)
+    cutoff = int(now if now is not None else time.time()) - retention
+    superseded = expired = 0
+    last = 0
+    while True:
+        row = conn.execute('''
+            SELECT MAX(seq) FROM (SELECT seq FROM event_changes WHERE seq > ? ORDER BY seq LIMIT ?)
+        ''', (last, batch)).fetchone()
+        if row[0] is None:
+            break
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            superseded += conn.execute('''
+                DELETE FROM event_changes
+                WHERE seq > ? AND seq <= ? AND EXISTS (
+                    SELECT 1 FROM event_changes newer
+                    WHERE newer.event_id = event_changes.event_id AND newer.seq > event_changes.seq
+                )
+            ''', (last, row[0])).rowcount
+            floors = conn.execute('''
+                SELECT user_id, MAX(seq) FROM event_changes
+                WHERE seq > ? AND seq <= ? AND ts < ?
+                GROUP BY user_id
+            ''', (last, row[0], cutoff)).fetchall()
+            conn.executemany(
+                'UPDATE users SET sync_floor_seq = MAX(sync_floor_seq, ?) WHERE id = ?',
+                [(seq, user_id) for user_id, seq in floors]
+            )
+            expired += conn.execute(
+                'DELETE FROM event_changes WHERE seq > ? AND seq <= ? AND ts < ?', (last, row[0], cutoff)
+            ).rowcount
+        last = row[0]
+    return superseded, expired
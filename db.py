@@ -0,0 +1,515 @@
+import contextlib
+import queue
+import sqlite3
+from datetime import datetime
+
+from archive import create_archive, guard_triggers
+from changes import create_log
+from metrics import TimedConnection
+from reminders import register_functions as register_reminder_functions
+from search import create_index, create_queue, rebuild_index, register_functions
+from stats import create_rollups, rebuild as rebuild_rollups
+
+# - SQLite 连接池：连接在请求/线程之间复用，避免每次调用都重新 connect。
+# - 每个新连接都会开启 WAL 模式并设置同步级别、忙等待和内存映射，
+#   这样提醒线程的写入不会再阻塞页面请求的读取。
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',   # WAL 模式下 NORMAL 已足够安全
+    'PRAGMA busy_timeout=5000',    # 写锁冲突时最多等待 5 秒
+    'PRAGMA mmap_size=268435456',  # 256MB 内存映射读
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+class ConnectionPool:
+    def __init__(self, database: str, size: int = 8, cached_statements: int = 256):
+        self.database = database
+        self.size = size
+        self.cached_statements = cached_statements
+        # 后进先出，优先复用最近用过的（页缓存更热的）连接
+        self._idle = queue.LifoQueue(maxsize=max(size, 1))
+
+    def _connect(self) -> sqlite3.Connection:
+        # 连接会在不同请求线程之间传递，但同一时刻只被一个线程使用
+        conn = sqlite3.connect(
+            self.database,
+            timeout=5,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=TimedConnection,  # SQL 计时（见 metrics.py）
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        if self.size > 0:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+        return self._connect()
+
+    def release(self, conn: sqlite3.Connection):
+        # 未提交的事务一律回滚，保证下一个使用者拿到干净的连接
+        if conn.in_transaction:
+            conn.rollback()
+        if self.size <= 0:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# ============= 时间字段规范化 =============
+def parse_time(value):
+    # 兼容 '%Y-%m-%dT%H:%M'、'%Y-%m-%d %H:%M:%S' 以及纯日期等 ISO 格式
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_epoch(value):
+    dt = parse_time(value)
+    return int(dt.timestamp()) if dt else None
+
+
+# ============= 版本化迁移 =============
+# - 当前版本号保存在 PRAGMA user_version 中，迁移按列表顺序逐个执行，
+#   新的表结构变更只需在 MIGRATIONS 末尾追加一个函数。
+
+BACKFILL_BATCH = 1000
+
+def _create_base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            is_all_day INTEGER DEFAULT 0,
+            repeat_rule TEXT,
+            category TEXT,
+            notes TEXT,
+            is_reminded INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+def _add_is_reminded(conn):
+    if 'is_reminded' not in _columns(conn, 'events'):
+        conn.execute("ALTER TABLE events ADD COLUMN is_reminded INTEGER DEFAULT 0")
+
+def _add_epoch_columns(conn):
+    columns = _columns(conn, 'events')
+    if 'start_ts' not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN start_ts INTEGER")
+    if 'end_ts' not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN end_ts INTEGER")
+
+    # 分批回填，按 id 推进，单个事务不会长时间占用写锁
+    last_id = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, start_time, end_time FROM events
+            WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last_id, BACKFILL_BATCH)).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            'UPDATE events SET start_ts = ?, end_ts = ? WHERE id = ?',
+            [(to_epoch(row[1]), to_epoch(row[2]), row[0]) for row in rows]
+        )
+        conn.commit()
+        last_id = rows[-1][0]
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_user_start ON events (user_id, start_ts)')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_events_due ON events (is_reminded, start_ts)
+        WHERE is_reminded = 0
+    ''')
+
+def _add_recurrence_columns(conn):
+    # exdates：逗号分隔的排除时间；reminded_ts：重复日程最近一次已提醒的发生时间
+    columns = _columns(conn, 'events')
+    if 'exdates' not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN exdates TEXT")
+    if 'reminded_ts' not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN reminded_ts INTEGER")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_events_recurring ON events (user_id, start_ts)
+        WHERE repeat_rule <> ''
+    ''')
+
+def _create_outbox(conn):
+    # 待发送邮件；同一日程的同一次发生只允许入队一次
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER,
+            occurrence_ts INTEGER,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_ts INTEGER NOT NULL,
+            lease_until INTEGER,
+            last_error TEXT,
+            created_ts INTEGER NOT NULL,
+            sent_ts INTEGER,
+            UNIQUE (event_id, occurrence_ts)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (next_attempt_ts)
+        WHERE status IN ('pending', 'sending')
+    ''')
+
+def _add_events_version(conn):
+    # 每个用户的日程版本号：日程的任何增删改都由触发器加一，用于 ETag 和缓存失效
+    columns = _columns(conn, 'users')
+    if 'events_version' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN events_version INTEGER NOT NULL DEFAULT 0")
+    if 'feed_token' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN feed_token TEXT")
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_feed_token ON users (feed_token)')
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS trg_events_version_insert AFTER INSERT ON events
+        BEGIN
+            UPDATE users SET events_version = events_version + 1 WHERE id = NEW.user_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_events_version_update
+        AFTER UPDATE OF title, start_time, end_time, is_all_day, repeat_rule, category, notes, exdates ON events
+        BEGIN
+            UPDATE users SET events_version = events_version + 1 WHERE id = NEW.user_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_events_version_delete AFTER DELETE ON events
+        BEGIN
+            UPDATE users SET events_version = events_version + 1 WHERE id = OLD.user_id;
+        END;
+    ''')
+
+def _create_split_cache(conn):
+    # 任务拆分结果的持久化缓存，键为规范化后的 (任务, 语言, 模型) 的哈希
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS split_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_ts INTEGER NOT NULL
+        )
+    ''')
+
+def _create_search_index(conn):
+    # 日程全文检索（见 search.py），已有数据分批写入索引
+    register_functions(conn)
+    create_index(conn)
+    rebuild_index(conn, BACKFILL_BATCH)
+
+def _create_event_stats(conn):
+    # 按 (用户, 日期, 分类) 的统计汇总表（见 stats.py），由已有日程回填
+    create_rollups(conn)
+    rebuild_rollups(conn)
+
+def _create_leader_leases(conn):
+    # 多进程部署时的选主租约（见 runner.py），同一时刻只有一个进程运行提醒调度器
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leader_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_ts REAL NOT NULL
+        )
+    ''')
+
+def _add_events_modified_ts(conn):
+    # 日程最后修改时间（Last-Modified 用），与版本号由同一组触发器维护
+    if 'events_modified_ts' not in _columns(conn, 'users'):
+        conn.execute("ALTER TABLE users ADD COLUMN events_modified_ts INTEGER NOT NULL DEFAULT 0")
+    conn.execute("UPDATE users SET events_modified_ts = CAST(strftime('%s', 'now') AS INTEGER)")
+    conn.executescript('''
+        DROP TRIGGER IF EXISTS trg_events_version_insert;
+        DROP TRIGGER IF EXISTS trg_events_version_update;
+        DROP TRIGGER IF EXISTS trg_events_version_delete;
+        CREATE TRIGGER trg_events_version_insert AFTER INSERT ON events
+        BEGIN
+            UPDATE users SET events_version = events_version + 1,
+                events_modified_ts = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE id = NEW.user_id;
+        END;
+        CREATE TRIGGER trg_events_version_update
+        AFTER UPDATE OF title, start_time, end_time, is_all_day, repeat_rule, category, notes, exdates ON events
+        BEGIN
+            UPDATE users SET events_version = events_version + 1,
+                events_modified_ts = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE id = NEW.user_id;
+        END;
+        CREATE TRIGGER trg_events_version_delete AFTER DELETE ON events
+        BEGIN
+            UPDATE users SET events_version = events_version + 1,
+                events_modified_ts = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE id = OLD.user_id;
+        END;
+    ''')
+
+def _create_reminders(conn):
+    # 提醒提前量（见 reminders.py）：每个日程一到多个提醒，fire_at 为预先算好的下一次提醒时间；
+    # 发件箱的去重键加上提前量，同一次发生的多个提醒各发一封
+    register_reminder_functions(conn)
+    if 'reminder_offsets' not in _columns(conn, 'users'):
+        conn.execute("ALTER TABLE users ADD COLUMN reminder_offsets TEXT NOT NULL DEFAULT '[0]'")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            offset_minutes INTEGER NOT NULL,
+            fire_at INTEGER,
+            UNIQUE (event_id, offset_minutes)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_fire_at ON reminders (fire_at) WHERE fire_at IS NOT NULL')
+
+    # 已有日程按原来的提醒状态回填一个“开始时”提醒：已提醒/已入队的一次性日程不再提醒，
+    # 重复日程从上次提醒之后的下一次发生继续
+    last_id = 0
+    while True:
+        row = conn.execute('''
+            SELECT MAX(id) FROM (SELECT id FROM events WHERE id > ? ORDER BY id LIMIT ?)
+        ''', (last_id, BACKFILL_BATCH)).fetchone()
+        if row[0] is None:
+            break
+        conn.execute('''
+            INSERT OR IGNORE INTO reminders (event_id, offset_minutes, fire_at)
+            SELECT id, 0, CASE
+                WHEN is_reminded <> 0 THEN NULL
+                WHEN COALESCE(repeat_rule, '') = '' THEN reminder_fire_at(start_time, '', exdates, 0, NULL)
+                ELSE reminder_fire_at(start_time, repeat_rule, exdates, 0, reminded_ts)
+            END
+            FROM events WHERE id > ? AND id <= ?
+        ''', (last_id, row[0]))
+        conn.commit()
+        last_id = row[0]
+
+    # 触发器和发件箱重建放在同一个事务里，中途失败时可以整体重跑
+    conn.executescript('''
+        BEGIN;
+        CREATE TRIGGER IF NOT EXISTS trg_reminders_event_insert AFTER INSERT ON events
+        BEGIN
+            INSERT OR IGNORE INTO reminders (event_id, offset_minutes, fire_at)
+            SELECT NEW.id, value, reminder_fire_at(NEW.start_time, NEW.repeat_rule, NEW.exdates, value, NULL)
+            FROM json_each((SELECT reminder_offsets FROM users WHERE id = NEW.user_id));
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_reminders_event_update
+        AFTER UPDATE OF start_time, repeat_rule, exdates ON events
+        WHEN OLD.start_time IS NOT NEW.start_time OR OLD.repeat_rule IS NOT NEW.repeat_rule
+            OR OLD.exdates IS NOT NEW.exdates
+        BEGIN
+            UPDATE reminders
+            SET fire_at = reminder_fire_at(NEW.start_time, NEW.repeat_rule, NEW.exdates, offset_minutes, NULL)
+            WHERE event_id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_reminders_event_delete AFTER DELETE ON events
+        BEGIN
+            DELETE FROM reminders WHERE event_id = OLD.id;
+        END;
+
+        DROP INDEX IF EXISTS idx_events_due;
+
+        CREATE TABLE outbox_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER,
+            occurrence_ts INTEGER,
+            reminder_offset INTEGER NOT NULL DEFAULT 0,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_ts INTEGER NOT NULL,
+            lease_until INTEGER,
+            last_error TEXT,
+            created_ts INTEGER NOT NULL,
+            sent_ts INTEGER,
+            UNIQUE (event_id, occurrence_ts, reminder_offset)
+        );
+        INSERT INTO outbox_new (
+            id, event_id, occurrence_ts, to_email, subject, body, status, attempts,
+            next_attempt_ts, lease_until, last_error, created_ts, sent_ts
+        )
+        SELECT id, event_id, occurrence_ts, to_email, subject, body, status, attempts,
+            next_attempt_ts, lease_until, last_error, created_ts, sent_ts
+        FROM outbox;
+        DROP TABLE outbox;
+        ALTER TABLE outbox_new RENAME TO outbox;
+        CREATE INDEX idx_outbox_pending ON outbox (next_attempt_ts)
+        WHERE status IN ('pending', 'sending');
+        COMMIT;
+    ''')
+
+def _create_event_changes(conn):
+    # 增量同步的变更日志（见 changes.py）；已有日程不回填，客户端第一次同步时全量获取。
+    # idx_events_user_id 供全量同步按 id 分页
+    if 'sync_floor_seq' not in _columns(conn, 'users'):
+        conn.execute("ALTER TABLE users ADD COLUMN sync_floor_seq INTEGER NOT NULL DEFAULT 0")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_user_id ON events (user_id)')
+    create_log(conn)
+
+def _create_events_archive(conn):
+    # 冷热分离（见 archive.py）：归档表、all_events 视图，events 上的插入/删除触发器改为识别搬移；
+    # archived_until_ts 为该用户已归档日程的最晚结束时间，决定查询是否需要读归档
+    if 'archived_until_ts' not in _columns(conn, 'users'):
+        conn.execute("ALTER TABLE users ADD COLUMN archived_until_ts INTEGER NOT NULL DEFAULT 0")
+    conn.commit()
+    create_archive(conn)
+
+def _create_import_jobs(conn):
+    # 后台导入任务的进度（原来只在进程内），多 worker 部署时轮询落到任何 worker 都能查到
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            imported INTEGER NOT NULL DEFAULT 0,
+            bytes_read INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER NOT NULL,
+            error TEXT,
+            updated_ts INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_import_jobs_updated ON import_jobs (updated_ts)')
+
+def _add_reminder_delivery(conn):
+    # 提醒的送达状态：last_occurrence_ts 为最近一次入队的发生时间，delivery_status 为那封邮件的状态
+    # （queued/sent/failed），delivered_ts 为最近一次确认送达的发生时间；由发件箱在标记 sent/failed
+    # 的同一事务里更新。已有的发件箱记录按最近一封回填
+    columns = _columns(conn, 'reminders')
+    for column, kind in (('last_occurrence_ts', 'INTEGER'), ('delivery_status', 'TEXT'), ('delivered_ts', 'INTEGER')):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE reminders ADD COLUMN {column} {kind}")
+    conn.execute('''
+        UPDATE reminders SET
+            last_occurrence_ts = latest.occurrence_ts,
+            delivery_status = CASE latest.status WHEN 'sent' THEN 'sent' WHEN 'failed' THEN 'failed' ELSE 'queued' END,
+            delivered_ts = (
+                SELECT MAX(occurrence_ts) FROM outbox
+                WHERE event_id = reminders.event_id AND reminder_offset = reminders.offset_minutes
+                AND status = 'sent'
+            )
+        FROM (
+            SELECT event_id, reminder_offset, occurrence_ts, status,
+                ROW_NUMBER() OVER (PARTITION BY event_id, reminder_offset ORDER BY occurrence_ts DESC) AS n
+            FROM outbox WHERE event_id IS NOT NULL
+        ) AS latest
+        WHERE latest.n = 1 AND latest.event_id = reminders.event_id
+        AND latest.reminder_offset = reminders.offset_minutes
+    ''')
+
+def _compute_fire_at_in_app(conn):
+    # 提醒的触发器不再调用 Python 自定义函数 reminder_fire_at（没有注册它的连接写 events 会报错）：
+    # 只把新增或改期的提醒标记为 stale，fire_at 由 reminders.refresh() 计算
+    if 'stale' not in _columns(conn, 'reminders'):
+        conn.execute("ALTER TABLE reminders ADD COLUMN stale INTEGER NOT NULL DEFAULT 0")
+    conn.commit()
+    conn.executescript('''
+        BEGIN;
+        CREATE INDEX IF NOT EXISTS idx_reminders_stale ON reminders (event_id) WHERE stale = 1;
+        DROP TRIGGER IF EXISTS trg_reminders_event_insert;
+        DROP TRIGGER IF EXISTS trg_reminders_event_update;
+        CREATE TRIGGER trg_reminders_event_insert AFTER INSERT ON events
+        BEGIN
+            INSERT OR IGNORE INTO reminders (event_id, offset_minutes, fire_at, stale)
+            SELECT NEW.id, value, NULL, 1
+            FROM json_each((SELECT reminder_offsets FROM users WHERE id = NEW.user_id));
+        END;
+        CREATE TRIGGER trg_reminders_event_update
+        AFTER UPDATE OF start_time, repeat_rule, exdates ON events
+        WHEN OLD.start_time IS NOT NEW.start_time OR OLD.repeat_rule IS NOT NEW.repeat_rule
+            OR OLD.exdates IS NOT NEW.exdates
+        BEGIN
+            UPDATE reminders SET fire_at = NULL, stale = 1 WHERE event_id = NEW.id;
+        END;
+        COMMIT;
+    ''')
+    guard_triggers(conn)
+
+def _queue_search_index(conn):
+    # 全文索引的触发器不再调用 Python 自定义函数 fts_segment：只把原文写进 fts_queue，
+    # 由 search.flush_queue() 分词后写入索引（见 search.py）
+    create_queue(conn)
+    guard_triggers(conn)
+
+# 约定：迁移 14 起 events 有归档表（见 archive.py），归档/恢复是先插入目标表再从源表删除的“搬移”。
+# 之后新增的 AFTER INSERT / AFTER DELETE ON events 触发器必须带 WHEN archive.MOVE_GUARD
+# （NEW/OLD 在 events_archive 里已有同 id 时不执行），或在创建后调用 archive.guard_triggers(conn)，
+# 否则搬移会让统计、提醒、全文索引和变更日志重复或丢失；app.check_schema 在启动时检查这一点
+# 触发器里只用内置函数：没有经过 ConnectionPool 的连接（sqlite3 命令行、维护脚本）也要能写 events
+MIGRATIONS = [
+    _create_base_tables,
+    _add_is_reminded,
+    _add_epoch_columns,
+    _add_recurrence_columns,
+    _create_outbox,
+    _add_events_version,
+    _create_split_cache,
+    _create_search_index,
+    _create_event_stats,
+    _create_leader_leases,
+    _add_events_modified_ts,
+    _create_reminders,
+    _create_event_changes,
+    _create_events_archive,
+    _create_import_jobs,
+    _add_reminder_delivery,
+    _compute_fire_at_in_app,
+    _queue_search_index,
+]
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def pending_migrations(conn):
+    return len(MIGRATIONS) - conn.execute('PRAGMA user_version').fetchone()[0]
+
+@contextlib.contextmanager
+def migration_lock(database):
+    # 多个进程同时启动时串行执行迁移，后拿到锁的进程看到的已是最新版本；
+    # 没有 fcntl 的平台（Windows，只用于本地开发）不加锁
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(f'{database}.migrate.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def migrate(conn):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(conn)
+        conn.execute(f'PRAGMA user_version = {number}')
+        conn.commit()
+        print(f"数据库已迁移到版本 {number}")
+    return len(MIGRATIONS)
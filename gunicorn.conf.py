@@ -0,0 +1,37 @@
+import gc
+import os
+
+from dotenv import load_dotenv
+
+# - 生产环境配置：gunicorn -c gunicorn.conf.py
+# - preload_app：在 master 里导入应用、迁移数据库并编译模板一次，worker 由 fork 得到；
+#   线程在 fork 后不会保留，后台服务在 post_fork 里按 worker 启动。
+# - fork 前 gc.freeze()：master 里已有的对象移出垃圾回收，worker 里的回收不会去写这些对象所在的页，
+#   写时复制共享的内存不会被逐渐复制一份。
+# - 提醒调度器通过数据库租约选主，多个 worker 中只有一个在运行；
+#   REMINDER_RUNNER=external 时 worker 不运行调度器，改由 reminder_worker.py 单独进程负责。
+
+# .env 里的 WEB_CONCURRENCY 等配置在读取之前加载
+load_dotenv()
+
+wsgi_app = 'wsgi:app'
+bind = os.getenv('BIND', '0.0.0.0:5001')
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# 流式拆分（SSE）等长请求需要更长的超时
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+preload_app = True
+accesslog = '-'
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import start_background_services
+
+    start_background_services(elect_leader=True,
+                              reminders=os.getenv('REMINDER_RUNNER', 'leader') != 'external')
@@ -0,0 +1,323 @@
+import re
+from datetime import datetime, timedelta
+
+# - 流式 ICS 解析：逐行读取上传流，展开折行后按 VEVENT 逐个产出，
+#   内存占用只与单个日程的大小有关，不再把整个文件和 icalendar 对象树放进内存。
+# - 只解析导入需要的属性（SUMMARY/DTSTART/DTEND/DESCRIPTION/CATEGORIES/RRULE/EXDATE），
+#   字段规则与原来基于 icalendar 的导入保持一致；VALARM 只读取 TRIGGER，换算成“开始前多少分钟”。
+
+CATEGORIES = ['work', 'study', 'life', 'other']
+_DURATION_RE = re.compile(r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+
+class ICSFormatError(ValueError):
+    pass
+
+
+class ProgressStream:
+    # 包装上传流，记录已读取的字节数，供进度查询使用
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+
+    def __iter__(self):
+        for line in self._stream:
+            self.bytes_read += len(line)
+            yield line
+
+
+def _decode(raw):
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        try:
+            return raw.decode('gbk')
+        except UnicodeDecodeError:
+            raise ICSFormatError('文件编码不支持')
+
+
+def unfold(lines):
+    # RFC 5545 折行：以空格或制表符开头的行接在上一行后面
+    current = None
+    for raw in lines:
+        line = _decode(raw).rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def _split_outside_quotes(text, sep, maxsplit=-1):
+    parts, current, quoted = [], [], False
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        if ch == sep and not quoted and maxsplit != 0:
+            parts.append(''.join(current))
+            current = []
+            maxsplit -= 1
+            continue
+        current.append(ch)
+    parts.append(''.join(current))
+    return parts
+
+
+def parse_line(line):
+    # "NAME;PARAM=x:VALUE" -> (NAME, {PARAM: x}, VALUE)；参数值可能带引号并包含冒号
+    if '"' in line:
+        head, value = (_split_outside_quotes(line, ':', 1) + [''])[:2]
+        name, *params = _split_outside_quotes(head, ';')
+    else:
+        head, _, value = line.partition(':')
+        name, *params = head.split(';')
+    return name.upper(), dict(p.split('=', 1) for p in params if '=' in p), value
+
+
+def unescape(value):
+    if '\\' not in value:
+        return value
+    result, i = [], 0
+    while i < len(value):
+        ch = value[i]
+        if ch == '\\' and i + 1 < len(value):
+            nxt = value[i + 1]
+            result.append('\n' if nxt in 'nN' else nxt)
+            i += 2
+            continue
+        result.append(ch)
+        i += 1
+    return ''.join(result)
+
+
+def split_list(value):
+    # 按未转义的逗号拆分
+    items, current, escaped = [], [], False
+    for ch in value:
+        if escaped:
+            current.append(ch)
+            escaped = False
+        elif ch == '\\':
+            current.append(ch)
+            escaped = True
+        elif ch == ',':
+            items.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    items.append(''.join(current))
+    return items
+
+
+def parse_datetime(value):
+    # 与原导入一致：保留文件中的“挂钟时间”，不做时区换算
+    value = value.strip()
+    if len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d')
+    return datetime.strptime(value.rstrip('Z')[:15], '%Y%m%dT%H%M%S')
+
+
+def iter_components(lines, wanted='VEVENT'):
+    # 逐个产出 wanted 组件的属性列表 [(name, params, value), ...]；
+    # 直接嵌套的 VALARM 作为一条 ('VALARM', {}, [VALARM 的属性]) 记录，其他嵌套组件跳过
+    in_calendar = False
+    props, depth, alarm = None, 0, None
+    for line in unfold(lines):
+        if not line:
+            continue
+        name, params, value = parse_line(line)
+        if not in_calendar and (name, value.upper()) != ('BEGIN', 'VCALENDAR'):
+            # 第一行就不是 BEGIN:VCALENDAR 时立即报错，调用方还没有写入任何日程
+            raise ICSFormatError('无效的日历文件')
+        if name == 'BEGIN':
+            value = value.upper()
+            if value == 'VCALENDAR':
+                in_calendar = True
+            elif props is None and value == wanted:
+                props, depth = [], 0
+            elif props is not None:
+                if not depth and value == 'VALARM':
+                    alarm = []
+                depth += 1
+            continue
+        if name == 'END' and props is not None:
+            if depth:
+                depth -= 1
+                if not depth and alarm is not None:
+                    props.append(('VALARM', {}, alarm))
+                    alarm = None
+            elif value.upper() == wanted:
+                yield props
+                props = None
+            continue
+        if props is not None and not depth:
+            props.append((name, params, value))
+        elif alarm is not None and depth == 1:
+            alarm.append((name, params, value))
+    if not in_calendar:
+        raise ICSFormatError('无效的日历文件')
+
+
+def parse_duration(value):
+    # RFC 5545 DURATION（如 -PT15M、-P1D、P1DT2H）-> timedelta
+    match = _DURATION_RE.match(value.strip().upper())
+    if not match or not any(match.groups()[1:]):
+        raise ValueError(f'无法识别的时长: {value}')
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+
+def alarm_offset(alarm, start, end):
+    # VALARM 的 TRIGGER -> 开始前多少分钟；没有 TRIGGER 或提醒时间晚于开始时间返回 None
+    for name, params, value in alarm:
+        if name != 'TRIGGER':
+            continue
+        if params.get('VALUE', '').upper() == 'DATE-TIME':
+            fire = parse_datetime(value)
+        else:
+            base = end if params.get('RELATED', '').upper() == 'END' and end else start
+            fire = base + parse_duration(value)
+        seconds = (start - fire).total_seconds()
+        return int(seconds // 60) if seconds >= 0 else None
+    return None
+
+
+def event_fields(props):
+    # 把 VEVENT 属性转换成 events 表需要的字段；没有 DTSTART 的日程返回 None。
+    # alarms：VALARM 换算出的提前分钟数，文件里没有 VALARM 时为 None（使用用户的默认提醒）
+    fields = {'title': '', 'start_time': None, 'end_time': None, 'repeat_rule': '',
+              'category': 'other', 'notes': None, 'exdates': [], 'alarms': None}
+    seen_category = False
+    alarms = []
+    for name, params, value in props:
+        if name == 'SUMMARY':
+            fields['title'] = unescape(value)
+        elif name == 'DESCRIPTION':
+            fields['notes'] = unescape(value) or None
+        elif name == 'DTSTART':
+            fields['start_time'] = parse_datetime(value).strftime('%Y-%m-%d %H:%M:%S')
+        elif name == 'DTEND':
+            fields['end_time'] = parse_datetime(value).strftime('%Y-%m-%d %H:%M:%S')
+        elif name == 'RRULE':
+            fields['repeat_rule'] = value
+        elif name == 'EXDATE':
+            fields['exdates'].extend(parse_datetime(v) for v in value.split(',') if v)
+        elif name == 'CATEGORIES' and not seen_category:
+            # 取第一个分类，小写后与前端样式匹配
+            seen_category = True
+            first = unescape(split_list(value)[0]).strip().lower()
+            fields['category'] = first if first in CATEGORIES else 'other'
+        elif name == 'VALARM':
+            alarms.append(value)
+    if not fields['start_time']:
+        return None
+    if alarms:
+        start = datetime.fromisoformat(fields['start_time'])
+        end = datetime.fromisoformat(fields['end_time']) if fields['end_time'] else None
+        offsets = {alarm_offset(alarm, start, end) for alarm in alarms}
+        fields['alarms'] = sorted(offset for offset in offsets if offset is not None)
+    return fields
+
+
+def iter_events(stream):
+    for props in iter_components(stream):
+        try:
+            fields = event_fields(props)
+        except ValueError as e:
+            print(f"跳过无法解析的日程: {e}")
+            continue
+        if fields:
+            yield fields
+
+
+# ============= 流式导出 =============
+# - 逐个日程生成 ICS 文本并按块产出，可直接作为响应体流式写出，
+#   不再构建完整的 Calendar 对象再整体 to_ical()。
+
+PRODID = '-//My Calendar//mxm.dk//'
+
+
+def escape_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    # 每行最多 75 个字节，续行以空格开头；按 UTF-8 字符边界切分
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, current, size, limit = [], [], 0, 75
+    for ch in line:
+        width = len(ch.encode('utf-8'))
+        if size + width > limit:
+            parts.append(''.join(current))
+            current, size, limit = [], 0, 74
+        current.append(ch)
+        size += width
+    parts.append(''.join(current))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def format_trigger(minutes):
+    if minutes == 0:
+        return 'PT0S'
+    if minutes % 1440 == 0:
+        return f'-P{minutes // 1440}D'
+    if minutes % 60 == 0:
+        return f'-PT{minutes // 60}H'
+    return f'-PT{minutes}M'
+
+
+def serialize_event(event):
+    # event: uid/title/start/end/rrule/exdates/notes/category/alarms（开始前多少分钟）
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:{event['uid']}",
+        f"SUMMARY:{escape_text(event['title'] or '')}",
+        f"DTSTART:{format_datetime(event['start'])}",
+    ]
+    if event.get('end'):
+        lines.append(f"DTEND:{format_datetime(event['end'])}")
+    if event.get('rrule'):
+        lines.append(f"RRULE:{event['rrule']}")
+        if event.get('exdates'):
+            lines.append('EXDATE:' + ','.join(format_datetime(d) for d in sorted(event['exdates'])))
+    if event.get('notes'):
+        lines.append(f"DESCRIPTION:{escape_text(event['notes'])}")
+    if event.get('category'):
+        lines.append(f"CATEGORIES:{escape_text(event['category'])}")
+    for minutes in event.get('alarms') or ():
+        lines.extend((
+            'BEGIN:VALARM',
+            'ACTION:DISPLAY',
+            f"DESCRIPTION:{escape_text(event['title'] or '')}",
+            f'TRIGGER:{format_trigger(minutes)}',
+            'END:VALARM',
+        ))
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def iter_calendar(events, chunk_size=64 * 1024):
+    # 按约 chunk_size 字节的块产出 UTF-8 编码的日历内容
+    buffer = [f'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{PRODID}\r\n']
+    size = len(buffer[0])
+    for event in events:
+        text = serialize_event(event)
+        buffer.append(text)
+        size += len(text)
+        if size >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    buffer.append('END:VCALENDAR\r\n')
+    yield ''.join(buffer).encode('utf-8')
@@ -0,0 +1,148 @@
+import bisect
+import heapq
+from datetime import datetime, timedelta
+
+# - 日程区间索引：按开始时间排序的数组上建一棵隐式平衡二叉树（每个区间的中点为根），
+#   每个节点记录子树内的最大结束时间，查询与 [start, end) 重叠的日程时剪掉不可能重叠的子树，
+#   复杂度约 O(log n + k)。
+# - 同时维护合并后的忙碌时间段（有序、互不相交），空闲时间从二分定位的位置开始向后扫描。
+# - add() 只增量合并忙碌时间段，重叠查询用的树在下次查询时才重建，适合连续安排多个日程。
+# - 区间一律是 [start, end) 的 epoch 秒；长度为 0 的区间不占用时间。
+
+
+class IntervalIndex:
+    def __init__(self, intervals=()):
+        # intervals: [(start, end, item), ...]
+        self._entries = sorted(
+            ((start, end, item) for start, end, item in intervals if end > start),
+            key=lambda entry: (entry[0], entry[1])
+        )
+        self._build()
+        self._busy_starts, self._busy_ends = [], []
+        for start, end, _ in self._entries:
+            self._merge_busy(start, end)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _build(self):
+        self._max_end = [0] * len(self._entries)
+        self._fill(0, len(self._entries))
+        self._dirty = False
+
+    def _fill(self, lo, hi):
+        if lo >= hi:
+            return 0
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self._entries[mid][1], self._fill(lo, mid), self._fill(mid + 1, hi))
+        return self._max_end[mid]
+
+    def _merge_busy(self, start, end):
+        starts, ends = self._busy_starts, self._busy_ends
+        # 与 [start, end) 相交或相接的忙碌段合并成一段
+        lo = bisect.bisect_left(ends, start)
+        hi = bisect.bisect_right(starts, end)
+        if lo < hi:
+            start = min(start, starts[lo])
+            end = max(end, ends[hi - 1])
+        starts[lo:hi] = [start]
+        ends[lo:hi] = [end]
+
+    def add(self, start, end, item=None):
+        if end <= start:
+            return
+        bisect.insort(self._entries, (start, end, item), key=lambda entry: (entry[0], entry[1]))
+        self._dirty = True
+        self._merge_busy(start, end)
+
+    def overlapping(self, start, end):
+        # 返回与 [start, end) 重叠的条目，按开始时间排序
+        if self._dirty:
+            self._build()
+        found = []
+        stack = [(0, len(self._entries))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] <= start:
+                continue
+            entry_start, entry_end, item = self._entries[mid]
+            if entry_start < end:
+                # 右子树的开始时间都不早于 mid
+                stack.append((mid + 1, hi))
+                if entry_end > start:
+                    found.append((entry_start, entry_end, item))
+            stack.append((lo, mid))
+        found.sort(key=lambda entry: (entry[0], entry[1]))
+        return found
+
+    def conflicts(self):
+        # 扫描线：按开始时间依次加入，活动集合里尚未结束的日程都与当前日程重叠；O(n log n + k)
+        pairs = []
+        active = []
+        for seq, (start, end, item) in enumerate(self._entries):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            pairs.extend((other, item) for _, _, other in active)
+            heapq.heappush(active, (end, seq, item))
+        return pairs
+
+    def busy(self, start, end):
+        # [start, end) 内合并后的忙碌时间段
+        i = bisect.bisect_right(self._busy_ends, start)
+        result = []
+        while i < len(self._busy_starts) and self._busy_starts[i] < end:
+            result.append((max(self._busy_starts[i], start), min(self._busy_ends[i], end)))
+            i += 1
+        return result
+
+    def free_slots(self, start, end, duration, day_hours=None, limit=None):
+        # [start, end) 内长度不少于 duration 秒的空闲时间段；
+        # day_hours=(开始分钟, 结束分钟) 时只在每天的这段时间内查找（如 (540, 1080) 表示 9:00-18:00）
+        slots = []
+        for window_start, window_end in _windows(start, end, day_hours):
+            cursor = window_start
+            i = bisect.bisect_right(self._busy_ends, cursor)
+            while cursor < window_end:
+                gap_end = window_end
+                if i < len(self._busy_starts) and self._busy_starts[i] < window_end:
+                    gap_end = max(self._busy_starts[i], cursor)
+                if gap_end - cursor >= duration:
+                    slots.append((cursor, gap_end))
+                    if limit and len(slots) >= limit:
+                        return slots
+                if gap_end >= window_end:
+                    break
+                cursor = self._busy_ends[i]
+                i += 1
+        return slots
+
+    def place(self, start, end, duration, count, day_hours=None):
+        # 依次把 count 个时长为 duration 的日程放进最早的空闲时间，每放一个就记为忙碌
+        placed = []
+        for _ in range(count):
+            slots = self.free_slots(start, end, duration, day_hours, limit=1)
+            if not slots:
+                break
+            slot_start = slots[0][0]
+            self.add(slot_start, slot_start + duration)
+            placed.append((slot_start, slot_start + duration))
+            start = slot_start + duration
+        return placed
+
+
+def _windows(start, end, day_hours):
+    if day_hours is None:
+        yield start, end
+        return
+    first_minute, last_minute = day_hours
+    day = datetime.fromtimestamp(start).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day.timestamp() < end:
+        window_start = int((day + timedelta(minutes=first_minute)).timestamp())
+        window_end = int((day + timedelta(minutes=last_minute)).timestamp())
+        window_start, window_end = max(window_start, start), min(window_end, end)
+        if window_start < window_end:
+            yield window_start, window_end
+        day += timedelta(days=1)
@@ -1,31 +1,102 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.header import Header
-
-
-# - `smtplib`：Python内置的SMTP协议库，用于连接邮件服务器并发送邮件。
-# - `email.mime.text.MIMEText`：用于创建纯文本邮件内容。
-# - `email.header.Header`：用于设置邮件的头部信息（如发件人、收件人、主题）。
-
-def send_email(subject, content, to_email):
-    from_email = '1827764696@qq.com'  # ⚠️ 替换为你的QQ邮箱
-    password = 'yiydllkqbndceefa'           # ⚠️ 替换为你开启SMTP服务后获得的授权码
-    smtp_server = 'smtp.qq.com'
-    smtp_port = 587
-
-    message = MIMEText(content, 'plain', 'utf-8')
-    message['From'] = Header(from_email)
-    message['To'] = Header(to_email)
-    message['Subject'] = Header(subject)
-
-    try:
-        print("开始连接SMTP服务器...")
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.set_debuglevel(1)  # 显示SMTP交互
-        server.starttls()
-        server.login(from_email, password)
-        server.sendmail(from_email, [to_email], message.as_string())
-        server.quit()
-        print(f"✅ 成功发送邮件至 {to_email}")
-    except Exception as e:
-        print(f"❌ 邮件发送失败: {e}")
+import os
+import smtplib
+import time
+from email.mime.text import MIMEText
+from email.header import Header
+
+
+# - `smtplib`：Python内置的SMTP协议库，用于连接邮件服务器并发送邮件。
+# - `email.mime.text.MIMEText`：用于创建纯文本邮件内容。
+# - `email.header.Header`：用于设置邮件的头部信息（如发件人、收件人、主题）。
+# - 服务器配置从环境变量读取（见 INSTALL.md），未配置时沿用原来的 QQ 邮箱设置。
+
+def smtp_settings():
+    return {
+        'server': os.getenv('MAIL_SERVER', 'smtp.qq.com'),
+        'port': int(os.getenv('MAIL_PORT', '587')),
+        'use_tls': os.getenv('MAIL_USE_TLS', 'True').lower() in ('1', 'true', 'yes'),
+        'username': os.getenv('MAIL_USERNAME', '1827764696@qq.com'),  # ⚠️ 替换为你的QQ邮箱
+        'password': os.getenv('MAIL_PASSWORD', 'yiydllkqbndceefa'),     # ⚠️ 替换为你开启SMTP服务后获得的授权码
+        'debug': int(os.getenv('MAIL_DEBUG', '0')),                     # 1 表示显示SMTP交互
+        'timeout': float(os.getenv('MAIL_TIMEOUT', '30')),
+    }
+
+def build_message(subject, content, from_email, to_email):
+    message = MIMEText(content, 'plain', 'utf-8')
+    message['From'] = Header(from_email)
+    message['To'] = Header(to_email)
+    message['Subject'] = Header(subject)
+    return message
+
+
+class SMTPSession:
+    # - 持久化的 SMTP 连接：STARTTLS 和登录只做一次，之后的邮件复用同一连接。
+    # - 空闲超过 idle_timeout 后先发 NOOP 确认连接仍然可用，断开时自动重连一次。
+
+    def __init__(self, settings=None, idle_timeout=60):
+        self.settings = settings or smtp_settings()
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0
+
+    def _connect(self):
+        s = self.settings
+        server = smtplib.SMTP(s['server'], s['port'], timeout=s['timeout'])
+        server.set_debuglevel(s['debug'])
+        if s['use_tls']:
+            server.starttls()
+        if s['username'] and s['password']:
+            server.login(s['username'], s['password'])
+        self._server = server
+
+    def _ensure_connected(self):
+        if self._server is not None and time.time() - self._last_used > self.idle_timeout:
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except OSError:  # SMTPException 也是 OSError 的子类
+                self.close()
+        if self._server is None:
+            self._connect()
+
+    def send(self, subject, content, to_email):
+        # 成功返回时邮件已被服务器接受；收件人被拒或连接失败都会抛出异常
+        from_email = self.settings['username']
+        message = build_message(subject, content, from_email, to_email).as_string()
+        for attempt in range(2):
+            self._ensure_connected()
+            try:
+                refused = self._server.sendmail(from_email, [to_email], message)
+                self._last_used = time.time()
+                if refused:
+                    raise smtplib.SMTPRecipientsRefused(refused)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._server = None
+                if attempt:
+                    raise
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except OSError:
+                pass
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def send_email(subject, content, to_email):
+    # 单封邮件的同步发送，批量发送请走 outbox 的工作线程
+    try:
+        print("开始连接SMTP服务器...")
+        with SMTPSession() as session:
+            session.send(subject, content, to_email)
+        print(f"✅ 成功发送邮件至 {to_email}")
+    except Exception as e:
+        print(f"❌ 邮件发送失败: {e}")
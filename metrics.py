@@ -0,0 +1,319 @@
+import bisect
+import cProfile
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+# - 进程内的性能指标：直方图（请求耗时、SQL、OpenAI、SMTP、提醒延迟）和计数器，
+#   /metrics 以 Prometheus 文本格式输出。
+# - SQL 计时通过连接池创建的 TimedConnection 完成，execute 的耗时包含取到第一行为止的执行时间；
+#   同时按线程累计语句数，请求结束时记入“每个请求的 SQL 语句数”。
+# - SLOW_QUERY_MS：超过该毫秒数的语句打印到日志（不打印参数）；未设置时关闭。
+# - PROFILE_SAMPLE_RATE：按比例抽样请求用 cProfile 采样，结果写到 PROFILE_DIR；为 0 时关闭。
+# - METRICS_DIR：多进程部署时每个 worker 定期把计数写入该目录，/metrics 汇总所有 worker。
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, n=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: value for labels, value in self._values.items()}
+
+    @staticmethod
+    def merge(total, values):
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def render(self, values):
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [各桶计数..., 总和, 总数]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    @staticmethod
+    def merge(total, values):
+        for labels, series in values.items():
+            current = total.get(labels)
+            if current is None:
+                total[labels] = list(series)
+            else:
+                for i, value in enumerate(series):
+                    current[i] += value
+
+    def render(self, values):
+        for labels, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield (f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", _format_value(bound))])}'
+                       f' {cumulative}')
+            yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", "+Inf")])} {series[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-2])}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._gauges = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, fn, labelnames=()):
+        # fn() 返回数值，或 {labels: 数值}；只反映当前进程，采集时才计算
+        self._gauges.append((name, help, tuple(labelnames), fn))
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def flush(self, directory):
+        # 原子写入当前进程的计数，供其他 worker 汇总
+        data = {name: [[list(labels), value] for labels, value in values.items()]
+                for name, values in self.snapshot().items()}
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _collect(self, directory):
+        totals = self.snapshot()
+        if not directory or not os.path.isdir(directory):
+            return totals
+        merge = {metric.name: metric.merge for metric in self._metrics}
+        own = f'{os.getpid()}.json'
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, values in data.items():
+                if name in merge:
+                    merge[name](totals[name], {tuple(labels): value for labels, value in values})
+        return totals
+
+    def render(self, directory=None):
+        totals = self._collect(directory)
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(totals[metric.name]))
+        for name, help, labelnames, fn in self._gauges:
+            try:
+                value = fn()
+            except Exception as e:
+                print(f"指标 {name} 计算失败: {str(e)}")
+                continue
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            values = value if isinstance(value, dict) else {(): value}
+            for labels, v in sorted(values.items()):
+                lines.append(f'{name}{_format_labels(labelnames, labels)} {_format_value(v)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'chimeo_request_duration_seconds', '请求处理耗时', ('endpoint', 'method', 'status'))
+SQL_SECONDS = registry.histogram(
+    'chimeo_sql_duration_seconds', 'SQL 语句执行耗时（到第一行为止）', ('operation',),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5))
+SQL_PER_REQUEST = registry.histogram(
+    'chimeo_request_sql_statements', '每个请求执行的 SQL 语句数', ('endpoint',),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500))
+OPENAI_SECONDS = registry.histogram(
+    'chimeo_openai_duration_seconds', 'OpenAI 调用耗时', ('mode', 'outcome'))
+PASSWORD_HASH_SECONDS = registry.histogram(
+    'chimeo_password_hash_duration_seconds', '密码哈希耗时（含排队）', ('operation', 'outcome'))
+SMTP_SECONDS = registry.histogram(
+    'chimeo_smtp_send_duration_seconds', '单封邮件的 SMTP 发送耗时', ('outcome',))
+REMINDER_LAG = registry.histogram(
+    'chimeo_reminder_lag_seconds', '提醒计划时间到实际触发的延迟',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300))
+
+
+# ============= SQL 计时 =============
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '0'))
+
+_local = threading.local()
+_operations = {}
+
+
+def _operation(sql):
+    op = _operations.get(sql)
+    if op is None:
+        words = sql.split(None, 1)
+        op = words[0].upper() if words else ''
+        if op not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'BEGIN', 'PRAGMA'):
+            op = 'OTHER'
+        if len(_operations) < 4096:
+            _operations[sql] = op
+    return op
+
+
+def record_sql(sql, seconds):
+    SQL_SECONDS.observe(seconds, _operation(sql))
+    _local.statements = getattr(_local, 'statements', 0) + 1
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        print(f"慢查询 {seconds * 1000:.1f} ms: {' '.join(sql.split())[:500]}")
+
+
+def reset_statements():
+    _local.statements = 0
+
+
+def statement_count():
+    return getattr(_local, 'statements', 0)
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_sql(sql, time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# ============= 抽样 profiler =============
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'chimeo-profiles')
+
+
+def start_profile():
+    if not PROFILE_SAMPLE_RATE or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同一线程里已有 profiler 在运行
+        return None
+    return profiler
+
+
+def finish_profile(profiler, name):
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f'{name}-{int(time.time() * 1000)}-{os.getpid()}.prof')
+    profiler.dump_stats(path)
+    return path
+
+
+# ============= 多进程汇总 =============
+METRICS_DIR = os.getenv('METRICS_DIR')
+
+
+def start_flusher(interval=5.0):
+    # 每个 worker 进程启动一次；未设置 METRICS_DIR 时什么也不做
+    if not METRICS_DIR:
+        return None
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                registry.flush(METRICS_DIR)
+            except OSError as e:
+                print(f"写入指标失败: {str(e)}")
+
+    thread = threading.Thread(target=run, name='metrics-flush', daemon=True)
+    thread.start()
+    return thread
+
+
+def render():
+    return registry.render(METRICS_DIR)
@@ -0,0 +1,178 @@
+import random
+import smtplib
+import threading
+import time
+
+from metrics import SMTP_SECONDS
+
+# - 邮件发件箱：提醒先写入 outbox 表（与日程更新在同一事务内），
+#   再由工作线程异步发送，SMTP 的快慢不再影响数据库写锁。
+# - 每个工作线程持有一个已登录的 SMTP 会话，一次认领一批邮件连续发送。
+# - 认领通过 UPDATE ... RETURNING 原子完成并带租约，进程崩溃后租约过期会被重新认领。
+# - 失败按指数退避重试，超过最大次数或收件人被拒则标记为 failed。
+# - 只有服务器接受之后才标记 sent；sent/failed 的回调与状态更新在同一事务里，提醒的送达状态不会与发件箱不一致。
+
+
+def enqueue(conn, to_email, subject, body, event_id=None, occurrence_ts=None, reminder_offset=0):
+    # 同一日程的同一次发生、同一个提前量只入队一次；返回是否新插入
+    now = int(time.time())
+    cursor = conn.execute('''
+        INSERT OR IGNORE INTO outbox (
+            event_id, occurrence_ts, reminder_offset, to_email, subject, body,
+            status, attempts, next_attempt_ts, created_ts
+        ) VALUES (?, ?, ?, ?, ?, ?, 'pending', 0, ?, ?)
+    ''', (event_id, occurrence_ts, reminder_offset, to_email, subject, body, now, now))
+    return cursor.rowcount == 1
+
+
+def smtp_session():
+    # smtplib/ssl 在发件线程启动时才导入，不发邮件的进程（命令行、基准测试）不必加载
+    from mail_sender import SMTPSession
+
+    return SMTPSession()
+
+
+class Outbox:
+    def __init__(self, get_db, on_delivered=None, on_failed=None, workers=2, batch_size=50,
+                 max_attempts=5, base_delay=30, lease=300, poll_interval=5,
+                 session_factory=smtp_session):
+        # get_db：返回当前线程的数据库连接
+        # on_delivered(conn, rows) / on_failed(conn, rows)：在标记 sent / failed 的同一事务里回调，
+        # 用于更新提醒的送达状态
+        self._get_db = get_db
+        self._on_delivered = on_delivered
+        self._on_failed = on_failed
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._session_factory = session_factory
+
+        self._cond = threading.Condition()
+        self._wake_pending = False
+        self._stopped = False
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self.stats = {"sent": 0, "retried": 0, "failed": 0, "batches": 0}
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'outbox-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        with self._cond:
+            self._wake_pending = True
+            self._cond.notify_all()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _claim(self):
+        now = int(time.time())
+        with self._get_db() as conn:
+            rows = conn.execute('''
+                UPDATE outbox SET status = 'sending', lease_until = ?
+                WHERE id IN (
+                    SELECT id FROM outbox
+                    WHERE status IN ('pending', 'sending')
+                    AND next_attempt_ts <= ?
+                    AND (status = 'pending' OR lease_until < ?)
+                    ORDER BY next_attempt_ts
+                    LIMIT ?
+                )
+                RETURNING id, event_id, occurrence_ts, reminder_offset, to_email, subject, body, attempts
+            ''', (now + self.lease, now, now, self.batch_size)).fetchall()
+        return rows
+
+    def _record(self, delivered, failures):
+        now = int(time.time())
+        failed = []
+        with self._get_db() as conn:
+            conn.executemany('''
+                UPDATE outbox SET status = 'sent', sent_ts = ?, attempts = attempts + 1,
+                lease_until = NULL, last_error = NULL
+                WHERE id = ?
+            ''', [(now, row['id']) for row in delivered])
+            for row, error, permanent in failures:
+                attempts = row['attempts'] + 1
+                if permanent or attempts >= self.max_attempts:
+                    conn.execute('''
+                        UPDATE outbox SET status = 'failed', attempts = ?, lease_until = NULL, last_error = ?
+                        WHERE id = ?
+                    ''', (attempts, str(error), row['id']))
+                    failed.append(row)
+                    self._count('failed')
+                else:
+                    # 指数退避并加一点抖动，避免大量重试同时落到服务器上
+                    delay = self.base_delay * 2 ** row['attempts'] * random.uniform(1, 1.5)
+                    conn.execute('''
+                        UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_ts = ?,
+                        lease_until = NULL, last_error = ?
+                        WHERE id = ?
+                    ''', (attempts, int(now + delay), str(error), row['id']))
+                    self._count('retried')
+            if delivered and self._on_delivered:
+                self._on_delivered(conn, delivered)
+            if failed and self._on_failed:
+                self._on_failed(conn, failed)
+
+    def _send_batch(self, session, rows):
+        delivered, failures = [], []
+        for row in rows:
+            started = time.perf_counter()
+            try:
+                session.send(row['subject'], row['body'], row['to_email'])
+                delivered.append(row)
+                SMTP_SECONDS.observe(time.perf_counter() - started, 'sent')
+                print(f"✓ 已发送提醒给 {row['to_email']}")
+            except smtplib.SMTPRecipientsRefused as e:
+                failures.append((row, e, True))
+                SMTP_SECONDS.observe(time.perf_counter() - started, 'refused')
+                print(f"✗ 邮件发送失败: {str(e)}")
+            except Exception as e:
+                # 连接层面的错误：丢弃会话，下一封重新连接
+                failures.append((row, e, False))
+                SMTP_SECONDS.observe(time.perf_counter() - started, 'error')
+                session.close()
+                print(f"✗ 邮件发送失败: {str(e)}")
+        return delivered, failures
+
+    def run_once(self, session):
+        rows = self._claim()
+        if not rows:
+            return 0
+        delivered, failures = self._send_batch(session, rows)
+        self._record(delivered, failures)
+        self._count('sent', len(delivered))
+        self._count('batches')
+        return len(rows)
+
+    def _run(self):
+        session = self._session_factory()
+        try:
+            while not self._stopped:
+                try:
+                    if self.run_once(session):
+                        continue
+                except Exception as e:
+                    print(f"发件箱错误: {str(e)}")
+                    session.close()
+                with self._cond:
+                    if not self._stopped and not self._wake_pending:
+                        self._cond.wait(self.poll_interval)
+                    self._wake_pending = False
+        finally:
+            session.close()
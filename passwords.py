@@ -0,0 +1,141 @@
+import hmac
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metrics import PASSWORD_HASH_SECONDS
+
+# - 密码以 werkzeug 的 "方法:参数$盐$哈希" 格式保存，默认 scrypt:32768:8:1（单次约 0.1 秒、32MB 内存）。
+#   PASSWORD_HASH_METHOD 可调（需写全参数，如 scrypt:16384:8:1、pbkdf2:sha256:600000）。
+# - 旧的明文密码在下一次登录成功时改写为哈希；调整参数后，旧参数的哈希同样在登录时升级。
+# - 哈希在有界线程池里计算（hashlib 计算期间释放 GIL，不需要进程池）：同时计算的不超过
+#   PASSWORD_HASH_WORKERS 个，排队的不超过 PASSWORD_HASH_QUEUE 个，再多直接抛出 HasherBusy，
+#   登录高峰不会占满 CPU 和请求线程。
+# - 尝试次数按用户名限流：LOGIN_ATTEMPT_WINDOW 秒内最多 LOGIN_MAX_ATTEMPTS 次未成功的尝试，
+#   计算中的尝试也算在内，并发猜测同样受限；被拒绝的尝试不计算哈希。计数在进程内。
+
+HASH_RE = re.compile(r'^(scrypt|pbkdf2):[^$]+\$[^$]+\$[0-9a-f]+$')
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def is_hashed(stored):
+    return bool(stored and HASH_RE.match(stored))
+
+
+class PasswordHasher:
+    def __init__(self, method=None, workers=None, max_queue=None, timeout=None):
+        self.method = method or os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        self.workers = workers or int(os.getenv('PASSWORD_HASH_WORKERS', str(max((os.cpu_count() or 2) // 2, 1))))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('PASSWORD_HASH_QUEUE', '16'))
+        self.timeout = timeout or float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+        # 计算中和排队中的总数上限
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def pool(self):
+        # 第一次使用时才创建，preload_app 时线程不会被 fork 进 worker
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        return self._pool
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            PASSWORD_HASH_SECONDS.observe(0, operation, 'rejected')
+            raise HasherBusy()
+        started = time.perf_counter()
+        try:
+            future = self.pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, operation, 'timeout')
+            raise HasherBusy()
+        PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, operation, 'ok')
+        return result
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def _upgrade(self, password):
+        # 登录已经成功，升级用的哈希算不过来就等下次登录
+        try:
+            return self.hash(password)
+        except HasherBusy:
+            return None
+
+    def verify(self, stored, password):
+        # 返回 (是否匹配, 需要写回的新哈希或 None)
+        if not is_hashed(stored):
+            # 明文旧数据：常数时间比较，匹配后升级为哈希
+            if not hmac.compare_digest((stored or '').encode('utf-8'), password.encode('utf-8')):
+                return False, None
+            return True, self._upgrade(password)
+        if not self._run('verify', check_password_hash, stored, password):
+            return False, None
+        if stored.split('$', 1)[0] != self.method:
+            return True, self._upgrade(password)
+        return True, None
+
+    def stats(self):
+        return {
+            "method": self.method,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+
+class LoginThrottle:
+    # 每个用户名一个固定窗口：(窗口开始时间, 未成功的尝试次数)；条目数有上限，最久未用的先淘汰
+    def __init__(self, max_attempts=None, window=None, maxsize=10000):
+        self.max_attempts = max_attempts or int(os.getenv('LOGIN_MAX_ATTEMPTS', '5'))
+        self.window = window or int(os.getenv('LOGIN_ATTEMPT_WINDOW', '300'))
+        self.maxsize = maxsize
+        self._attempts = OrderedDict()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def attempt(self, username, now=None):
+        # 登记一次尝试；允许时返回 0，否则返回需要等待的秒数
+        now = now if now is not None else time.time()
+        with self._lock:
+            started, count = self._attempts.get(username, (now, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+            if count >= self.max_attempts:
+                self.throttled += 1
+                return max(int(started + self.window - now) + 1, 1)
+            self._attempts[username] = (started, count + 1)
+            self._attempts.move_to_end(username)
+            while len(self._attempts) > self.maxsize:
+                self._attempts.popitem(last=False)
+            return 0
+
+    def cancel(self, username):
+        # 尝试没有真正进行（如哈希线程池繁忙），退回这次计数
+        with self._lock:
+            entry = self._attempts.get(username)
+            if entry is not None and entry[1] > 0:
+                self._attempts[username] = (entry[0], entry[1] - 1)
+
+    def succeeded(self, username):
+        with self._lock:
+            self._attempts.pop(username, None)
@@ -0,0 +1,249 @@
+import calendar
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta, timezone
+
+# - 重复规则引擎：解析 RFC 5545 RRULE / EXDATE，并只在查询窗口内惰性展开。
+# - repeat_rule 字段既可能是表单里的 daily/weekly/monthly/yearly，
+#   也可能是从 ICS 导入的 "FREQ=WEEKLY;BYDAY=MO,WE" 这类完整规则。
+# - 展开按“周期”推进：无 COUNT 的规则直接跳到窗口所在周期，
+#   成本只与窗口大小有关，“每天、永不结束”的规则也不会被全部展开。
+
+Rule = namedtuple('Rule', 'freq interval count until byday bymonthday')
+
+FREQS = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+_BYDAY_RE = re.compile(r'^([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$')
+
+
+def _parse_ical_time(value):
+    # 支持 20250701、20250701T090000 以及带 Z 的 UTC 时间（转为本地时间）
+    value = value.strip()
+    if len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d').replace(hour=23, minute=59, second=59)
+    if value.endswith('Z'):
+        dt = datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+        return dt.astimezone().replace(tzinfo=None)
+    return datetime.strptime(value, '%Y%m%dT%H%M%S')
+
+
+def parse_rule(text):
+    # 无法识别的规则（包括表单里的“自定义”）返回 None，按一次性日程处理
+    if not text:
+        return None
+    text = text.strip()
+    if text.upper() in FREQS:
+        return Rule(text.upper(), 1, None, None, (), ())
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+
+    parts = {}
+    for item in text.split(';'):
+        if '=' in item:
+            key, value = item.split('=', 1)
+            parts[key.strip().upper()] = value.strip().upper()
+    freq = parts.get('FREQ')
+    if freq not in FREQS:
+        return None
+
+    try:
+        byday = []
+        for day in filter(None, parts.get('BYDAY', '').split(',')):
+            match = _BYDAY_RE.match(day)
+            if match:
+                ordinal = int(match.group(1)) if match.group(1) else 0
+                byday.append((ordinal, WEEKDAYS.index(match.group(2))))
+        return Rule(
+            freq=freq,
+            interval=max(int(parts.get('INTERVAL', 1)), 1),
+            count=int(parts['COUNT']) if 'COUNT' in parts else None,
+            until=_parse_ical_time(parts['UNTIL']) if 'UNTIL' in parts else None,
+            byday=tuple(byday),
+            bymonthday=tuple(int(d) for d in parts.get('BYMONTHDAY', '').split(',') if d),
+        )
+    except ValueError:
+        return None
+
+
+def to_rrule(rule):
+    # 把 Rule 还原成 RRULE 值（不含 "RRULE:" 前缀），供 ICS 导出使用
+    parts = [f'FREQ={rule.freq}']
+    if rule.interval != 1:
+        parts.append(f'INTERVAL={rule.interval}')
+    if rule.count is not None:
+        parts.append(f'COUNT={rule.count}')
+    if rule.until is not None:
+        parts.append(f"UNTIL={rule.until.strftime('%Y%m%dT%H%M%S')}")
+    if rule.byday:
+        parts.append('BYDAY=' + ','.join(
+            f'{ordinal or ""}{WEEKDAYS[weekday]}' for ordinal, weekday in rule.byday
+        ))
+    if rule.bymonthday:
+        parts.append('BYMONTHDAY=' + ','.join(str(d) for d in rule.bymonthday))
+    return ';'.join(parts)
+
+
+def parse_exdates(text):
+    # exdates 列以逗号分隔保存 '%Y-%m-%d %H:%M:%S'
+    result = set()
+    for value in (text or '').split(','):
+        value = value.strip()
+        if value:
+            try:
+                result.add(datetime.fromisoformat(value))
+            except ValueError:
+                pass
+    return result
+
+
+def format_exdates(dates):
+    return ','.join(sorted(d.strftime('%Y-%m-%d %H:%M:%S') for d in dates))
+
+
+def _add_months(year, month, months):
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def _period_candidates(rule, dtstart, k):
+    # 第 k 个周期内的候选时间，按时间升序返回
+    at = dtstart.time()
+    if rule.freq == 'DAILY':
+        return [dtstart + timedelta(days=k * rule.interval)]
+
+    if rule.freq == 'WEEKLY':
+        week = dtstart.date() - timedelta(days=dtstart.weekday()) + timedelta(weeks=k * rule.interval)
+        weekdays = sorted({weekday for _, weekday in rule.byday}) or [dtstart.weekday()]
+        return [datetime.combine(week + timedelta(days=w), at) for w in weekdays]
+
+    if rule.freq == 'MONTHLY':
+        year, month = _add_months(dtstart.year, dtstart.month, k * rule.interval)
+        days_in_month = calendar.monthrange(year, month)[1]
+        days = set()
+        for day in rule.bymonthday or (() if rule.byday else (dtstart.day,)):
+            day = day if day > 0 else days_in_month + day + 1
+            if 1 <= day <= days_in_month:  # 31 号这类在小月不存在的日期直接跳过
+                days.add(day)
+        for ordinal, weekday in rule.byday:
+            matches = [d for d in range(1, days_in_month + 1)
+                       if calendar.weekday(year, month, d) == weekday]
+            if ordinal == 0:
+                days.update(matches)
+            elif -len(matches) <= ordinal <= len(matches) and ordinal != 0:
+                days.add(matches[ordinal - 1] if ordinal > 0 else matches[ordinal])
+        return [datetime.combine(datetime(year, month, d).date(), at) for d in sorted(days)]
+
+    # YEARLY：同月同日，2 月 29 日在平年跳过
+    year = dtstart.year + k * rule.interval
+    if dtstart.month == 2 and dtstart.day == 29 and not calendar.isleap(year):
+        return []
+    return [dtstart.replace(year=year)]
+
+
+def _first_period(rule, dtstart, window_start):
+    # 有 COUNT 时必须从头计数；否则直接跳到窗口开始所在的周期
+    if rule.count is not None or window_start <= dtstart:
+        return 0
+    if rule.freq == 'DAILY':
+        return (window_start - dtstart).days // rule.interval
+    if rule.freq == 'WEEKLY':
+        week0 = dtstart.date() - timedelta(days=dtstart.weekday())
+        return (window_start.date() - week0).days // (7 * rule.interval)
+    if rule.freq == 'MONTHLY':
+        months = (window_start.year - dtstart.year) * 12 + window_start.month - dtstart.month
+        return months // rule.interval
+    return (window_start.year - dtstart.year) // rule.interval
+
+
+def occurrences(dtstart, rule, window_start, window_end, exdates=()):
+    # 生成器：依次产出 [window_start, window_end) 内的发生时间
+    if rule is None:
+        if window_start <= dtstart < window_end and dtstart not in exdates:
+            yield dtstart
+        return
+
+    emitted = 0
+    k = _first_period(rule, dtstart, window_start)
+    while True:
+        candidates = _period_candidates(rule, dtstart, k)
+        # 周期起点超出窗口或 UNTIL 后即可停止
+        period_start = candidates[0] if candidates else None
+        if period_start is not None:
+            if period_start >= window_end or (rule.until and period_start > rule.until):
+                return
+        elif _period_floor(rule, dtstart, k) >= window_end:
+            return
+        for candidate in candidates:
+            if candidate < dtstart:
+                continue
+            if rule.until and candidate > rule.until:
+                return
+            emitted += 1
+            if rule.count is not None and emitted > rule.count:
+                return
+            if candidate >= window_end:
+                return
+            if candidate >= window_start and candidate not in exdates:
+                yield candidate
+        k += 1
+
+
+def _period_floor(rule, dtstart, k):
+    # 某个周期没有任何候选日期时，用周期的起始日判断是否已越过窗口
+    if rule.freq == 'MONTHLY':
+        year, month = _add_months(dtstart.year, dtstart.month, k * rule.interval)
+        return datetime(year, month, 1)
+    return datetime(dtstart.year + k * rule.interval, 1, 1)
+
+
+def next_occurrence(dtstart, rule, after, exdates=(), horizon=timedelta(days=366 * 5)):
+    # after 之后的第一次发生时间；horizon 内没有则认为规则已结束
+    for occurrence in occurrences(dtstart, rule, after + timedelta(seconds=1), after + horizon, exdates):
+        return occurrence
+    return None
+
+
+class OccurrenceCache:
+    # - 按 (event_id, 窗口) 缓存展开结果的 LRU，更新/删除日程时按 event_id 失效。
+    # - 键中带上规则签名，即便漏掉失效也不会返回过期数据。
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._keys_by_event = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, event_id, signature, window_start, window_end, expand):
+        # expand 为无参函数，仅在未命中时调用并返回该窗口内的发生时间
+        key = (event_id, signature, window_start, window_end)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        result = tuple(expand())
+        with self._lock:
+            self._entries[key] = result
+            self._keys_by_event.setdefault(event_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, _ = self._entries.popitem(last=False)
+                keys = self._keys_by_event.get(old_key[0])
+                if keys is not None:
+                    keys.discard(old_key)
+                    if not keys:
+                        del self._keys_by_event[old_key[0]]
+        return result
+
+    def invalidate(self, event_id):
+        with self._lock:
+            for key in self._keys_by_event.pop(event_id, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_event.clear()
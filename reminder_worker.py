@@ -0,0 +1,20 @@
+import signal
+import threading
+
+from app import create_app, start_background_services
+
+# - 独立的提醒进程：python reminder_worker.py
+# - 与 gunicorn 配合使用时设置 REMINDER_RUNNER=external，web worker 只处理请求和发送邮件；
+#   这里同样通过租约选主，可以部署多个实例做热备。
+
+if __name__ == '__main__':
+    create_app()
+    leader = start_background_services(elect_leader=True)
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopped.set())
+    print("✓ 提醒进程已启动")
+    stopped.wait()
+    # 主动释放租约，热备进程不必等租约过期就能接管
+    leader.stop()
+    leader.lease.release()
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+from recurrence import next_occurrence, parse_exdates, parse_rule
+
+# - 提醒提前量：每个日程可以有多个提醒（reminders 表，每行一个“开始前多少分钟”），
+#   新日程默认使用用户的 reminder_offsets 设置。
+# - fire_at 是预先算好的下一次提醒时间（epoch 秒，已送完为 NULL），带部分索引，
+#   调度器只需按 fire_at 做索引范围扫描。
+# - 日程写入时触发器只用纯 SQL 把受影响的提醒标记为 stale（不依赖自定义函数，sqlite3 命令行和
+#   维护脚本也能写 events）；fire_at 由 refresh() 在 Python 里计算，应用的写入路径在提交前调用，
+#   调度器载入时再补算其他连接留下的 stale 提醒。
+# - 与原来只在开始时间提醒的行为一致：一次性日程的提醒时间即使已过也会补发一次，
+#   重复日程从第一次发生开始算，错过的多次发生只补发最近一次。
+
+FIRE_AT_FUNCTION = 'reminder_fire_at'
+MAX_REMINDERS = 5
+MAX_OFFSET_MINUTES = 28 * 24 * 60
+DEFAULT_OFFSETS = (0,)
+
+
+def parse_offsets(value):
+    # "0, 15, 1440" 或 [0, 15, 1440] -> 去重排序后的分钟数列表；格式错误抛 ValueError
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [item for item in value.replace('，', ',').split(',') if item.strip()]
+    if not isinstance(value, (list, tuple)):
+        raise ValueError('提醒时间格式错误')
+    offsets = set()
+    for item in value:
+        if isinstance(item, bool) or not isinstance(item, (int, str)):
+            raise ValueError('提醒时间必须是分钟数')
+        try:
+            minutes = int(item)
+        except ValueError:
+            raise ValueError(f'无法识别的提醒时间: {item}')
+        if not 0 <= minutes <= MAX_OFFSET_MINUTES:
+            raise ValueError(f'提醒时间必须在 0 到 {MAX_OFFSET_MINUTES} 分钟之间')
+        offsets.add(minutes)
+    if len(offsets) > MAX_REMINDERS:
+        raise ValueError(f'每个日程最多 {MAX_REMINDERS} 个提醒')
+    return sorted(offsets)
+
+
+def format_offsets(offsets):
+    return ','.join(str(minutes) for minutes in offsets)
+
+
+def describe_offset(minutes):
+    if minutes == 0:
+        return '开始时'
+    if minutes % 1440 == 0:
+        return f'提前 {minutes // 1440} 天'
+    if minutes % 60 == 0:
+        return f'提前 {minutes // 60} 小时'
+    return f'提前 {minutes} 分钟'
+
+
+def fire_at(start_time, repeat_rule, exdates, offset_minutes, after_ts=None):
+    # 第一次“提醒时间晚于 after_ts”的发生对应的提醒时间；after_ts 为 NULL 时从第一次发生算起。
+    # 没有下一次（一次性日程已提醒、规则已结束或时间无法解析）返回 None
+    try:
+        dtstart = datetime.fromisoformat(start_time)
+    except (TypeError, ValueError):
+        return None
+    offset = timedelta(minutes=offset_minutes or 0)
+    if after_ts is None:
+        after = dtstart - timedelta(seconds=1)
+    else:
+        after = datetime.fromtimestamp(after_ts) + offset
+    occurrence = next_occurrence(dtstart, parse_rule(repeat_rule), after, parse_exdates(exdates))
+    if occurrence is None:
+        return None
+    return int((occurrence - offset).timestamp())
+
+
+def refresh(conn):
+    # 计算所有 stale 提醒的 fire_at（事务由调用方负责），返回处理的条数
+    rows = conn.execute('''
+        SELECT r.id, r.offset_minutes, e.start_time, e.repeat_rule, e.exdates
+        FROM reminders r JOIN events e ON e.id = r.event_id
+        WHERE r.stale = 1
+    ''').fetchall()
+    if rows:
+        conn.executemany('UPDATE reminders SET fire_at = ?, stale = 0 WHERE id = ?', [
+            (fire_at(row[2], row[3], row[4], row[1]), row[0]) for row in rows
+        ])
+    return len(rows)
+
+
+def register_functions(conn):
+    # 只有迁移 12（回填和最初版本的触发器）用到 reminder_fire_at；迁移 17 之后的触发器不再调用
+    conn.create_function(FIRE_AT_FUNCTION, 5, fire_at, deterministic=True)
@@ -0,0 +1,100 @@
+import os
+import socket
+import threading
+import time
+
+# - 多进程部署（gunicorn 多 worker 或独立的提醒进程）下的后台服务协调。
+# - LeaderLease：数据库里的租约，同一时刻只有持有者运行提醒调度器，持有者崩溃后租约过期由其他进程接管。
+# - ChangeWatcher：其他进程写库后 notify() 传不到本进程的调度器，
+#   这里轮询 PRAGMA data_version（其他连接提交后才会变化），发现变化就让调度器重新载入。
+# - 发件箱工作线程不需要选主：认领本身是原子的，所有进程都可以参与发送。
+
+
+class LeaderLease:
+    def __init__(self, get_db, name, ttl=30, owner=None):
+        self._get_db = get_db
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+    def acquire(self):
+        # 没有持有者、租约已过期或本来就是自己持有时成功，同时续期
+        now = time.time()
+        with self._get_db() as conn:
+            row = conn.execute('''
+                INSERT INTO leader_leases (name, owner, expires_ts) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_ts = excluded.expires_ts
+                WHERE leader_leases.owner = excluded.owner OR leader_leases.expires_ts < ?
+                RETURNING owner
+            ''', (self.name, self.owner, now + self.ttl, now)).fetchone()
+        return row is not None
+
+    def release(self):
+        with self._get_db() as conn:
+            conn.execute('DELETE FROM leader_leases WHERE name = ? AND owner = ?', (self.name, self.owner))
+
+
+class ChangeWatcher:
+    def __init__(self, connect, on_change, interval=1.0):
+        # connect()：返回一个专用连接；on_change()：其他连接提交过写入后调用
+        self._connect = connect
+        self._on_change = on_change
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        conn = self._connect()
+        try:
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            while not self._stopped.wait(self.interval):
+                current = conn.execute('PRAGMA data_version').fetchone()[0]
+                if current != version:
+                    version = current
+                    self._on_change()
+        finally:
+            conn.close()
+
+    def stop(self):
+        self._stopped.set()
+
+
+class LeaderRunner:
+    # 竞选成功后在后台线程里运行 target（阻塞函数），续期失败时调用 stop 让出
+    def __init__(self, lease, target, stop, renew_interval=None):
+        self.lease = lease
+        self._target = target
+        self._stop_target = stop
+        self.renew_interval = renew_interval or lease.ttl / 3
+        self._stopped = threading.Event()
+        self.is_leader = False
+
+    def _lead(self):
+        thread = threading.Thread(target=self._target, name=f'{self.lease.name}-leader', daemon=True)
+        thread.start()
+        self.is_leader = True
+        print(f"✓ {self.lease.owner} 成为 {self.lease.name} 的执行者")
+        try:
+            while not self._stopped.wait(self.renew_interval):
+                if not self.lease.acquire():
+                    print(f"✗ {self.lease.owner} 失去了 {self.lease.name} 的租约")
+                    break
+        finally:
+            self.is_leader = False
+            self._stop_target()
+            thread.join()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.lease.acquire():
+                    self._lead()
+            except Exception as e:
+                print(f"选主错误: {str(e)}")
+            self._stopped.wait(self.renew_interval)
+        try:
+            self.lease.release()
+        except Exception as e:
+            print(f"释放租约失败: {str(e)}")
+
+    def stop(self):
+        self._stopped.set()
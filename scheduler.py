@@ -0,0 +1,158 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+from metrics import REMINDER_LAG
+
+# - 提醒调度器：只把最近的 N 条待提醒记录放进最小堆，线程一直睡到最早的截止时间。
+# - 日程新增/修改时通过 notify() 把新的截止时间推入堆并提前唤醒；
+#   删除或改期留下的旧条目在触发时由 fire 回调回库核对后丢弃。
+# - 每次触发都记录“计划时间 -> 实际时间”的延迟，用于观察调度精度。
+
+
+class LagStats:
+    def __init__(self, window=10000):
+        self._lags = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, lag):
+        with self._lock:
+            self._lags.append(lag)
+            self.count += 1
+            self.max = max(self.max, lag)
+
+    def summary(self):
+        with self._lock:
+            lags = sorted(self._lags)
+        if not lags:
+            return {"count": self.count, "max": self.max}
+
+        def percentile(p):
+            return lags[min(int(len(lags) * p), len(lags) - 1)]
+
+        return {
+            "count": self.count,
+            "mean": sum(lags) / len(lags),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": self.max,
+        }
+
+
+class ReminderScheduler:
+    def __init__(self, load, fire, batch_size=1000, idle_interval=300):
+        # load(limit) -> [(fire_ts, reminder_id), ...]：按时间升序返回最近的待提醒记录
+        # fire([(fire_ts, reminder_id), ...]) -> [(next_fire_ts, reminder_id), ...]：发送提醒，
+        #   返回需要再次排队的条目（如重复日程的下一次发生）
+        self._load = load
+        self._fire = fire
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.lag = LagStats()
+
+        self._heap = []
+        self._horizon = None  # 已载入的最晚时间，None 表示全部待提醒记录都在堆里
+        self._loaded = False
+        self._dirty = False
+        self._stopped = False
+        self._next_reload = 0
+        self._cond = threading.Condition()
+
+    # ---------- 供请求线程调用 ----------
+    def notify(self, reminder_id, fire_ts):
+        if fire_ts is None:
+            return
+        with self._cond:
+            if not self._loaded:
+                return
+            # 超出已载入范围的条目留给下一次 reload
+            if self._horizon is None or fire_ts <= self._horizon:
+                heapq.heappush(self._heap, (fire_ts, reminder_id))
+                self._cond.notify()
+
+    def cancel(self, reminder_id):
+        with self._cond:
+            heap = [entry for entry in self._heap if entry[1] != reminder_id]
+            if len(heap) != len(self._heap):
+                heapq.heapify(heap)
+                self._heap = heap
+                self._cond.notify()
+
+    def request_reload(self):
+        # 批量变更（如导入 ICS）后直接从数据库重新载入
+        with self._cond:
+            self._dirty = True
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._heap)
+            next_due = self._heap[0][0] if self._heap else None
+        return {"pending": pending, "next_due": next_due, "lag_seconds": self.lag.summary()}
+
+    # ---------- 调度线程 ----------
+    def reload(self):
+        entries = self._load(self.batch_size)
+        with self._cond:
+            self._heap = list(entries)
+            heapq.heapify(self._heap)
+            self._horizon = max(entry[0] for entry in entries) if len(entries) >= self.batch_size else None
+            self._loaded = True
+            self._dirty = False
+            self._next_reload = time.time() + self.idle_interval
+
+    def _needs_reload(self, now):
+        return (self._dirty or now >= self._next_reload
+                or (not self._heap and self._horizon is not None))
+
+    def _wait_for_due(self):
+        # 睡到最早的截止时间；被 notify 唤醒后重新计算
+        with self._cond:
+            while not self._stopped:
+                now = time.time()
+                if self._needs_reload(now):
+                    return None
+                if self._heap and self._heap[0][0] <= now:
+                    due = []
+                    while self._heap and self._heap[0][0] <= now:
+                        due.append(heapq.heappop(self._heap))
+                    return due
+                deadline = self._heap[0][0] if self._heap else self._next_reload
+                self._cond.wait(max(min(deadline, self._next_reload) - now, 0))
+            return None
+
+    def run_once(self):
+        due = self._wait_for_due()
+        if due is None:
+            if not self._stopped:
+                self.reload()
+            return
+        fired_at = time.time()
+        for fire_ts, _ in due:
+            self.lag.record(fired_at - fire_ts)
+            REMINDER_LAG.observe(fired_at - fire_ts)
+        for fire_ts, reminder_id in self._fire(due) or ():
+            self.notify(reminder_id, fire_ts)
+
+    def run_forever(self):
+        self.reload()
+        while not self._stopped:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"提醒系统错误: {str(e)}")
+                time.sleep(1)
+        # 停止后可以再次 run_forever（如重新当选）；堆里的条目已过时，下次启动时重新载入
+        with self._cond:
+            self._stopped = False
+            self._loaded = False
+            self._heap = []
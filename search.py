@@ -0,0 +1,174 @@
+import re
+
+# - 全文检索：events_fts 是一张 FTS5 无内容表（contentless），只保存倒排索引，
+#   日程内容仍以 events 表为准。
+# - 触发器只用纯 SQL 把增删改写进 fts_queue（原文），不依赖自定义函数，sqlite3 命令行和维护脚本
+#   也能写 events；flush_queue() 在 Python 里分词后按顺序写入索引，应用的写入路径在提交前调用，
+#   搜索前再补上其他连接留下的队列。
+# - 中文没有空格分词，写入索引前把连续的中日韩字符切成二元组（“项目汇报” -> “项目 目汇 汇报 报”），
+#   查询时把词同样切开组成短语，相邻位置匹配即等价于子串匹配；末尾的单字支持单字查询。
+# - 英文等其余文字交给 unicode61 分词，查询词按前缀匹配；单字前缀有专门的前缀索引。
+# - 每行额外写入 owner 列（如 "u42"），按用户过滤也走倒排索引，不必先取出所有用户的匹配。
+
+CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+WORD_RE = re.compile(r'\w+')
+
+SEGMENT_FUNCTION = 'fts_segment'
+
+
+def _bigrams(run):
+    if len(run) == 1:
+        return run
+    return ' '.join([run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]])
+
+
+def segment(text):
+    # 索引用：中日韩字符切成二元组，其余原样保留
+    if not text:
+        return ''
+    return CJK_RE.sub(lambda m: f' {_bigrams(m.group())} ', text)
+
+
+def owner_token(user_id):
+    return f'u{user_id}'
+
+
+def register_functions(conn):
+    # 只有迁移 8 创建的最初版本触发器调用 fts_segment；迁移 18 之后的触发器不再需要
+    conn.create_function(SEGMENT_FUNCTION, 1, segment, deterministic=True)
+
+
+def build_query(text):
+    # 把用户输入转换成 FTS5 查询；没有可检索的词时返回 None
+    terms = []
+    for word in text.split():
+        pos = 0
+        for match in CJK_RE.finditer(word):
+            terms.extend(f'"{w}"*' for w in WORD_RE.findall(word[pos:match.start()]))
+            run = match.group()
+            if len(run) == 1:
+                terms.append(f'"{run}"*')
+            else:
+                terms.append('"' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+            pos = match.end()
+        terms.extend(f'"{w}"*' for w in WORD_RE.findall(word[pos:]))
+    if not terms:
+        return None
+    return ' AND '.join(terms)
+
+
+# 与 FTS 列对应的相关度权重：标题 > 分类 > 备注
+WEIGHTS = (('title', 10), ('category', 2), ('notes', 1))
+
+
+def relevance(event, words):
+    # 各查询词在各列中出现的次数按列加权求和
+    score = 0
+    for column, weight in WEIGHTS:
+        text = (event.get(column) or '').casefold()
+        if text:
+            score += weight * sum(text.count(word.casefold()) for word in words)
+    return score
+
+
+def create_index(conn):
+    conn.executescript(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+            title, notes, category, owner,
+            content='',
+            prefix='1',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS trg_events_fts_insert AFTER INSERT ON events
+        BEGIN
+            INSERT INTO events_fts (rowid, title, notes, category, owner)
+            VALUES (NEW.id, {SEGMENT_FUNCTION}(NEW.title), {SEGMENT_FUNCTION}(NEW.notes),
+                    {SEGMENT_FUNCTION}(NEW.category), 'u' || NEW.user_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_events_fts_update AFTER UPDATE OF title, notes, category ON events
+        BEGIN
+            INSERT INTO events_fts (events_fts, rowid, title, notes, category, owner)
+            VALUES ('delete', OLD.id, {SEGMENT_FUNCTION}(OLD.title), {SEGMENT_FUNCTION}(OLD.notes),
+                    {SEGMENT_FUNCTION}(OLD.category), 'u' || OLD.user_id);
+            INSERT INTO events_fts (rowid, title, notes, category, owner)
+            VALUES (NEW.id, {SEGMENT_FUNCTION}(NEW.title), {SEGMENT_FUNCTION}(NEW.notes),
+                    {SEGMENT_FUNCTION}(NEW.category), 'u' || NEW.user_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_events_fts_delete AFTER DELETE ON events
+        BEGIN
+            INSERT INTO events_fts (events_fts, rowid, title, notes, category, owner)
+            VALUES ('delete', OLD.id, {SEGMENT_FUNCTION}(OLD.title), {SEGMENT_FUNCTION}(OLD.notes),
+                    {SEGMENT_FUNCTION}(OLD.category), 'u' || OLD.user_id);
+        END;
+    ''')
+
+
+def create_queue(conn):
+    # command 为 NULL 表示写入索引，'delete' 表示按原文删除（无内容表删除时必须提供当初写入的词）
+    conn.executescript('''
+        BEGIN;
+        CREATE TABLE IF NOT EXISTS fts_queue (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            command TEXT,
+            event_id INTEGER NOT NULL,
+            user_id INTEGER,
+            title TEXT,
+            notes TEXT,
+            category TEXT
+        );
+        DROP TRIGGER IF EXISTS trg_events_fts_insert;
+        DROP TRIGGER IF EXISTS trg_events_fts_update;
+        DROP TRIGGER IF EXISTS trg_events_fts_delete;
+        CREATE TRIGGER trg_events_fts_insert AFTER INSERT ON events
+        BEGIN
+            INSERT INTO fts_queue (command, event_id, user_id, title, notes, category)
+            VALUES (NULL, NEW.id, NEW.user_id, NEW.title, NEW.notes, NEW.category);
+        END;
+        CREATE TRIGGER trg_events_fts_update AFTER UPDATE OF title, notes, category ON events
+        BEGIN
+            INSERT INTO fts_queue (command, event_id, user_id, title, notes, category)
+            VALUES ('delete', OLD.id, OLD.user_id, OLD.title, OLD.notes, OLD.category),
+                   (NULL, NEW.id, NEW.user_id, NEW.title, NEW.notes, NEW.category);
+        END;
+        CREATE TRIGGER trg_events_fts_delete AFTER DELETE ON events
+        BEGIN
+            INSERT INTO fts_queue (command, event_id, user_id, title, notes, category)
+            VALUES ('delete', OLD.id, OLD.user_id, OLD.title, OLD.notes, OLD.category);
+        END;
+        COMMIT;
+    ''')
+
+
+def flush_queue(conn):
+    # 把 fts_queue 按顺序分词写入索引并清空（事务由调用方负责），返回处理的条数
+    rows = conn.execute(
+        'SELECT seq, command, event_id, user_id, title, notes, category FROM fts_queue ORDER BY seq'
+    ).fetchall()
+    if not rows:
+        return 0
+    conn.executemany(
+        'INSERT INTO events_fts (events_fts, rowid, title, notes, category, owner) VALUES (?, ?, ?, ?, ?, ?)',
+        [(row[1], row[2], segment(row[4]), segment(row[5]), segment(row[6]), owner_token(row[3]))
+         for row in rows]
+    )
+    conn.execute('DELETE FROM fts_queue WHERE seq <= ?', (rows[-1][0],))
+    return len(rows)
+
+
+def rebuild_index(conn, batch=1000):
+    # 清空后按 id 分批重建，用于首次迁移或索引与 events 不一致时
+    conn.execute("INSERT INTO events_fts (events_fts) VALUES ('delete-all')")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, user_id, title, notes, category FROM events WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, batch)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            'INSERT INTO events_fts (rowid, title, notes, category, owner) VALUES (?, ?, ?, ?, ?)',
+            [(row[0], segment(row[2]), segment(row[3]), segment(row[4]), owner_token(row[1]))
+             for row in rows]
+        )
+        last_id = rows[-1][0]
@@ -0,0 +1,128 @@
+# - 日程统计汇总表：按 (用户, 日期, 分类) 保存日程数和总时长（秒），
+#   /api/stats 只读汇总表，不再对 events 全表 GROUP BY。
+# - 汇总由 events 上的触发器增量维护，所有写入路径（表单、批量接口、ICS 导入等）都会自动同步。
+# - 日期取开始时间的本地日期；重复日程只按第一次发生计入；时长为 end_ts - start_ts，没有结束时间记 0。
+
+DAY_SQL = "date({row}.start_ts, 'unixepoch', 'localtime')"
+CATEGORY_SQL = "COALESCE(NULLIF({row}.category, ''), 'other')"
+DURATION_SQL = "MAX(COALESCE({row}.end_ts - {row}.start_ts, 0), 0)"
+
+
+def _key(row):
+    return DAY_SQL.format(row=row), CATEGORY_SQL.format(row=row), DURATION_SQL.format(row=row)
+
+
+def _add(row):
+    day, category, duration = _key(row)
+    return f'''
+        INSERT INTO event_stats (user_id, day, category, count, duration)
+        SELECT {row}.user_id, {day}, {category}, 1, {duration} WHERE {row}.start_ts IS NOT NULL
+        ON CONFLICT (user_id, day, category) DO UPDATE SET
+            count = count + 1, duration = duration + excluded.duration;
+    '''
+
+
+def _remove(row):
+    day, category, duration = _key(row)
+    return f'''
+        UPDATE event_stats SET count = count - 1, duration = duration - {duration}
+        WHERE {row}.start_ts IS NOT NULL
+        AND user_id = {row}.user_id AND day = {day} AND category = {category};
+        DELETE FROM event_stats
+        WHERE user_id = {row}.user_id AND day = {day} AND category = {category} AND count <= 0;
+    '''
+
+
+def create_rollups(conn):
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS event_stats (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            category TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            duration INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, category)
+        ) WITHOUT ROWID;
+        CREATE TRIGGER IF NOT EXISTS trg_event_stats_insert AFTER INSERT ON events
+        BEGIN
+            {_add('NEW')}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_event_stats_update
+        AFTER UPDATE OF user_id, start_ts, end_ts, category ON events
+        BEGIN
+            {_remove('OLD')}
+            {_add('NEW')}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_event_stats_delete AFTER DELETE ON events
+        BEGIN
+            {_remove('OLD')}
+        END;
+    ''')
+
+
+AGGREGATE_SQL = f'''
+    SELECT user_id, {DAY_SQL.format(row='events')} AS day, {CATEGORY_SQL.format(row='events')} AS category,
+           COUNT(*) AS count, SUM({DURATION_SQL.format(row='events')}) AS duration
+    FROM {{table}} AS events WHERE start_ts IS NOT NULL {{where}}
+    GROUP BY user_id, day, category
+'''
+
+
+def rebuild(conn, user_id=None, table='events'):
+    # 从 table 重新计算汇总（全部用户或单个用户），用于回填或修复；有归档时传 all_events 视图
+    where, params = ('AND user_id = ?', (user_id,)) if user_id is not None else ('', ())
+    with conn:
+        if user_id is None:
+            conn.execute('DELETE FROM event_stats')
+        else:
+            conn.execute('DELETE FROM event_stats WHERE user_id = ?', (user_id,))
+        conn.execute(
+            f'INSERT INTO event_stats (user_id, day, category, count, duration) {AGGREGATE_SQL.format(table=table, where=where)}',
+            params
+        )
+
+
+def check(conn, user_id=None, table='events'):
+    # 对比汇总表与 table 实时聚合的结果，返回不一致的 (user_id, day, category, 汇总值, 实际值)
+    where, params = ('AND user_id = ?', (user_id,)) if user_id is not None else ('', ())
+    actual = {
+        (row[0], row[1], row[2]): (row[3], row[4])
+        for row in conn.execute(AGGREGATE_SQL.format(table=table, where=where), params)
+    }
+    stored_sql = 'SELECT user_id, day, category, count, duration FROM event_stats'
+    if user_id is not None:
+        stored_sql += ' WHERE user_id = ?'
+    stored = {(row[0], row[1], row[2]): (row[3], row[4]) for row in conn.execute(stored_sql, params)}
+    return [
+        (*key, stored.get(key), actual.get(key))
+        for key in sorted(set(actual) | set(stored))
+        if stored.get(key) != actual.get(key)
+    ]
+
+
+def summarize(conn, user_id, start_day, end_day, bucket='day'):
+    # [start_day, end_day) 内按分类和时间桶（day 或 month）汇总
+    bucket_sql = 'day' if bucket == 'day' else 'substr(day, 1, 7)'
+    categories = {
+        row[0]: {"count": row[1], "duration": row[2]}
+        for row in conn.execute('''
+            SELECT category, SUM(count), SUM(duration) FROM event_stats
+            WHERE user_id = ? AND day >= ? AND day < ?
+            GROUP BY category ORDER BY category
+        ''', (user_id, start_day, end_day))
+    }
+    buckets = {}
+    for row in conn.execute(f'''
+        SELECT {bucket_sql} AS bucket, category, SUM(count), SUM(duration) FROM event_stats
+        WHERE user_id = ? AND day >= ? AND day < ?
+        GROUP BY bucket, category ORDER BY bucket
+    ''', (user_id, start_day, end_day)):
+        buckets.setdefault(row[0], {})[row[1]] = {"count": row[2], "duration": row[3]}
+    return {
+        "total": {
+            "count": sum(c["count"] for c in categories.values()),
+            "duration": sum(c["duration"] for c in categories.values()),
+        },
+        "categories": categories,
+        "buckets": [{"bucket": key, "categories": value} for key, value in buckets.items()],
+    }
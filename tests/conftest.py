@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+# - 测试直接导入仓库根目录下的模块，以及 benchmarks/ 里的本地替身（OpenAI、SMTP）。
+# - 每个测试使用 tmp_path 下的新数据库，不会碰到 users.db。
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+
+@pytest.fixture
+def database(tmp_path):
+    # 已执行全部迁移的数据库文件路径
+    from db import ConnectionPool, migrate
+
+    path = str(tmp_path / 'test.db')
+    pool = ConnectionPool(path, size=0)
+    conn = pool.acquire()
+    migrate(conn)
+    pool.release(conn)
+    return path
+
+
+@pytest.fixture
+def db_conn(database):
+    from db import ConnectionPool
+
+    pool = ConnectionPool(database, size=0)
+    conn = pool.acquire()
+    yield conn
+    pool.release(conn)
+
+
+@pytest.fixture
+def chimeo(tmp_path, monkeypatch):
+    # 应用模块，数据库换成临时文件；密码哈希用低成本参数，进程内缓存清空
+    import app as chimeo
+    from passwords import PasswordHasher
+
+    monkeypatch.setitem(chimeo.app.config, 'DATABASE', str(tmp_path / 'app.db'))
+    monkeypatch.setattr(chimeo, 'password_hasher', PasswordHasher('pbkdf2:sha256:1000'))
+    chimeo.init_db()
+    chimeo.identity_cache.clear()
+    chimeo.interval_cache.clear()
+    chimeo.render_cache.discard(lambda key: True)
+    chimeo.export_cache.discard(lambda key: True)
+    yield chimeo
+    chimeo.close_pool()
+
+
+@pytest.fixture
+def client(chimeo):
+    # 已登录的测试客户端（用户不存在时自动注册）
+    client = chimeo.app.test_client()
+    response = client.post('/login', data={'username': 'alice', 'password': 'pw', 'email': 'alice@example.com'})
+    assert response.status_code == 302
+    return client
@@ -0,0 +1,92 @@
+import pytest
+
+
+def post(client, operations, **extra):
+    return client.post('/api/events/bulk', json={'operations': operations, **extra})
+
+
+def titles(chimeo):
+    with chimeo.app.app_context():
+        return {row['id']: row['title'] for row in chimeo.get_db().execute('SELECT id, title FROM events')}
+
+
+def create(title, start_time='2030-01-01 09:00:00', **fields):
+    return {'op': 'create', 'event': {'title': title, 'start_time': start_time, **fields}}
+
+
+@pytest.mark.parametrize('operations, errors', [
+    ([], [{'index': None, 'error': 'operations 不能为空'}]),
+    ('create', [{'index': None, 'error': 'operations 不能为空'}]),
+    ([{'op': 'move'}], [{'index': 0, 'error': 'op 必须是 create/update/delete'}]),
+    ([{'op': 'delete'}, {'op': 'update', 'id': True, 'event': {}}],
+     [{'index': 0, 'error': '缺少日程 id'}, {'index': 1, 'error': '缺少日程 id'}]),
+    ([create('a', color='red')], [{'index': 0, 'error': '未知字段: color'}]),
+    ([create('  ')], [{'index': 0, 'error': '标题不能为空'}]),
+    ([create('a', start_time='明天')], [{'index': 0, 'error': '开始时间格式错误'}]),
+    ([create('a', end_time='later')], [{'index': 0, 'error': '结束时间格式错误'}]),
+    ([{'op': 'create', 'event': {'title': 'a'}}], [{'index': 0, 'error': '开始时间不能为空'}]),
+    ([{'op': 'update', 'id': 1, 'event': {'notes': 3}}], [{'index': 0, 'error': 'notes 必须是字符串'}]),
+])
+def test_validation_errors(chimeo, client, operations, errors):
+    response = post(client, operations)
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': '参数错误', 'errors': errors}
+
+
+def test_invalid_operation_rejects_whole_batch(chimeo, client):
+    response = post(client, [create('a'), create('b'), {'op': 'create', 'event': {}}])
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['errors']] == [2]
+    assert titles(chimeo) == {}
+
+    response = post(client, [create(str(i)) for i in range(chimeo.BULK_MAX_OPERATIONS + 1)])
+    assert response.status_code == 400
+    assert titles(chimeo) == {}
+
+
+def test_created_ids_map_to_their_events(chimeo, client):
+    # 已有日程和其他用户的日程穿插在 id 序列里
+    post(client, [create('已有')])
+    other = chimeo.app.test_client()
+    other.post('/login', data={'username': 'bob', 'password': 'pw', 'email': 'bob@example.com'})
+    post(other, [create('bob 的日程')])
+
+    response = post(client, [create('甲'), {'op': 'delete', 'id': 1}, create('乙'), create('丙')])
+    results = response.get_json()['results']
+    assert [(r['index'], r['op'], r['status']) for r in results] == [
+        (0, 'create', 'ok'), (1, 'delete', 'ok'), (2, 'create', 'ok'), (3, 'create', 'ok')]
+    stored = titles(chimeo)
+    assert [stored[results[i]['id']] for i in (0, 2, 3)] == ['甲', '乙', '丙']
+    assert 1 not in stored
+
+
+def test_spread_assigns_times_in_order(chimeo, client):
+    response = post(client, [{'op': 'create', 'event': {'title': f'步骤{i}'}} for i in range(3)],
+                    spread={'start': '2030-01-01 09:00:00', 'end': '2030-01-01 12:00:00'})
+    ids = [result['id'] for result in response.get_json()['results']]
+    with chimeo.app.app_context():
+        rows = {row['id']: (row['title'], row['start_time'], row['end_time']) for row in chimeo.get_db().execute(
+            'SELECT id, title, start_time, end_time FROM events')}
+    assert [rows[event_id] for event_id in ids] == [
+        ('步骤0', '2030-01-01 09:00:00', '2030-01-01 10:00:00'),
+        ('步骤1', '2030-01-01 10:00:00', '2030-01-01 11:00:00'),
+        ('步骤2', '2030-01-01 11:00:00', '2030-01-01 12:00:00'),
+    ]
+
+
+def test_missing_and_foreign_ids_are_not_found(chimeo, client):
+    [mine] = [r['id'] for r in post(client, [create('我的')]).get_json()['results']]
+    other = chimeo.app.test_client()
+    other.post('/login', data={'username': 'bob', 'password': 'pw', 'email': 'bob@example.com'})
+    [theirs] = [r['id'] for r in post(other, [create('bob 的日程')]).get_json()['results']]
+
+    response = post(client, [
+        {'op': 'update', 'id': mine, 'event': {'title': '改过'}},
+        {'op': 'update', 'id': theirs, 'event': {'title': '越权'}},
+        {'op': 'delete', 'id': 999},
+        {'op': 'delete', 'id': theirs},
+    ])
+    assert response.status_code == 200
+    assert [(r['id'], r['status']) for r in response.get_json()['results']] == [
+        (mine, 'ok'), (theirs, 'not_found'), (999, 'not_found'), (theirs, 'not_found')]
+    assert titles(chimeo) == {mine: '改过', theirs: 'bob 的日程'}
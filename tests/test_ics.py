@@ -0,0 +1,117 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from ics_stream import ICSFormatError, iter_calendar, iter_events, parse_line, unfold
+
+
+def lines(text, encoding='utf-8'):
+    return io.BytesIO(text.replace('\n', '\r\n').encode(encoding))
+
+
+def calendar(*events):
+    return 'BEGIN:VCALENDAR\nVERSION:2.0\n' + ''.join(
+        'BEGIN:VEVENT\n' + body + 'END:VEVENT\n' for body in events
+    ) + 'END:VCALENDAR\n'
+
+
+def parse(*events, encoding='utf-8'):
+    return list(iter_events(lines(calendar(*events), encoding)))
+
+
+def test_unfold_joins_continuation_lines():
+    assert list(unfold(lines('SUMMARY:长标题\n  的后半段\n\tand more\nDTSTART:20300101T090000\n'))) == [
+        'SUMMARY:长标题 的后半段and more', 'DTSTART:20300101T090000']
+
+
+def test_parse_line_with_quoted_params():
+    assert parse_line('ATTENDEE;CN="Doe; John";DIR="ldap://x:389":mailto:j@example.com') == (
+        'ATTENDEE', {'CN': '"Doe; John"', 'DIR': '"ldap://x:389"'}, 'mailto:j@example.com')
+    assert parse_line('dtstart;TZID=Asia/Shanghai:20300101T090000') == (
+        'DTSTART', {'TZID': 'Asia/Shanghai'}, '20300101T090000')
+
+
+def test_event_fields():
+    [event] = parse(
+        'SUMMARY:周会\\, 第一次\nDTSTART;TZID=Asia/Shanghai:20300101T090000\nDTEND:20300101T100000Z\n'
+        'DESCRIPTION:第一行\\n第二行\nRRULE:FREQ=WEEKLY;BYDAY=TU\n'
+        'EXDATE:20300108T090000,20300115T090000\nEXDATE:20300122T090000\n'
+        'CATEGORIES:STUDY,work\nCATEGORIES:life\n'
+    )
+    assert event == {
+        'title': '周会, 第一次', 'start_time': '2030-01-01 09:00:00', 'end_time': '2030-01-01 10:00:00',
+        'repeat_rule': 'FREQ=WEEKLY;BYDAY=TU', 'category': 'study', 'notes': '第一行\n第二行',
+        'exdates': [datetime(2030, 1, 8, 9), datetime(2030, 1, 15, 9), datetime(2030, 1, 22, 9)],
+        'alarms': None,
+    }
+    # 转义的逗号不拆分，“work, home”不是已知分类
+    [event] = parse('SUMMARY:a\nDTSTART:20300101\nCATEGORIES:Work\\, home,study\n')
+    assert (event['start_time'], event['category']) == ('2030-01-01 00:00:00', 'other')
+    # 没有 DTSTART 的日程跳过，无法解析的跳过并继续
+    assert [e['title'] for e in parse('SUMMARY:无开始\n', 'SUMMARY:坏\nDTSTART:明天\n',
+                                      'SUMMARY:好\nDTSTART:20300101T090000\n')] == ['好']
+
+
+def test_valarm_triggers():
+    def alarm(trigger):
+        return f'BEGIN:VALARM\nACTION:DISPLAY\n{trigger}\nEND:VALARM\n'
+
+    [event] = parse(
+        'SUMMARY:a\nDTSTART:20300101T090000\nDTEND:20300101T100000\n'
+        + alarm('TRIGGER:-PT15M')
+        + alarm('TRIGGER;RELATED=END:-PT2H')           # 结束前 2 小时 = 开始前 1 小时
+        + alarm('TRIGGER;VALUE=DATE-TIME:20291231T090000Z')
+        + alarm('TRIGGER:-P1DT0H')                     # 与上一个重复
+        + alarm('TRIGGER:PT5M')                         # 开始之后，忽略
+        + 'BEGIN:X-OTHER\nTRIGGER:-PT1M\nEND:X-OTHER\n'  # 其他嵌套组件跳过
+    )
+    assert event['alarms'] == [15, 60, 1440]
+
+
+def test_gbk_fallback():
+    [event] = parse('SUMMARY:中文标题\nDTSTART:20300101T090000\n', encoding='gbk')
+    assert event['title'] == '中文标题'
+    with pytest.raises(ICSFormatError):
+        list(iter_events(io.BytesIO(b'BEGIN:VCALENDAR\r\nSUMMARY:\xff\xff\r\n')))
+
+
+def test_missing_calendar_wrapper_fails_before_any_event():
+    events = iter_events(lines('BEGIN:VEVENT\nSUMMARY:a\nDTSTART:20300101T090000\nEND:VEVENT\n'))
+    with pytest.raises(ICSFormatError):
+        next(events)
+    with pytest.raises(ICSFormatError):
+        list(iter_events(lines('')))
+
+
+def test_serialize_parse_round_trip():
+    source = {
+        'uid': '1@chimeo', 'title': '复盘; 总结, 计划\\备注' + '很长' * 40, 'start': datetime(2030, 1, 1, 9),
+        'end': datetime(2030, 1, 1, 10, 30), 'rrule': 'FREQ=WEEKLY;BYDAY=TU,TH',
+        'exdates': [datetime(2030, 1, 8, 9), datetime(2030, 1, 3, 9)], 'notes': '第一行\n第二行',
+        'category': 'work', 'alarms': [0, 45, 120, 2880],
+    }
+    text = b''.join(iter_calendar([source], chunk_size=16))
+    assert all(len(line) <= 75 for line in text.split(b'\r\n'))
+    [event] = list(iter_events(io.BytesIO(text)))
+    assert event == {
+        'title': source['title'], 'start_time': '2030-01-01 09:00:00', 'end_time': '2030-01-01 10:30:00',
+        'repeat_rule': source['rrule'], 'category': 'work', 'notes': source['notes'],
+        'exdates': sorted(source['exdates']), 'alarms': source['alarms'],
+    }
+
+
+@pytest.mark.parametrize('content', [
+    'BEGIN:VEVENT\nSUMMARY:a\nDTSTART:20300101T090000\nEND:VEVENT\n',
+    calendar('SUMMARY:a\nDTSTART:20300101T090000\n') + 'SUMMARY:\udcff\n',
+])
+def test_failed_import_writes_nothing(chimeo, client, monkeypatch, content):
+    monkeypatch.setattr(chimeo, 'IMPORT_BATCH', 1)  # 每条一批：出错前已经写过一批
+    data = content.replace('\n', '\r\n').encode('utf-8', 'surrogateescape')
+    response = client.post('/import_ics', data={'ics_file': (io.BytesIO(data), 'cal.ics')},
+                           content_type='multipart/form-data')
+    assert '导入失败' in response.get_data(as_text=True)
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        assert conn.execute('SELECT COUNT(*) FROM events').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM reminders').fetchone()[0] == 0
@@ -0,0 +1,63 @@
+import io
+import re
+import time
+
+ICS = 'BEGIN:VCALENDAR\nVERSION:2.0\n' + ''.join(
+    f'BEGIN:VEVENT\nSUMMARY:日程 {i}\nDTSTART:20300101T{i % 24:02d}0000\nEND:VEVENT\n' for i in range(50)
+) + 'END:VCALENDAR\n'
+
+
+def start_job(client):
+    response = client.post('/import_ics', data={'ics_file': (io.BytesIO(ICS.encode('utf-8')), 'cal.ics')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    return re.search(r'/api/import_jobs/(\w+)', response.get_data(as_text=True)).group(1)
+
+
+def wait_job(client, job_id):
+    for _ in range(100):
+        job = client.get(f'/api/import_jobs/{job_id}').get_json()
+        if job['status'] != 'running':
+            return job
+        time.sleep(0.05)
+    raise AssertionError('导入任务没有结束')
+
+
+def test_job_progress_visible_from_any_process(chimeo, client, monkeypatch):
+    monkeypatch.setattr(chimeo, 'IMPORT_ASYNC_BYTES', 0)
+    job_id = start_job(client)
+    # 另一个 worker：新的客户端、连接池清空，只共享会话 cookie 和数据库
+    chimeo.close_pool()
+    other = chimeo.app.test_client()
+    other.set_cookie('session', client.get_cookie('session').value)
+    job = wait_job(other, job_id)
+    assert job == {'status': 'done', 'imported': 50, 'bytes_read': job['total_bytes'],
+                   'total_bytes': job['total_bytes'], 'error': None}
+
+    stranger = chimeo.app.test_client()
+    stranger.post('/login', data={'username': 'bob', 'password': 'pw', 'email': 'bob@example.com'})
+    response = stranger.get(f'/api/import_jobs/{job_id}')
+    assert response.status_code == 404
+    assert client.get('/api/import_jobs/missing').status_code == 404
+
+
+def test_old_jobs_pruned_and_stalled_jobs_reported(chimeo, client, monkeypatch):
+    monkeypatch.setattr(chimeo, 'IMPORT_ASYNC_BYTES', 0)
+    finished = start_job(client)
+    wait_job(client, finished)
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute('UPDATE import_jobs SET updated_ts = ? WHERE id = ?',
+                     (int(time.time()) - chimeo.IMPORT_JOB_TTL - 1, finished))
+        conn.execute('''
+            INSERT INTO import_jobs (id, user_id, status, total_bytes, updated_ts)
+            VALUES ('stalled', 1, 'running', 100, ?)
+        ''', (int(time.time()) - chimeo.IMPORT_JOB_STALL - 1,))
+        conn.commit()
+
+    job = client.get('/api/import_jobs/stalled').get_json()
+    assert job['status'] == 'failed' and job['error']
+
+    # 新任务开始时删除过期的任务
+    wait_job(client, start_job(client))
+    assert client.get(f'/api/import_jobs/{finished}').status_code == 404
@@ -0,0 +1,125 @@
+import random
+from datetime import datetime
+
+from intervals import IntervalIndex
+
+
+def ts(text):
+    return int(datetime.fromisoformat(text).timestamp())
+
+
+def random_intervals(rng, count):
+    intervals = []
+    for i in range(count):
+        start = rng.randrange(0, 10000)
+        intervals.append((start, start + rng.choice([0, 1, 5, 50, 300]), i))
+    return intervals
+
+
+def test_overlapping_matches_brute_force():
+    rng = random.Random(7)
+    intervals = random_intervals(rng, 500)
+    index = IntervalIndex(intervals)
+    assert len(index) == sum(1 for start, end, _ in intervals if end > start)
+    for _ in range(200):
+        start = rng.randrange(-100, 10100)
+        end = start + rng.randrange(1, 400)
+        expected = sorted((s, e, item) for s, e, item in intervals if e > s and s < end and e > start)
+        assert sorted(index.overlapping(start, end)) == expected
+    # 首尾相接不算重叠，长度为 0 的区间不占用时间
+    index = IntervalIndex([(10, 20, 'a'), (20, 30, 'b'), (25, 25, 'empty')])
+    assert index.overlapping(20, 25) == [(20, 30, 'b')]
+    assert index.overlapping(0, 10) == []
+
+
+def test_add_rebuilds_tree_and_merges_busy():
+    index = IntervalIndex([(10, 20, 'a')])
+    index.add(30, 40, 'b')
+    index.add(20, 30, 'c')
+    index.add(50, 50, 'empty')
+    assert [item for _, _, item in index.overlapping(15, 35)] == ['a', 'c', 'b']
+    assert index.busy(0, 100) == [(10, 40)]
+    assert index.busy(15, 25) == [(15, 25)]
+
+
+def test_conflicts_match_brute_force():
+    intervals = random_intervals(random.Random(11), 300)
+    index = IntervalIndex(intervals)
+    expected = {frozenset((a[2], b[2])) for i, a in enumerate(intervals) for b in intervals[i + 1:]
+                if a[1] > a[0] and b[1] > b[0] and a[0] < b[1] and b[0] < a[1]}
+    pairs = index.conflicts()
+    assert len(pairs) == len(expected)
+    assert {frozenset(pair) for pair in pairs} == expected
+
+
+def test_free_slots_clipped_to_day_hours():
+    index = IntervalIndex([
+        (ts('2030-01-07 09:00'), ts('2030-01-07 10:00'), 'a'),
+        (ts('2030-01-07 17:30'), ts('2030-01-08 09:30'), 'overnight'),
+    ])
+    start, end = ts('2030-01-07 00:00'), ts('2030-01-09 00:00')
+    slots = index.free_slots(start, end, 30 * 60, day_hours=(8 * 60, 18 * 60))
+    assert slots == [
+        (ts('2030-01-07 08:00'), ts('2030-01-07 09:00')),
+        (ts('2030-01-07 10:00'), ts('2030-01-07 17:30')),
+        (ts('2030-01-08 09:30'), ts('2030-01-08 18:00')),
+    ]
+    assert index.free_slots(start, end, 61 * 60, day_hours=(8 * 60, 18 * 60), limit=1) == [
+        (ts('2030-01-07 10:00'), ts('2030-01-07 17:30'))]
+    # 不限制时段时跨越午夜
+    assert index.free_slots(ts('2030-01-07 17:00'), ts('2030-01-08 12:00'), 60 * 60) == [
+        (ts('2030-01-08 09:30'), ts('2030-01-08 12:00'))]
+
+
+def test_place_fills_earliest_gaps():
+    index = IntervalIndex([(ts('2030-01-07 10:00'), ts('2030-01-07 11:00'), 'a')])
+    placed = index.place(ts('2030-01-07 09:00'), ts('2030-01-08 00:00'), 45 * 60, 3, day_hours=(9 * 60, 12 * 60))
+    assert placed == [
+        (ts('2030-01-07 09:00'), ts('2030-01-07 09:45')),
+        (ts('2030-01-07 11:00'), ts('2030-01-07 11:45')),
+    ]
+
+
+def seed(client):
+    events = [
+        ('A', '2030-01-07 09:00:00', '2030-01-07 10:00:00', ''),
+        ('B', '2030-01-07 09:30:00', '2030-01-07 11:00:00', ''),
+        ('C', '2030-01-07 11:00:00', '2030-01-07 12:00:00', ''),
+        ('午休', '2030-01-01 13:00:00', '2030-01-01 14:00:00', 'FREQ=DAILY'),
+        ('E', '2030-01-08 13:30:00', '2030-01-08 15:00:00', ''),
+    ]
+    operations = [{'op': 'create', 'event': {'title': title, 'start_time': start, 'end_time': end,
+                                             'repeat_rule': rule}} for title, start, end, rule in events]
+    operations.append({'op': 'create', 'event': {'title': '全天', 'start_time': '2030-01-07 00:00:00',
+                                                 'end_time': '2030-01-08 00:00:00', 'is_all_day': True}})
+    assert client.post('/api/events/bulk', json={'operations': operations}).status_code == 200
+
+
+def test_conflicts_endpoint_expands_recurring_events(chimeo, client):
+    seed(client)
+    data = client.get('/api/conflicts', query_string={'start': '2030-01-07', 'end': '2030-01-08'}).get_json()
+    assert [[(a['title'], a['start_time']), (b['title'], b['start_time'])] for a, b in data['conflicts']] == [
+        [('A', '2030-01-07 09:00:00'), ('B', '2030-01-07 09:30:00')],
+        [('午休', '2030-01-08 13:00:00'), ('E', '2030-01-08 13:30:00')],
+    ]
+    assert data['conflicts'][1][0]['recurring'] is True
+
+    # 只给 at/until 时不受默认窗口（从今天起 30 天）影响
+    data = client.get('/api/conflicts', query_string={'at': '2030-01-09 13:45', 'until': '2030-01-09 14:30'}).get_json()
+    assert [(e['title'], e['start_time']) for e in data['events']] == [('午休', '2030-01-09 13:00:00')]
+    response = client.get('/api/conflicts', query_string={'at': '2030-01-09 13:45', 'until': '2030-01-09 13:00'})
+    assert response.status_code == 400
+
+
+def test_free_slots_endpoint(chimeo, client):
+    seed(client)
+    query = {'start': '2030-01-07', 'end': '2030-01-07', 'day_start': '08:00', 'day_end': '18:00'}
+    slots = client.get('/api/free-slots', query_string={**query, 'duration': 60}).get_json()['slots']
+    assert [(s['start_time'][11:16], s['end_time'][11:16], s['minutes']) for s in slots] == [
+        ('08:00', '09:00', 60), ('12:00', '13:00', 60), ('14:00', '18:00', 240)]
+    slots = client.get('/api/free-slots', query_string={**query, 'duration': 90, 'limit': 1}).get_json()['slots']
+    assert [(s['start_time'], s['end_time']) for s in slots] == [('2030-01-07 14:00:00', '2030-01-07 18:00:00')]
+
+    assert client.get('/api/free-slots', query_string=query).status_code == 400
+    response = client.get('/api/free-slots', query_string={**query, 'duration': 60, 'day_start': '18:00'})
+    assert response.status_code == 400
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from mail_sender import SMTPSession
+from outbox import Outbox, enqueue
+from smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def sink():
+    sink = SMTPSink().start()
+    yield sink
+    sink.shutdown()
+    sink.server_close()
+
+
+def session_for(sink):
+    return SMTPSession({
+        'server': '127.0.0.1', 'port': sink.port, 'use_tls': False,
+        'username': 'chimeo@example.com', 'password': '', 'debug': 0, 'timeout': 5,
+    })
+
+
+def queue(conn, recipients):
+    for i, to_email in enumerate(recipients):
+        enqueue(conn, to_email, '【日程提醒】', f'邮件 {i}', event_id=i + 1, occurrence_ts=1000)
+    conn.commit()
+
+
+def statuses(conn):
+    return {row['to_email']: dict(row) for row in conn.execute('SELECT * FROM outbox')}
+
+
+def test_batch_uses_one_session(db_conn, sink):
+    queue(db_conn, [f'user{i}@example.com' for i in range(10)])
+    outbox = Outbox(lambda: db_conn, batch_size=50)
+    with session_for(sink) as session:
+        assert outbox.run_once(session) == 10
+    assert sink.messages == 10
+    assert sink.connections == 1
+    assert {row['status'] for row in statuses(db_conn).values()} == {'sent'}
+    assert outbox.stats['batches'] == 1
+
+
+def test_transient_failure_retried_with_backoff(db_conn, sink):
+    queue(db_conn, ['user@example.com'])
+    sink.temp_fail = 2
+    outbox = Outbox(lambda: db_conn, base_delay=60)
+    with session_for(sink) as session:
+        for attempt in range(2):
+            now = int(time.time())
+            assert outbox.run_once(session) == 1
+            row = statuses(db_conn)['user@example.com']
+            assert row['status'] == 'pending'
+            assert row['attempts'] == attempt + 1
+            assert row['last_error']
+            # 第 n 次失败后等待 base_delay * 2^(n-1) 到 1.5 倍之间
+            delay = row['next_attempt_ts'] - now
+            assert 60 * 2 ** attempt - 1 <= delay <= 90 * 2 ** attempt + 1
+            # 退避期间不会被认领
+            assert outbox.run_once(session) == 0
+            db_conn.execute('UPDATE outbox SET next_attempt_ts = 0')
+            db_conn.commit()
+        assert outbox.run_once(session) == 1
+    row = statuses(db_conn)['user@example.com']
+    assert row['status'] == 'sent'
+    assert row['attempts'] == 3
+    assert sink.messages == 1
+    assert outbox.stats['retried'] == 2
+
+
+def test_refused_recipient_marked_failed(db_conn, sink):
+    sink.reject = ('REFUSED',)
+    queue(db_conn, ['refused@example.com', 'ok@example.com'])
+    outbox = Outbox(lambda: db_conn)
+    with session_for(sink) as session:
+        assert outbox.run_once(session) == 2
+    rows = statuses(db_conn)
+    assert rows['refused@example.com']['status'] == 'failed'
+    assert rows['refused@example.com']['attempts'] == 1
+    assert rows['ok@example.com']['status'] == 'sent'
+    # 被拒不重试
+    with session_for(sink) as session:
+        assert outbox.run_once(session) == 0
+    assert outbox.stats['failed'] == 1
+
+
+def test_marked_sent_only_after_server_accepts(db_conn, database, sink):
+    from db import ConnectionPool
+
+    queue(db_conn, ['a@example.com', 'b@example.com'])
+    observer = ConnectionPool(database, size=0).acquire()
+    seen = []
+
+    class RecordingSession:
+        # 每封邮件交给服务器之前，从另一个连接看这一行的状态
+        def __init__(self, session):
+            self.session = session
+
+        def send(self, subject, content, to_email):
+            seen.append(observer.execute('SELECT status FROM outbox WHERE to_email = ?', (to_email,)).fetchone()[0])
+            self.session.send(subject, content, to_email)
+
+        def close(self):
+            self.session.close()
+
+    sink.temp_fail = 1
+    outbox = Outbox(lambda: db_conn)
+    session = RecordingSession(session_for(sink))
+    outbox.run_once(session)
+    session.close()
+    assert seen == ['sending', 'sending']
+    rows = statuses(db_conn)
+    # 第一封被服务器临时拒绝，没有标记为 sent；只有服务器接受的那封是 sent
+    assert sorted(row['status'] for row in rows.values()) == ['pending', 'sent']
+    assert sink.messages == 1
+    assert all(row['sent_ts'] is None for row in rows.values() if row['status'] != 'sent')
+    observer.close()
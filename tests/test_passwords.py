@@ -0,0 +1,179 @@
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+from passwords import HasherBusy, LoginThrottle, PasswordHasher, is_hashed
+
+METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def throttle(chimeo, monkeypatch):
+    throttle = LoginThrottle(max_attempts=2, window=60)
+    monkeypatch.setattr(chimeo, 'login_throttle', throttle)
+    return throttle
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    # 哈希计算停在 gate 上，直到测试放行；entered 表示已有计算开始
+    gate, entered = threading.Event(), threading.Event()
+    real = passwords.generate_password_hash
+
+    def slow(password, method):
+        entered.set()
+        gate.wait(5)
+        return real(password, method)
+
+    monkeypatch.setattr(passwords, 'generate_password_hash', slow)
+    yield gate, entered
+    gate.set()
+
+
+def occupy(hasher, blocked):
+    # 占住唯一的哈希线程，返回等待它结束的线程
+    gate, entered = blocked
+    gate.clear()
+    entered.clear()
+    thread = threading.Thread(target=hasher.hash, args=('占位',))
+    thread.start()
+    assert entered.wait(5)
+    return thread
+
+
+def login(client, username, password, email=''):
+    return client.post('/login', data={'username': username, 'password': password, 'email': email})
+
+
+def add_user(chimeo, username, stored):
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                     (username, f'{username}@example.com', stored))
+        conn.commit()
+
+
+def stored_password(chimeo, username):
+    with chimeo.app.app_context():
+        return chimeo.get_db().execute('SELECT password FROM users WHERE username = ?', (username,)).fetchone()[0]
+
+
+def test_verify_reports_upgrades():
+    hasher = PasswordHasher(METHOD)
+    current = hasher.hash('pw')
+    assert is_hashed(current) and current.startswith(METHOD + '$')
+    assert hasher.verify(current, 'pw') == (True, None)
+    assert hasher.verify(current, 'wrong') == (False, None)
+
+    # 明文和旧参数的哈希：匹配时返回按当前参数重算的哈希
+    for old in ('pw', generate_password_hash('pw', 'pbkdf2:sha256:500')):
+        matched, upgraded = hasher.verify(old, 'pw')
+        assert matched and upgraded.startswith(METHOD + '$')
+        assert hasher.verify(upgraded, 'pw') == (True, None)
+        assert hasher.verify(old, 'wrong') == (False, None)
+
+
+@pytest.mark.parametrize('old', ['pw', generate_password_hash('pw', 'pbkdf2:sha256:500')])
+def test_login_upgrades_stored_hash(chimeo, throttle, old):
+    add_user(chimeo, 'carol', old)
+    client = chimeo.app.test_client()
+    # 密码错误不改写
+    login(client, 'carol', 'wrong')
+    assert stored_password(chimeo, 'carol') == old
+
+    assert login(client, 'carol', 'pw').status_code == 302
+    upgraded = stored_password(chimeo, 'carol')
+    assert upgraded.startswith(METHOD + '$')
+    # 升级后的哈希照常登录，不再改写
+    assert login(chimeo.app.test_client(), 'carol', 'pw').status_code == 302
+    assert stored_password(chimeo, 'carol') == upgraded
+
+
+def test_throttle_window():
+    throttle = LoginThrottle(max_attempts=3, window=60)
+    assert [throttle.attempt('alice', now=100) for _ in range(3)] == [0, 0, 0]
+    assert throttle.attempt('alice', now=130) == 31
+    assert throttle.attempt('bob', now=130) == 0
+    # 窗口从第一次尝试算起，到期后重新计数
+    assert throttle.attempt('alice', now=160) == 0
+    assert throttle.throttled == 1
+
+    throttle.cancel('alice')
+    throttle.cancel('alice')
+    # 退回的次数可以重新尝试
+    assert [throttle.attempt('alice', now=161) for _ in range(3)] == [0, 0, 0]
+    assert throttle.attempt('alice', now=161) == 60
+    throttle.succeeded('alice')
+    assert throttle.attempt('alice', now=162) == 0
+
+    # 条目数有上限，最久未用的先淘汰
+    small = LoginThrottle(max_attempts=1, window=60, maxsize=2)
+    for name in ('a', 'b', 'c'):
+        small.attempt(name, now=0)
+    assert small.attempt('a', now=1) == 0
+    assert small.attempt('c', now=1) == 60
+
+
+def test_login_locked_out_after_failures(chimeo, client, throttle):
+    other = chimeo.app.test_client()
+    for _ in range(throttle.max_attempts):
+        response = other.post('/login', data={'username': 'alice', 'password': 'wrong'}, follow_redirects=True)
+        assert '密码错误' in response.get_data(as_text=True)
+    # 锁定期间正确的密码也被拒绝，且不计算哈希
+    response = login(other, 'alice', 'pw')
+    assert response.status_code == 429
+    assert 0 < int(response.headers['Retry-After']) <= 61
+    assert '尝试次数过多' in response.get_data(as_text=True)
+    assert throttle.throttled == 1
+    # 其他用户名不受影响
+    assert login(other, 'bob', 'pw', 'bob@example.com').status_code == 302
+
+
+def test_busy_hasher_rejects(blocked):
+    hasher = PasswordHasher(METHOD, workers=1, max_queue=0)
+    gate, _ = blocked
+    thread = occupy(hasher, blocked)
+    with pytest.raises(HasherBusy):
+        hasher.hash('pw')
+    assert hasher.stats()['rejected'] == 1
+    gate.set()
+    thread.join()
+    # 计算结束后名额归还
+    assert hasher.verify(hasher.hash('pw'), 'pw') == (True, None)
+
+    # 计算超时同样视为繁忙
+    slow = PasswordHasher(METHOD, timeout=0.05)
+    gate.clear()
+    with pytest.raises(HasherBusy):
+        slow.hash('pw')
+    gate.set()
+
+
+def test_busy_hasher_returns_503(chimeo, client, throttle, monkeypatch, blocked):
+    hasher = PasswordHasher(METHOD, workers=1, max_queue=0)
+    monkeypatch.setattr(chimeo, 'password_hasher', hasher)
+    stored = generate_password_hash('pw', METHOD)
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute("UPDATE users SET password = ? WHERE username = 'alice'", (stored,))
+        conn.commit()
+
+    gate, _ = blocked
+    thread = occupy(hasher, blocked)
+    other = chimeo.app.test_client()
+    for _ in range(throttle.max_attempts + 1):
+        response = login(other, 'alice', 'pw')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert '登录人数较多' in response.get_data(as_text=True)
+    response = login(other, 'dave', 'pw', 'dave@example.com')
+    assert response.status_code == 503
+    assert '注册人数较多' in response.get_data(as_text=True)
+    gate.set()
+    thread.join()
+
+    # 繁忙时被拒绝的尝试不计入限流
+    assert login(other, 'alice', 'pw').status_code == 302
+    assert throttle.throttled == 0
@@ -0,0 +1,71 @@
+import io
+import re
+from datetime import datetime
+
+import pytest
+
+from recurrence import Rule, occurrences, parse_exdates, parse_rule, to_rrule
+
+
+def expand(start, text, window_start, window_end, exdates=''):
+    return [d.strftime('%Y-%m-%d %H:%M') for d in occurrences(
+        datetime.fromisoformat(start), parse_rule(text), datetime.fromisoformat(window_start),
+        datetime.fromisoformat(window_end), parse_exdates(exdates))]
+
+
+def test_parse_rule():
+    assert parse_rule('') is None
+    assert parse_rule('custom') is None  # 表单里的“自定义”按一次性处理
+    assert parse_rule('FREQ=HOURLY') is None
+    assert parse_rule('FREQ=DAILY;COUNT=x') is None
+    assert parse_rule('weekly') == Rule('WEEKLY', 1, None, None, (), ())
+    assert parse_rule('RRULE:FREQ=monthly;INTERVAL=2;BYDAY=-1FR;BYMONTHDAY=1,-1') == Rule(
+        'MONTHLY', 2, None, None, ((-1, 4),), (1, -1))
+    assert parse_rule('FREQ=WEEKLY;INTERVAL=0;BYDAY=TU,TH,XX').byday == ((0, 1), (0, 3))
+    # 只有日期的 UNTIL 包含当天
+    assert parse_rule('FREQ=DAILY;UNTIL=20300105').until == datetime(2030, 1, 5, 23, 59, 59)
+
+
+def test_occurrences_with_exdates():
+    # 2030-01-01 是周二
+    assert expand('2030-01-01 09:00', 'FREQ=WEEKLY;BYDAY=TU,TH', '2030-01-01', '2030-01-15',
+                  exdates='2030-01-03 09:00:00,2030-01-10 10:00:00') == [
+        '2030-01-01 09:00', '2030-01-08 09:00', '2030-01-10 09:00']
+    assert expand('2030-01-01 09:00', 'FREQ=DAILY;COUNT=3', '2029-01-01', '2031-01-01',
+                  exdates='2030-01-02 09:00:00') == ['2030-01-01 09:00', '2030-01-03 09:00']
+    # 窗口远在开始之后时直接跳到对应周期
+    assert expand('2000-01-31 08:00', 'FREQ=MONTHLY', '2030-02-01', '2030-04-01') == ['2030-03-31 08:00']
+    assert expand('2030-01-01 09:00', 'FREQ=DAILY;UNTIL=20300103', '2030-01-01', '2030-02-01') == [
+        '2030-01-01 09:00', '2030-01-02 09:00', '2030-01-03 09:00']
+    assert expand('2030-01-01 09:00', '', '2030-01-01', '2030-01-02', exdates='2030-01-01 09:00:00') == []
+
+
+@pytest.mark.parametrize('text', [
+    'FREQ=DAILY',
+    'FREQ=WEEKLY;INTERVAL=2;COUNT=10;BYDAY=MO,WE',
+    'FREQ=MONTHLY;UNTIL=20301231T235959;BYDAY=2TU,-1FR',
+    'FREQ=MONTHLY;BYMONTHDAY=1,-1',
+    'FREQ=YEARLY;INTERVAL=4',
+])
+def test_to_rrule_round_trip(text):
+    rule = parse_rule(text)
+    assert to_rrule(rule) == text
+    assert parse_rule(to_rrule(rule)) == rule
+
+
+def test_edit_keeps_imported_rule(chimeo, client):
+    ics = ('BEGIN:VCALENDAR\nVERSION:2.0\nBEGIN:VEVENT\nSUMMARY:例会\nDTSTART:20300101T090000\n'
+           'RRULE:FREQ=WEEKLY;BYDAY=TU,TH\nEND:VEVENT\nEND:VCALENDAR\n')
+    client.post('/import_ics', data={'ics_file': (io.BytesIO(ics.encode('utf-8')), 'cal.ics')},
+                content_type='multipart/form-data')
+    page = client.get('/edit_event/1').get_data(as_text=True)
+    # 浏览器提交的是选中的那一项
+    selected = re.search(r'<option value="([^"]*)" selected>', page).group(1)
+    assert selected == 'FREQ=WEEKLY;BYDAY=TU,TH'
+    client.post('/update_event/1', data={'title': '例会', 'start_time': '2030-01-01T10:00',
+                                         'repeat_rule': selected, 'category': 'work'})
+    # 不带重复规则的提交（例如旧页面）也不清掉原规则
+    client.post('/update_event/1', data={'title': '例会', 'start_time': '2030-01-01T10:00', 'category': 'work'})
+    with chimeo.app.app_context():
+        row = chimeo.get_db().execute('SELECT start_time, repeat_rule FROM events WHERE id = 1').fetchone()
+    assert tuple(row) == ('2030-01-01T10:00', 'FREQ=WEEKLY;BYDAY=TU,TH')
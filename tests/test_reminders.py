@@ -0,0 +1,87 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from smtp_sink import SMTPSink
+from test_outbox import session_for
+
+
+@pytest.fixture
+def sink():
+    sink = SMTPSink().start()
+    yield sink
+    sink.shutdown()
+    sink.server_close()
+
+
+def due_event(chimeo, client):
+    # 一个此刻开始的日程，提醒（提前 0 分钟）已经到期
+    start_ts = int(time.time())
+    response = client.post('/api/events/bulk', json={'operations': [{'op': 'create', 'event': {
+        'title': '站会', 'start_time': datetime.fromtimestamp(start_ts).strftime('%Y-%m-%d %H:%M:%S'),
+    }}]})
+    assert response.status_code == 200
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute('UPDATE reminders SET fire_at = ?', (start_ts,))
+        conn.commit()
+    return start_ts
+
+
+def delivery(chimeo):
+    with chimeo.app.app_context():
+        row = chimeo.get_db().execute('''
+            SELECT fire_at, last_occurrence_ts, delivery_status, delivered_ts FROM reminders
+        ''').fetchone()
+    return dict(row)
+
+
+def fire_and_send(chimeo, sink):
+    with chimeo.app.app_context():
+        chimeo.fire_reminders(chimeo.load_due_reminders(100))
+        queued = delivery(chimeo)
+        with session_for(sink) as session:
+            assert chimeo.mail_outbox.run_once(session) == 1
+    return queued
+
+
+def test_delivery_confirmed_by_outbox(chimeo, client, sink):
+    start_ts = due_event(chimeo, client)
+    queued = fire_and_send(chimeo, sink)
+    # 入队后 fire_at 已推进，但只记为 queued；服务器接受之后才是 sent
+    assert queued == {'fire_at': None, 'last_occurrence_ts': start_ts, 'delivery_status': 'queued',
+                      'delivered_ts': None}
+    assert delivery(chimeo) == {'fire_at': None, 'last_occurrence_ts': start_ts, 'delivery_status': 'sent',
+                                'delivered_ts': start_ts}
+    assert sink.messages == 1
+
+
+def test_refused_reminder_marked_failed(chimeo, client, sink):
+    sink.reject = ('ALICE',)
+    start_ts = due_event(chimeo, client)
+    fire_and_send(chimeo, sink)
+    assert delivery(chimeo) == {'fire_at': None, 'last_occurrence_ts': start_ts, 'delivery_status': 'failed',
+                                'delivered_ts': None}
+
+
+def test_plain_connection_can_write_events(chimeo, client):
+    import sqlite3
+
+    # 没有注册任何自定义函数的连接（sqlite3 命令行、维护脚本）
+    conn = sqlite3.connect(chimeo.app.config['DATABASE'])
+    conn.execute('''
+        INSERT INTO events (user_id, title, start_time, end_time, repeat_rule, category, start_ts)
+        VALUES (1, '外部写入', '2030-01-01 09:00:00', '', 'FREQ=DAILY', 'work', 1893459600)
+    ''')
+    conn.execute("UPDATE events SET start_time = '2030-01-02 09:00:00' WHERE id = 1")
+    conn.commit()
+    assert conn.execute('SELECT fire_at, stale FROM reminders').fetchall() == [(None, 1)]
+    conn.close()
+
+    # 调度器载入时补算
+    with chimeo.app.app_context():
+        due = chimeo.load_due_reminders(10)
+    expected = int(datetime(2030, 1, 2, 9).timestamp())
+    assert [fire_at for fire_at, _ in due] == [expected]
+    assert delivery(chimeo)['fire_at'] == expected
@@ -0,0 +1,28 @@
+import pytest
+
+from archive import guard_triggers, unguarded_triggers
+
+
+def test_migrated_triggers_are_guarded(chimeo, db_conn):
+    chimeo.check_schema()
+    assert unguarded_triggers(db_conn) == []
+
+
+def test_unguarded_trigger_blocks_startup(chimeo):
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        # 新迁移忘了加 MOVE_GUARD 的触发器
+        conn.execute('''
+            CREATE TRIGGER trg_events_audit AFTER DELETE ON events
+            BEGIN
+                UPDATE users SET archived_until_ts = archived_until_ts WHERE id = OLD.user_id;
+            END
+        ''')
+        conn.commit()
+        assert unguarded_triggers(conn) == ['trg_events_audit']
+    with pytest.raises(RuntimeError, match='trg_events_audit'):
+        chimeo.check_schema()
+
+    with chimeo.app.app_context():
+        guard_triggers(chimeo.get_db())
+    chimeo.check_schema()
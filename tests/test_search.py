@@ -0,0 +1,43 @@
+import sqlite3
+
+
+def search(client, q):
+    response = client.get('/api/search', query_string={'q': q})
+    assert response.status_code == 200
+    return [event['title'] for event in response.get_json()['events']]
+
+
+def test_app_writes_are_indexed(chimeo, client):
+    client.post('/create_event', data={'title': '项目汇报', 'start_time': '2030-01-02T09:00', 'notes': 'weekly sync'})
+    with chimeo.app.app_context():
+        assert chimeo.get_db().execute('SELECT COUNT(*) FROM fts_queue').fetchone()[0] == 0
+    assert search(client, '汇报') == ['项目汇报']
+    assert search(client, 'week') == ['项目汇报']
+    client.post('/update_event/1', data={'title': '季度总结', 'start_time': '2030-01-02T09:00'})
+    assert search(client, '汇报') == []
+    assert search(client, '总结') == ['季度总结']
+    client.post('/delete_event/1')
+    assert search(client, '总结') == []
+
+
+def test_plain_connection_writes_reach_the_index(chimeo, client):
+    # 没有注册分词函数的连接也能写 events，搜索前补上索引
+    conn = sqlite3.connect(chimeo.app.config['DATABASE'])
+    conn.execute('''
+        INSERT INTO events (user_id, title, start_time, end_time, repeat_rule, category, notes, start_ts)
+        VALUES (1, '部门例会', '2030-01-01 09:00:00', '', '', 'work', '', 1893459600)
+    ''')
+    conn.commit()
+    assert search(client, '例会') == ['部门例会']
+
+    conn.execute("UPDATE events SET title = '团建活动' WHERE id = 1")
+    conn.commit()
+    assert search(client, '例会') == []
+    assert search(client, '团建') == ['团建活动']
+
+    conn.execute('DELETE FROM events WHERE id = 1')
+    conn.commit()
+    conn.close()
+    assert search(client, '团建') == []
+    with chimeo.app.app_context():
+        assert chimeo.get_db().execute('SELECT COUNT(*) FROM fts_queue').fetchone()[0] == 0
@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+
+import pytest
+
+from cache import TTLCache
+from fake_openai import FakeOpenAI
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeOpenAI(latency=0.2).start()
+    monkeypatch.setenv('OPENAI_BASE_URL', fake.base_url)
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    yield fake
+    fake.shutdown()
+    fake.server_close()
+
+
+def make_splitter(**kwargs):
+    from app import TaskSplitter
+
+    return TaskSplitter(cache=TTLCache(), **kwargs)
+
+
+def run_threads(target, count):
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_cache_hit_skips_upstream(fake):
+    splitter = make_splitter()
+    steps = splitter.split_task('准备项目汇报')
+    assert steps == ['明确目标', '收集资料', '制定计划', '执行并检查']
+    assert fake.requests == 1
+    # 规范化后相同的任务直接命中缓存
+    assert splitter.split_task('  准备项目汇报 ') == steps
+    assert fake.requests == 1
+    stats = splitter.stats()['cache']
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_concurrent_identical_requests_share_one_call(fake):
+    fake.latency = 0.5
+    splitter = make_splitter()
+    results = run_threads(lambda i: splitter.split_task('准备项目汇报'), 8)
+    assert fake.requests == 1
+    assert all(steps == results[0] for steps in results)
+    assert splitter.stats()['coalesced'] + splitter.stats()['cache']['hits'] == 7
+
+
+def test_semaphore_caps_upstream_concurrency(fake):
+    splitter = make_splitter(max_concurrency=2, queue_timeout=30)
+    results = run_threads(lambda i: splitter.split_task(f'任务 {i}'), 8)
+    assert all(isinstance(steps, list) for steps in results)
+    assert fake.requests == 8
+    assert fake.max_active == 2
+
+
+def test_queue_timeout_raises_busy(fake):
+    from app import SplitterBusy
+
+    fake.latency = 1.0
+    splitter = make_splitter(max_concurrency=1, queue_timeout=0.1)
+    results = run_threads(lambda i: splitter.split_task(f'任务 {i}'), 2)
+    assert sum(isinstance(result, SplitterBusy) for result in results) == 1
+    assert splitter.stats()['rejected'] == 1
+
+
+def test_slow_upstream_raises_timeout(fake):
+    from app import SplitterTimeout
+
+    fake.latency = 2.0
+    splitter = make_splitter()
+    with pytest.raises(SplitterTimeout):
+        splitter.split_task('准备项目汇报', timeout=0.3)
+    assert fake.requests == 1  # 单独计时的调用不自动重试
+    assert splitter.stats()['errors'] == 1
+    assert splitter.stats()['cache']['entries'] == 0
+
+
+def test_endpoint_reports_timeout(fake, chimeo, client, monkeypatch):
+    fake.latency = 2.0
+    monkeypatch.setattr(chimeo, 'splitter', make_splitter(timeout=0.3))
+    response = client.post('/api/split-task', json={'task': '准备项目汇报'})
+    assert response.status_code == 504
+    assert response.get_json() == {"success": False, "error": "任务拆分超时"}
+
+
+def test_endpoint_returns_steps_and_stats(fake, chimeo, client, monkeypatch):
+    monkeypatch.setattr(chimeo, 'splitter', make_splitter())
+    for _ in range(2):
+        response = client.post('/api/split-task', json={'task': '准备项目汇报'})
+        assert response.get_json() == {"success": True, "steps": ['明确目标', '收集资料', '制定计划', '执行并检查']}
+    assert fake.requests == 1
+    stats = client.get('/api/split-task/stats').get_json()['cache']
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+STEPS = ['明确目标', '收集资料', '制定计划', '执行并检查']
+
+
+def batch_splitter(**kwargs):
+    parallelism = kwargs.pop('parallelism', 4)
+    splitter = make_splitter(**kwargs)
+    splitter.batch_parallelism = parallelism
+    return splitter
+
+
+def events(response):
+    # 解析 SSE 响应为 [(事件, 数据), ...]
+    parsed = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        event, data = block.split('\n', 1)
+        parsed.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return parsed
+
+
+def test_packed_batch_uses_one_request(fake):
+    splitter = batch_splitter()
+    tasks = [f'任务 {i}' for i in range(5)] + ['长任务' * 40]
+    results = dict(splitter.split_many(tasks, pack=True))
+    assert results == {i: STEPS for i in range(6)}
+    # 5 个短任务合并成一次请求，长任务单独请求
+    assert fake.requests == 2
+    # 合并请求的结果同样写入缓存
+    assert splitter.split_task('任务 3') == STEPS
+    assert fake.requests == 2
+
+
+def test_unparsable_packed_reply_falls_back_to_single(fake):
+    fake.packed = False
+    splitter = batch_splitter()
+    results = dict(splitter.split_many([f'任务 {i}' for i in range(3)], pack=True))
+    assert results == {i: STEPS for i in range(3)}
+    assert fake.requests == 1 + 3
+
+
+def test_batch_item_errors_are_independent(fake):
+    from app import SplitterBusy, SplitterFailed
+
+    fake.latency = 0.5
+    splitter = batch_splitter(max_concurrency=1, queue_timeout=0.1, parallelism=2)
+    splitter.cache.put(splitter.cache_key('已缓存', 'zh-CN'), ['缓存的步骤'])
+    outcomes = list(splitter.split_many(['任务 A', '已缓存', '任务 B', '任务 A']))
+    # 按完成顺序：缓存命中立即产出，排队超时的先于拿到名额的；批内相同任务只请求一次
+    assert outcomes[0] == (1, ['缓存的步骤'])
+    busy, done = outcomes[1:2], outcomes[2:]
+    assert all(isinstance(outcome, SplitterBusy) for _, outcome in busy)
+    assert all(outcome == STEPS for _, outcome in done)
+    assert sorted(index for index, _ in outcomes) == [0, 1, 2, 3]
+    assert {index for index, _ in done} in ({0, 3}, {2})
+    assert fake.requests == 1
+
+    fake.latency = 0
+    fake.steps = []
+    outcomes = dict(splitter.split_many(['空回复', '已缓存']))
+    assert isinstance(outcomes[0], SplitterFailed)
+    assert outcomes[1] == ['缓存的步骤']
+
+
+def test_batch_endpoint_streams_in_completion_order(fake, chimeo, client, monkeypatch):
+    fake.latency = 0.5
+    splitter = batch_splitter(max_concurrency=1, queue_timeout=0.1, parallelism=2)
+    monkeypatch.setattr(chimeo, 'splitter', splitter)
+    splitter.cache.put(splitter.cache_key('已缓存', 'zh-CN'), ['缓存的步骤'])
+    response = client.post('/api/split-task/batch', json={'tasks': ['任务 A', '任务 B', ' 已缓存 ']})
+    assert response.mimetype == 'text/event-stream'
+    received = events(response)
+    assert [event for event, _ in received] == ['result', 'error', 'result', 'done']
+    assert received[0][1] == {'index': 2, 'task': '已缓存', 'steps': ['缓存的步骤']}
+    assert received[1][1]['error'] == '任务拆分服务繁忙，请稍后再试'
+    assert received[2][1]['steps'] == STEPS
+    assert {received[1][1]['index'], received[2][1]['index']} == {0, 1}
+    done = received[3][1]
+    assert (done['total'], done['succeeded'], done['failed']) == (3, 2, 1)
+
+    assert client.post('/api/split-task/batch', json={'tasks': []}).status_code == 400
+    assert client.post('/api/split-task/batch', json={'tasks': ['a', ' ']}).status_code == 400
+
+
+def test_disconnect_cancels_pending_tasks(fake, chimeo, client, monkeypatch):
+    fake.latency = 0.3
+    splitter = batch_splitter(parallelism=1)
+    monkeypatch.setattr(chimeo, 'splitter', splitter)
+    response = client.post('/api/split-task/batch', json={'tasks': [f'任务 {i}' for i in range(4)]},
+                           buffered=False)
+    first = next(iter(response.response))
+    assert first.startswith(b'event: result')
+    # 客户端断开：正在进行的那个完成，其余尚未开始的取消
+    response.close()
+    time.sleep(1.0)
+    assert fake.requests == 2
+    assert splitter.cache.stats()['entries'] == 2
@@ -0,0 +1,138 @@
+import io
+
+import pytest
+
+import stats
+from archive import ALL_EVENTS
+
+ICS = '''BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+SUMMARY:导入的会议
+DTSTART:20300105T090000
+DTEND:20300105T100000
+CATEGORIES:meeting
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:导入的全天日程
+DTSTART:20300106T000000
+END:VEVENT
+END:VCALENDAR
+'''
+
+
+def assert_consistent(chimeo, expected_events):
+    # 汇总表与日程（含归档）实时聚合的结果一致，且覆盖了全部日程
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        assert stats.check(conn, table=ALL_EVENTS) == []
+        assert conn.execute('SELECT COALESCE(SUM(count), 0) FROM event_stats').fetchone()[0] == expected_events
+        assert conn.execute(f'SELECT COUNT(*) FROM {ALL_EVENTS}').fetchone()[0] == expected_events
+
+
+def event_ids(chimeo):
+    with chimeo.app.app_context():
+        return [row[0] for row in chimeo.get_db().execute(f'SELECT id FROM {ALL_EVENTS} ORDER BY id')]
+
+
+def bulk(client, *operations):
+    response = client.post('/api/events/bulk', json={'operations': list(operations)})
+    assert response.status_code == 200, response.get_json()
+    return [result['id'] for result in response.get_json()['results']]
+
+
+def test_form_routes_keep_rollups_consistent(chimeo, client):
+    response = client.post('/create_event', data={
+        'title': '周会', 'start_time': '2030-01-02T09:00', 'end_time': '2030-01-02T10:30', 'category': 'work',
+    })
+    assert response.status_code == 302
+    assert_consistent(chimeo, 1)
+    [event_id] = event_ids(chimeo)
+
+    # 换日期、分类和时长
+    client.post(f'/update_event/{event_id}', data={
+        'title': '周会', 'start_time': '2030-01-03T14:00', 'end_time': '2030-01-03T17:00', 'category': 'meeting',
+    })
+    assert_consistent(chimeo, 1)
+    with chimeo.app.app_context():
+        row = chimeo.get_db().execute('SELECT day, category, count, duration FROM event_stats').fetchone()
+    assert tuple(row) == ('2030-01-03', 'meeting', 1, 3 * 3600)
+
+    client.post(f'/delete_event/{event_id}')
+    assert_consistent(chimeo, 0)
+
+
+def test_bulk_keeps_rollups_consistent(chimeo, client):
+    ids = bulk(client, *[
+        {'op': 'create', 'event': {'title': f'日程 {i}', 'start_time': f'2030-02-0{i + 1} 09:00:00',
+                                   'end_time': f'2030-02-0{i + 1} 10:00:00', 'category': 'study'}}
+        for i in range(4)
+    ])
+    assert_consistent(chimeo, 4)
+    bulk(client,
+         {'op': 'update', 'id': ids[0], 'event': {'category': 'work'}},
+         {'op': 'update', 'id': ids[1], 'event': {'start_time': '2030-02-09 08:00:00'}},
+         {'op': 'update', 'id': ids[2], 'event': {'end_time': '2030-02-03 12:00:00'}},
+         {'op': 'delete', 'id': ids[3]},
+         {'op': 'create', 'event': {'title': '没有结束时间', 'start_time': '2030-02-10 09:00:00'}})
+    assert_consistent(chimeo, 4)
+
+
+def test_import_and_subtasks_keep_rollups_consistent(chimeo, client):
+    response = client.post('/import_ics', data={'ics_file': (io.BytesIO(ICS.encode('utf-8')), 'cal.ics')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert_consistent(chimeo, 2)
+
+    response = client.post('/save_subtasks', json={
+        'main_task': '准备汇报', 'steps': ['收集资料', '写稿', '排练'], 'selected_indices': [0, 2],
+    })
+    assert response.get_json()['saved_count'] == 2
+    assert_consistent(chimeo, 4)
+
+    response = client.post('/save_subtasks', json={
+        'main_task': '整理房间', 'steps': ['扫地', '拖地'], 'selected_indices': [0, 1],
+        'spread': {'start': '2030-03-01 09:00:00', 'end': '2030-03-01 12:00:00'},
+    })
+    assert response.get_json()['saved_count'] == 2
+    assert_consistent(chimeo, 6)
+
+
+@pytest.mark.parametrize('finish', ['update', 'delete'])
+def test_archived_events_keep_rollups_consistent(chimeo, client, finish):
+    old_id, recent_id = bulk(
+        client,
+        {'op': 'create', 'event': {'title': '旧日程', 'start_time': '2015-06-01 09:00:00',
+                                   'end_time': '2015-06-01 11:00:00', 'category': 'work'}},
+        {'op': 'create', 'event': {'title': '新日程', 'start_time': '2030-06-01 09:00:00'}},
+    )
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        # 旧日程的提醒早已发出
+        conn.execute('UPDATE reminders SET fire_at = NULL WHERE event_id = ?', (old_id,))
+        conn.commit()
+        assert chimeo.archive_old_events() == 1
+        assert conn.execute('SELECT id FROM events_archive').fetchall()[0][0] == old_id
+    # 搬移不改变汇总
+    assert_consistent(chimeo, 2)
+
+    if finish == 'update':
+        # 修改已归档的日程：先搬回 events 再更新
+        client.post(f'/update_event/{old_id}', data={
+            'title': '旧日程', 'start_time': '2015-06-02T09:00', 'end_time': '2015-06-02T09:30', 'category': 'study',
+        })
+        assert_consistent(chimeo, 2)
+        with chimeo.app.app_context():
+            # 改了开始时间，提醒重新计算为待发；发出后才会再次归档
+            conn = chimeo.get_db()
+            conn.execute('UPDATE reminders SET fire_at = NULL WHERE event_id = ?', (old_id,))
+            conn.commit()
+            assert chimeo.archive_old_events() == 1
+        assert_consistent(chimeo, 2)
+        bulk(client, {'op': 'update', 'id': old_id, 'event': {'category': 'work'}})
+        assert_consistent(chimeo, 2)
+    else:
+        bulk(client, {'op': 'delete', 'id': old_id})
+        assert_consistent(chimeo, 1)
+        client.post(f'/delete_event/{recent_id}')
+        assert_consistent(chimeo, 0)
@@ -0,0 +1,127 @@
+import time
+
+from changes import compact
+
+
+def sync(client, token=None, **args):
+    if token is not None:
+        args['token'] = token
+    response = client.get('/api/sync', query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def changes(data):
+    return [(change['op'], change['event']['title'] if change['op'] == 'upsert' else change['id'])
+            for change in data['changes']]
+
+
+def bulk(client, *operations):
+    response = client.post('/api/events/bulk', json={'operations': list(operations)})
+    return [result['id'] for result in response.get_json()['results']]
+
+
+def create(title, start_time='2030-01-01 09:00:00'):
+    return {'op': 'create', 'event': {'title': title, 'start_time': start_time}}
+
+
+def test_full_sync_pages_then_delta(chimeo, client):
+    bulk(client, create('一'), create('二'), create('三'))
+    first = sync(client, limit=2)
+    assert (first['full'], first['reset'], first['has_more']) == (True, True, True)
+    assert changes(first) == [('upsert', '一'), ('upsert', '二')]
+    second = sync(client, first['token'], limit=2)
+    assert (second['full'], second['reset'], second['has_more']) == (True, False, False)
+    assert changes(second) == [('upsert', '三')]
+    assert '.' not in second['token']
+
+    # 之后只返回新的变更；没有变更时令牌不回退
+    idle = sync(client, second['token'])
+    assert (idle['full'], idle['changes']) == (False, [])
+    assert int(idle['token']) >= int(second['token'])
+
+    response = client.get('/api/sync', query_string={'token': 'abc'})
+    assert response.status_code == 400
+
+
+def test_delta_reports_latest_op_and_tombstones(chimeo, client):
+    one, two = bulk(client, create('一'), create('二'))
+    token = sync(client)['token']
+
+    [three] = bulk(client, create('三'))
+    bulk(client, {'op': 'update', 'id': one, 'event': {'title': '一（改）'}},
+         {'op': 'update', 'id': three, 'event': {'title': '三（改）'}})
+    client.post(f'/delete_event/{two}')
+    # 其他用户的变更不可见
+    other = chimeo.app.test_client()
+    other.post('/login', data={'username': 'bob', 'password': 'pw', 'email': 'bob@example.com'})
+    bulk(other, create('bob'))
+
+    data = sync(client, token)
+    assert data['full'] is False
+    # 同一日程只返回最后一次，按最后一次操作的先后排列
+    assert changes(data) == [('upsert', '一（改）'), ('upsert', '三（改）'), ('delete', two)]
+
+    # 新建后又删除的日程只有删除记录
+    [four] = bulk(client, create('四'))
+    client.post(f'/delete_event/{four}')
+    assert changes(sync(client, data['token'])) == [('delete', four)]
+
+
+def test_delta_pages(chimeo, client):
+    token = sync(client)['token']
+    bulk(client, *[create(str(i)) for i in range(5)])
+    seen = []
+    while True:
+        data = sync(client, token, limit=2)
+        seen.extend(title for _, title in changes(data))
+        token = data['token']
+        if not data['has_more']:
+            break
+    assert seen == ['0', '1', '2', '3', '4']
+
+
+def test_archive_moves_are_invisible(chimeo, client):
+    old, recent = bulk(client, create('旧日程', '2015-06-01 09:00:00'), create('新日程'))
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        conn.execute('UPDATE reminders SET fire_at = NULL WHERE event_id = ?', (old,))
+        conn.commit()
+    token = sync(client)['token']
+
+    with chimeo.app.app_context():
+        assert chimeo.archive_old_events() == 1
+    data = sync(client, token)
+    assert data['changes'] == []
+
+    # 全量同步包含归档的日程
+    assert sorted(title for _, title in changes(sync(client))) == ['新日程', '旧日程']
+
+    # 修改已归档的日程：搬回 events 不产生记录，只有这次修改
+    client.post(f'/update_event/{old}', data={'title': '旧日程（改）', 'start_time': '2015-06-01T09:00'})
+    assert changes(sync(client, data['token'])) == [('upsert', '旧日程（改）')]
+
+
+def test_compacted_token_falls_back_to_full(chimeo, client):
+    one, two = bulk(client, create('一'), create('二'))
+    stale = sync(client)['token']
+    for title in ('a', 'b', 'c'):
+        bulk(client, {'op': 'update', 'id': one, 'event': {'title': title}})
+    fresh = sync(client, stale)['token']
+
+    with chimeo.app.app_context():
+        conn = chimeo.get_db()
+        # 被覆盖的记录删除，每个日程只留最后一条
+        assert compact(conn, retention=86400) == (3, 0)
+        assert changes(sync(client, stale)) == [('upsert', 'c')]
+        # 全部过期：下限提高到最后的序号
+        bulk(client, {'op': 'update', 'id': two, 'event': {'title': '二（改）'}})
+        assert compact(conn, retention=86400, now=time.time() + 2 * 86400) == (1, 2)
+
+    data = sync(client, stale)
+    assert (data['full'], data['reset']) == (True, True)
+    assert sorted(title for _, title in changes(data)) == ['c', '二（改）']
+    # 压缩之前拿到、但仍早于下限的令牌同样全量
+    assert sync(client, fresh)['full'] is True
+    # 全量之后拿到的令牌继续增量
+    assert sync(client, data['token'])['full'] is False
@@ -0,0 +1,96 @@
+import contextlib
+import io
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+# 多个进程（相当于多个 gunicorn worker）共用一个数据库同时运行后台服务：
+# 每个 (日程, 发生时间, 提前量) 只入队一次，每封邮件只发送一次。
+# 子进程就是本文件：python tests/test_workers.py EXPECTED LEADER DEADLINE
+
+PROCESSES = 3
+EVENTS = 40
+RECURRING = 10
+OFFSETS = '[0, 5]'
+
+
+def child(expected, leader, deadline):
+    import app as chimeo
+
+    chimeo.create_app()
+    with contextlib.redirect_stdout(io.StringIO()):
+        chimeo.start_background_services(elect_leader=leader)
+        with chimeo.app.app_context():
+            conn = chimeo.get_db()
+            while time.time() < deadline:
+                if conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'sent'").fetchone()[0] >= expected:
+                    break
+                time.sleep(0.05)
+    print(chimeo.reminder_scheduler.lag.summary()['count'], chimeo.mail_outbox.stats['sent'])
+
+
+def seed(database, delay):
+    from db import ConnectionPool, migrate
+
+    conn = ConnectionPool(database, size=0).acquire()
+    migrate(conn)
+    conn.execute("INSERT INTO users (username, email, password, reminder_offsets) VALUES ('w', 'w@example.com', 'x', ?)",
+                 (OFFSETS,))
+    # 全部提醒在 delay 秒后同时到期（提前 5 分钟的那个已经过了，启动后立即补发）
+    due = int(time.time() + delay)
+    start_time = datetime.fromtimestamp(due).strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany('''
+        INSERT INTO events (user_id, title, start_time, end_time, repeat_rule, category, start_ts)
+        VALUES (1, ?, ?, '', ?, 'work', ?)
+    ''', [(f'日程 {i}', start_time, '', due) for i in range(EVENTS)]
+         + [(f'每日 {i}', start_time, 'FREQ=DAILY', due) for i in range(RECURRING)])
+    conn.commit()
+    conn.close()
+    return due
+
+
+@pytest.mark.parametrize('leader', [True, False], ids=['leader', 'every-process'])
+def test_workers_send_each_reminder_once(tmp_path, leader):
+    from smtp_sink import SMTPSink
+
+    # 每条 SMTP 命令 2 毫秒，一批邮件要发一段时间，各进程的发件线程会同时认领
+    sink = SMTPSink(latency=0.002).start()
+    database = str(tmp_path / 'workers.db')
+    due = seed(database, delay=2)
+    expected = (EVENTS + RECURRING) * 2
+    env = dict(os.environ, DATABASE=database, MAIL_SERVER='127.0.0.1', MAIL_PORT=str(sink.port),
+               MAIL_USE_TLS='false', MAIL_PASSWORD='', MAIL_WORKERS='3', REMINDER_WATCH_INTERVAL='0.2')
+    children = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), str(expected), '1' if leader else '0',
+                          str(due + 30)], env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(PROCESSES)
+    ]
+    results = [[int(value) for value in c.communicate()[0].split()] for c in children]
+    sink.shutdown()
+    sink.server_close()
+    assert all(c.returncode == 0 for c in children)
+
+    conn = sqlite3.connect(database)
+    rows = conn.execute('''
+        SELECT event_id, occurrence_ts, reminder_offset, status, attempts FROM outbox
+    ''').fetchall()
+    conn.close()
+    keys = {(event_id, occurrence_ts, offset) for event_id, occurrence_ts, offset, _, _ in rows}
+    assert len(rows) == len(keys) == expected
+    assert {(status, attempts) for _, _, _, status, attempts in rows} == {('sent', 1)}
+    # 每行只发送了一次：SMTP 替身收到的邮件数、各进程发送数之和都等于行数
+    assert sink.messages == expected
+    assert sum(sent for _, sent in results) == expected
+    if leader:
+        # 只有持有租约的进程运行了调度器
+        assert sum(1 for fired, _ in results if fired) == 1
+
+
+if __name__ == '__main__':
+    sys.path[:0] = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+    child(int(sys.argv[1]), sys.argv[2] == '1', float(sys.argv[3]))